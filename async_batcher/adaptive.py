@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import math
+from collections import deque
+
+
+class AdaptiveBatchController:
+    """A controller to tune the batch size and the queue time of a batcher at runtime.
+
+    The controller observes the processing latency of each batch and the rate of submitted items,
+    then it periodically adjusts the effective batch size and queue time used by the batcher:
+
+    - If `target_latency` is set, it uses an additive increase/multiplicative decrease strategy to keep
+      the p99 latency of the batches (queue time + processing time) under the target. The p99 is computed
+      over a rolling window of the last `latency_window` batches, which is reset when the batch size is
+      decreased.
+    - Otherwise, it climbs the batch size in the direction that increases the throughput.
+
+    In both modes, the queue time is set to the time needed to fill a batch at the observed arrival rate,
+    bounded by `min_queue_time` and `max_queue_time`.
+
+    Args:
+        target_latency (float, optional): The target p99 latency in seconds. If None, the controller
+            maximizes the throughput. Defaults to None.
+        min_batch_size (int, optional): The min batch size to use. Defaults to 1.
+        max_batch_size (int, optional): The max batch size to use, bounded by the batcher `max_batch_size`.
+            If None, it will use the batcher `max_batch_size`, or 1024 if the batcher batch size is not
+            limited. Defaults to None.
+        min_queue_time (float, optional): The min queue time to use. Defaults to 0.
+        max_queue_time (float, optional): The max queue time to use, bounded by the batcher
+            `max_queue_time`. If None, it will use the batcher `max_queue_time`. Defaults to None.
+        adjust_interval (int, optional): The number of processed batches between two adjustments.
+            Defaults to 10.
+        latency_window (int, optional): The max number of last batches used to compute the p99 latency.
+            Defaults to 1000.
+        increase_step (int, optional): The min number of items added to the batch size when increasing it.
+            Defaults to 1.
+        decrease_factor (float, optional): The factor applied to the batch size when decreasing it.
+            Defaults to 0.75.
+        tolerance (float, optional): The relative margin used to compare the latency with the target,
+            and the throughput with the previous throughput. Defaults to 0.1.
+    """
+
+    DEFAULT_MAX_BATCH_SIZE = 1024
+
+    def __init__(
+        self,
+        *,
+        target_latency: float | None = None,
+        min_batch_size: int = 1,
+        max_batch_size: int | None = None,
+        min_queue_time: float = 0,
+        max_queue_time: float | None = None,
+        adjust_interval: int = 10,
+        latency_window: int = 1000,
+        increase_step: int = 1,
+        decrease_factor: float = 0.75,
+        tolerance: float = 0.1,
+    ):
+        if target_latency is not None and target_latency <= 0:
+            raise ValueError("Valid target_latency value is greater than 0")
+        if min_batch_size < 1:
+            raise ValueError("Valid min_batch_size value is greater than 0")
+        if max_batch_size is not None and max_batch_size < min_batch_size:
+            raise ValueError("max_batch_size should be greater than or equal to min_batch_size")
+        if adjust_interval < 1:
+            raise ValueError("Valid adjust_interval value is greater than 0")
+        if latency_window < 1:
+            raise ValueError("Valid latency_window value is greater than 0")
+        if not 0 < decrease_factor < 1:
+            raise ValueError("Valid decrease_factor value is between 0 and 1")
+        self.target_latency = target_latency
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.min_queue_time = min_queue_time
+        self.max_queue_time = max_queue_time
+        self.adjust_interval = adjust_interval
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.tolerance = tolerance
+        self.batch_size = min_batch_size
+        self.queue_time = min_queue_time
+        # the EWMA of the processing time for each observed batch size
+        self.processing_time_by_batch_size: dict[int, float] = {}
+        self._samples: deque[tuple[float, int, float]] = deque()
+        self._latencies: deque[float] = deque(maxlen=latency_window)
+        # the number of items submitted since the start of the arrival rate window
+        self._arrived_items = 0
+        self._arrivals_started_at: float | None = None
+        self._last_throughput: float | None = None
+        self._direction = 1
+
+    def attach(self, max_batch_size: int, max_queue_time: float):
+        """Initialize the controller with the static configuration of the batcher.
+
+        Args:
+            max_batch_size (int): The batcher max batch size, -1 if it's not limited.
+            max_queue_time (float): The batcher max queue time.
+        """
+        if self.max_batch_size is None:
+            self.max_batch_size = max_batch_size if max_batch_size > 0 else self.DEFAULT_MAX_BATCH_SIZE
+        elif max_batch_size > 0:
+            self.max_batch_size = min(self.max_batch_size, max_batch_size)
+        self.min_batch_size = min(self.min_batch_size, self.max_batch_size)
+        if self.max_queue_time is None:
+            self.max_queue_time = max_queue_time
+        else:
+            self.max_queue_time = min(self.max_queue_time, max_queue_time)
+        self.min_queue_time = min(self.min_queue_time, self.max_queue_time)
+        self.batch_size = self.max_batch_size
+        self.queue_time = self.max_queue_time
+
+    def record_arrivals(self, count: int):
+        """Record the submission of new items to the batcher.
+
+        Args:
+            count (int): The number of submitted items.
+        """
+        self._arrived_items += count
+
+    def record_batch(self, batch_size: int, processing_time: float, now: float):
+        """Record the processing of a batch, and adjust the configuration if needed.
+
+        Args:
+            batch_size (int): The number of items in the batch.
+            processing_time (float): The time spent processing the batch.
+            now (float): The loop time at the end of the processing.
+        """
+        previous = self.processing_time_by_batch_size.get(batch_size)
+        self.processing_time_by_batch_size[batch_size] = (
+            processing_time if previous is None else 0.8 * previous + 0.2 * processing_time
+        )
+        self._samples.append((now, batch_size, processing_time))
+        self._latencies.append(self.queue_time + processing_time)
+        if self._arrivals_started_at is None:
+            # the items submitted before the first batch was processed have no known arrival window
+            self._arrivals_started_at = now
+            self._arrived_items = 0
+        if len(self._samples) >= self.adjust_interval:
+            self._adjust(now)
+            self._samples.clear()
+
+    def _arrival_rate(self, now: float) -> float | None:
+        elapsed = now - self._arrivals_started_at
+        if elapsed <= 0:
+            return None
+        arrival_rate = self._arrived_items / elapsed
+        self._arrivals_started_at = now
+        self._arrived_items = 0
+        return arrival_rate
+
+    def _adjust(self, now: float):
+        if self.target_latency is not None:
+            latencies = sorted(self._latencies)
+            p99 = latencies[min(len(latencies) - 1, math.ceil(0.99 * len(latencies)) - 1)]
+            if p99 > self.target_latency:
+                self.batch_size = int(self.batch_size * self.decrease_factor)
+                # the latencies observed with the previous batch size shouldn't decrease the new one again
+                self._latencies.clear()
+            elif p99 < self.target_latency * (1 - self.tolerance):
+                self.batch_size += self.increase_step
+        else:
+            processed_items = sum(sample[1] for sample in self._samples)
+            processing_time = sum(sample[2] for sample in self._samples)
+            throughput = processed_items / processing_time if processing_time > 0 else math.inf
+            if self._last_throughput is not None and throughput < self._last_throughput * (
+                1 - self.tolerance
+            ):
+                self._direction = -self._direction
+            self._last_throughput = throughput
+            self.batch_size += self._direction * max(self.increase_step, self.batch_size // 4)
+        self.batch_size = max(self.min_batch_size, min(self.max_batch_size, self.batch_size))
+
+        queue_time = self.max_queue_time
+        arrival_rate = self._arrival_rate(now)
+        if arrival_rate:
+            queue_time = min(queue_time, self.batch_size / arrival_rate)
+        if self.target_latency is not None:
+            expected_processing_time = self.processing_time_by_batch_size.get(self.batch_size)
+            if expected_processing_time is not None:
+                queue_time = min(queue_time, self.target_latency - expected_processing_time)
+        self.queue_time = max(self.min_queue_time, min(self.max_queue_time, queue_time))
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import AsyncExitStack
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, Literal, TypeVar
+
+import aioboto3
+from aiobotocore.config import AioConfig
+
+from async_batcher.batcher import AsyncBatcher
+from async_batcher.retry import RetryPolicy
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+    from botocore.exceptions import ClientError
+    from types_aiobotocore_dynamodb import DynamoDBServiceResource
+
+T = TypeVar("T")
+S = TypeVar("S")
+
+# the errors returned by DynamoDB when the whole request is throttled
+THROTTLING_ERROR_CODES = frozenset(
+    ["ProvisionedThroughputExceededException", "ThrottlingException", "RequestLimitExceeded"]
+)
+DEFAULT_RETRY_POLICY = RetryPolicy()
+# the max size of a DynamoDB batch request
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+
+
+def _get_value_size(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, bytes | bytearray):
+        return len(value)
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, int | float | Decimal):
+        # the numbers are stored with 1 byte per 2 significant digits, plus 1 byte
+        digits = len(str(value).lstrip("-").replace(".", "").strip("0")) or 1
+        return (digits + 1) // 2 + 1
+    if isinstance(value, dict):
+        return 3 + sum(len(name.encode()) + _get_value_size(item) + 1 for name, item in value.items())
+    if isinstance(value, list | tuple):
+        return 3 + sum(_get_value_size(item) + 1 for item in value)
+    if isinstance(value, set | frozenset):
+        return sum(_get_value_size(item) for item in value)
+    return len(str(value).encode())
+
+
+def get_item_size(item: dict[str, Any]) -> int:
+    """Estimate the size of a DynamoDB item, with the DynamoDB item size rules.
+
+    Args:
+        item (dict[str, Any]): The item attributes, as accepted by the aioboto3 resource.
+
+    Returns:
+        int: The estimated size of the item in bytes.
+    """
+    return sum(len(name.encode()) + _get_value_size(value) for name, value in item.items())
+
+
+class AsyncDynamoDbBatcher(AsyncBatcher[T, S]):
+    """Base batcher for the DynamoDB operations, which owns a long-lived DynamoDB resource.
+
+    The resource, and its connection pool, is opened on the first batch and reused by the next ones,
+    then it is closed when the batcher is stopped.
+
+    The unprocessed items returned by DynamoDB, and the items of the throttled requests, are retried with
+    the retry policy, merged into the next batches.
+
+    With `split_by`, a batch is split into requests per table, or per hash of the primary key, which are
+    sent concurrently, so a slow or throttled table doesn't hold up the items of the other tables. Each item
+    is resolved as soon as its own request completes.
+
+    Args:
+        region_name: The region to use.
+        use_ssl: Whether to use SSL/TLS.
+        verify: Whether to verify SSL certificates.
+        endpoint_url: The complete URL to use for the constructed client. This is useful for local testing.
+        config: The configuration for the session.
+        aioboto3_session: The aioboto3 session to use. If not provided, a new session is created.
+        max_pool_connections (int, optional): The max number of connections to keep in the client connection
+            pool. If None, it will use the value of `config`, or the botocore default (10).
+            Defaults to None.
+        retry_policy (RetryPolicy, optional): The policy used to retry the unprocessed and throttled items.
+            If None, these items fail with a `RetriesExhaustedException`. Defaults to `RetryPolicy()`.
+        split_by (Literal["table", "partition"], optional): How to split the batches into parallel requests:
+            one request per table, or `max_parallel_requests` requests per table by hash of the primary key.
+            If None, a batch is sent in a single request. Defaults to None.
+        max_parallel_requests (int, optional): The max number of split requests sent concurrently, shared by
+            all the batches. Defaults to 4.
+    """
+
+    def __init__(
+        self,
+        *,
+        region_name: str | None = None,
+        use_ssl: bool | None = None,
+        verify: bool | None = None,
+        endpoint_url: str | None = None,
+        config: AioConfig | None = None,
+        aioboto3_session: aioboto3.Session | None = None,
+        max_pool_connections: int | None = None,
+        retry_policy: RetryPolicy | None = DEFAULT_RETRY_POLICY,
+        split_by: Literal["table", "partition"] | None = None,
+        max_parallel_requests: int = 4,
+        **kwargs,
+    ):
+        if split_by not in [None, "table", "partition"]:
+            raise ValueError(f"Invalid split_by: {split_by}")
+        if max_parallel_requests < 1:
+            raise ValueError("Valid max_parallel_requests value is greater than 0")
+        super().__init__(retry_policy=retry_policy, **kwargs)
+        self.region_name = region_name
+        self.use_ssl = use_ssl
+        self.verify = verify
+        self.endpoint_url = endpoint_url
+        if max_pool_connections is not None:
+            pool_config = AioConfig(max_pool_connections=max_pool_connections)
+            config = config.merge(pool_config) if config is not None else pool_config
+        self.config = config
+        self.aioboto3_session = aioboto3_session or aioboto3.Session()
+        self._dynamodb: DynamoDBServiceResource | None = None
+        self._exit_stack: AsyncExitStack | None = None
+        self._dynamodb_lock = asyncio.Lock()
+        self.split_by = split_by
+        self.max_parallel_requests = max_parallel_requests
+        self._requests_semaphore = asyncio.Semaphore(max_parallel_requests)
+        # the running split requests, referenced until they are done
+        self._split_requests: set[asyncio.Task] = set()
+
+    async def _get_dynamodb(self) -> DynamoDBServiceResource:
+        """Get the DynamoDB resource, and open it if it's not open yet."""
+        if self._dynamodb is not None:
+            return self._dynamodb
+        # the concurrent batches should not open more than one resource
+        async with self._dynamodb_lock:
+            if self._dynamodb is None:
+                exit_stack = AsyncExitStack()
+                self._dynamodb = await exit_stack.enter_async_context(
+                    self.aioboto3_session.resource(
+                        "dynamodb",
+                        region_name=self.region_name,
+                        use_ssl=self.use_ssl,
+                        verify=self.verify,
+                        endpoint_url=self.endpoint_url,
+                        config=self.config,
+                    )
+                )
+                self._exit_stack = exit_stack
+        return self._dynamodb
+
+    def _get_partition(self, key_values: tuple) -> int:
+        """Get the index of the split request of an item by its primary key values."""
+        if self.split_by == "partition":
+            return hash(key_values) % self.max_parallel_requests
+        return 0
+
+    def _send_split_requests(
+        self, result: list, requests: list[tuple[list[int], Callable[[list], Awaitable[None]]]]
+    ) -> list:
+        """Send the split requests of a batch concurrently.
+
+        Args:
+            result (list): The results of the batch items, filled by the requests.
+            requests (list[tuple[list[int], Callable[[list], Awaitable[None]]]]): The indexes of the items of
+                each request, and a function sending the request and filling their results.
+
+        Returns:
+            list: The results of the batch, where the items of the requests are replaced by futures resolved
+                when their request completes.
+        """
+        loop = asyncio.get_running_loop()
+        futures = list(result)
+        for indexes, send_request in requests:
+            requests_futures = [loop.create_future() for _ in indexes]
+            for ind, future in zip(indexes, requests_futures, strict=True):
+                futures[ind] = future
+            task = loop.create_task(self._send_split_request(result, indexes, requests_futures, send_request))
+            self._split_requests.add(task)
+            task.add_done_callback(self._split_requests.discard)
+        return futures
+
+    async def _send_split_request(
+        self,
+        result: list,
+        indexes: list[int],
+        futures: list[asyncio.Future],
+        send_request: Callable[[list], Awaitable[None]],
+    ):
+        try:
+            async with self._requests_semaphore:
+                await send_request(result)
+        except asyncio.CancelledError:
+            for future in futures:
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+        else:
+            for ind, future in zip(indexes, futures, strict=True):
+                future.set_result(result[ind])
+
+    @staticmethod
+    def _is_throttling_error(error: ClientError) -> bool:
+        """Check if the whole request was throttled, so its items should be retried."""
+        return error.response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+    async def _close(self):
+        if self._exit_stack is not None:
+            exit_stack, self._exit_stack, self._dynamodb = self._exit_stack, None, None
+            await exit_stack.aclose()
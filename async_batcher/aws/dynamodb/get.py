@@ -1,13 +1,19 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+from dataclasses import dataclass, field
+from functools import partial
 from typing import TYPE_CHECKING, Any
 
-import aioboto3
+from botocore.exceptions import ClientError
 
-from async_batcher.batcher import AsyncBatcher
+from async_batcher.aws.dynamodb.base import AsyncDynamoDbBatcher
+from async_batcher.retry import RetryLater
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Hashable, Sequence
+
+    import aioboto3
     from aiobotocore.config import AioConfig
     from types_aiobotocore_dynamodb import DynamoDBServiceResource
     from types_aiobotocore_dynamodb.type_defs import TableAttributeValueTypeDef
@@ -15,13 +21,75 @@ if TYPE_CHECKING:
 
 @dataclass(kw_only=True)
 class GetItem:
+    """A DynamoDB item to read.
+
+    Attributes:
+        table_name (str): The name of the table.
+        key (dict[str, TableAttributeValueTypeDef]): The primary key of the item.
+        projection (Sequence[str], optional): The names of the top-level attributes to get. If None, all the
+            attributes are returned. Defaults to None.
+        consistent_read (bool, optional): Whether to use a strongly consistent read. Defaults to False.
+    """
+
     table_name: str
     key: dict[str, TableAttributeValueTypeDef]
+    projection: Sequence[str] | None = None
+    consistent_read: bool = False
+
+
+def get_item_coalesce_key(item: GetItem) -> tuple:
+    """Get a hashable key identifying the items which read the same DynamoDB item."""
+    projection = None if item.projection is None else tuple(sorted(item.projection))
+    return item.table_name, item.consistent_read, projection, *sorted(item.key.items())
+
+
+@dataclass
+class _TableKeys:
+    """The keys read from a table with the same consistency, which are sent in the same request."""
+
+    table_name: str
+    consistent_read: bool
+    key_names: list[str]
+    # the batch indexes of the items by key values, the same key can be read with different projections
+    indexes: dict[tuple, list[int]] = field(default_factory=dict)
+    keys: list[dict[str, TableAttributeValueTypeDef]] = field(default_factory=list)
+    # the merged projection of the items, None if one of them reads the whole item
+    projection: set[str] | None = field(default_factory=set)
+
+    def add(self, index: int, item: GetItem):
+        key_values = self.get_key_values(item.key)
+        if key_values not in self.indexes:
+            self.indexes[key_values] = []
+            self.keys.append(item.key)
+        self.indexes[key_values].append(index)
+        if item.projection is None:
+            self.projection = None
+        elif self.projection is not None:
+            self.projection.update(item.projection)
+
+    def get_batch_indexes(self) -> list[int]:
+        return [index for indexes in self.indexes.values() for index in indexes]
 
+    def get_key_values(self, item: dict[str, Any]) -> tuple:
+        return tuple(item[name] for name in self.key_names)
 
-class AsyncDynamoDbGetBatcher(AsyncBatcher[GetItem, dict[str, Any]]):
+    def to_request(self) -> dict[str, Any]:
+        request: dict[str, Any] = {"Keys": self.keys, "ConsistentRead": self.consistent_read}
+        if self.projection is not None:
+            # the key attributes are needed to match the returned items with the batch items
+            attributes = sorted(self.projection.union(self.key_names))
+            request["ProjectionExpression"] = ", ".join(f"#a{ind}" for ind in range(len(attributes)))
+            request["ExpressionAttributeNames"] = {f"#a{ind}": name for ind, name in enumerate(attributes)}
+        return request
+
+
+class AsyncDynamoDbGetBatcher(AsyncDynamoDbBatcher[GetItem, dict[str, Any]]):
     """Batcher for DynamoDB GetItem operation. It uses aioboto3 to interact with DynamoDB.
 
+    The items of the same table with the same consistency are read in a single request, with the union of
+    their projections, then each result is trimmed to the projection of its item. The items which can't
+    share a request (the same table with different consistencies) are read in parallel requests.
+
     Args:
         region_name: The region to use.
         use_ssl: Whether to use SSL/TLS.
@@ -29,6 +97,12 @@ class AsyncDynamoDbGetBatcher(AsyncBatcher[GetItem, dict[str, Any]]):
         endpoint_url: The complete URL to use for the constructed client. This is useful for local testing.
         config: The configuration for the session.
         aioboto3_session: The aioboto3 session to use. If not provided, a new session is created.
+        max_pool_connections (int, optional): The max number of connections to keep in the client connection
+            pool. If None, it will use the value of `config`, or the botocore default (10).
+            Defaults to None.
+        retry_policy (RetryPolicy, optional): The policy used to retry the unprocessed keys and the throttled
+            requests. If None, these items fail with a `RetriesExhaustedException`.
+            Defaults to `RetryPolicy()`.
         max_batch_size (int, optional): The max number of items to process in a batch.The default is 100
             items, which is the maximum number of items that can be processed in a single batch.
         max_queue_time (float, optional): The max time for a task to stay in the queue before processing
@@ -36,6 +110,14 @@ class AsyncDynamoDbGetBatcher(AsyncBatcher[GetItem, dict[str, Any]]):
             Defaults to 0.01.
         concurrency (int, optional): The max number of concurrent batches to process. Defaults to 1.
             If -1, it will process all batches concurrently.
+        coalesce_key (Callable[[GetItem], Hashable], optional): A function to get a key for each item, to
+            coalesce the pending and in-flight items reading the same DynamoDB item with the same projection
+            and consistency. Defaults to `get_item_coalesce_key`.
+        split_by (Literal["table", "partition"], optional): How to split the batches into parallel requests:
+            one request per table, or `max_parallel_requests` requests per table by hash of the primary key.
+            If None, a batch is sent in a single request. Defaults to None.
+        max_parallel_requests (int, optional): The max number of split requests sent concurrently, shared by
+            all the batches. Defaults to 4.
     """
 
     def __init__(
@@ -47,50 +129,115 @@ class AsyncDynamoDbGetBatcher(AsyncBatcher[GetItem, dict[str, Any]]):
         endpoint_url: str | None = None,
         config: AioConfig | None = None,
         aioboto3_session: aioboto3.Session | None = None,
+        max_pool_connections: int | None = None,
         max_batch_size: int = 100,
         max_queue_time: float = 0.01,
         concurrency: int = 1,
+        coalesce_key: Callable[[GetItem], Hashable] | None = get_item_coalesce_key,
         **kwargs,
     ):
         super().__init__(
-            max_batch_size=max_batch_size, max_queue_time=max_queue_time, concurrency=concurrency, **kwargs
+            region_name=region_name,
+            use_ssl=use_ssl,
+            verify=verify,
+            endpoint_url=endpoint_url,
+            config=config,
+            aioboto3_session=aioboto3_session,
+            max_pool_connections=max_pool_connections,
+            max_batch_size=max_batch_size,
+            max_queue_time=max_queue_time,
+            concurrency=concurrency,
+            coalesce_key=coalesce_key,
+            **kwargs,
         )
-        self.region_name = region_name
-        self.use_ssl = use_ssl
-        self.verify = verify
-        self.endpoint_url = endpoint_url
-        self.config = config
-        self.aioboto3_session = aioboto3_session or aioboto3.Session()
 
     async def process_batch(self, batch: list[GetItem]) -> list[dict[str, TableAttributeValueTypeDef]]:
-        indexed_items: dict[tuple, int] = {}
-        request_items = {}
-        tables_keys = {}
+        tables_keys: dict[tuple[str, bool, int], _TableKeys] = {}
         for ind, item in enumerate(batch):
-            if item.table_name not in request_items:
-                request_items[item.table_name] = {"Keys": []}
-                tables_keys[item.table_name] = sorted(item.key.keys())
-            # TODO: support ProjectionExpression and ConsistentRead
-            request_items[item.table_name]["Keys"].append(item.key)
-            indexed_items[(item.table_name, *[item.key[key] for key in tables_keys[item.table_name]])] = ind
-
-        dynamodb: DynamoDBServiceResource
-        async with self.aioboto3_session.resource(
-            "dynamodb",
-            region_name=self.region_name,
-            use_ssl=self.use_ssl,
-            verify=self.verify,
-            endpoint_url=self.endpoint_url,
-            config=self.config,
-        ) as dynamodb:
+            group_key = (
+                item.table_name,
+                item.consistent_read,
+                self._get_partition(tuple(sorted(item.key.items()))),
+            )
+            table_keys = tables_keys.get(group_key)
+            if table_keys is None:
+                table_keys = _TableKeys(
+                    table_name=item.table_name,
+                    consistent_read=item.consistent_read,
+                    key_names=sorted(item.key.keys()),
+                )
+                tables_keys[group_key] = table_keys
+            table_keys.add(ind, item)
+
+        dynamodb = await self._get_dynamodb()
+        result: list[None | dict[str, TableAttributeValueTypeDef] | RetryLater] = [None] * len(batch)
+        if self.split_by is not None:
+            return self._send_split_requests(
+                result,
+                [
+                    (
+                        table_keys.get_batch_indexes(),
+                        partial(self._batch_get_items, dynamodb, {table_keys.table_name: table_keys}, batch),
+                    )
+                    for table_keys in tables_keys.values()
+                ],
+            )
+
+        # a table can appear only once in a request, so the reads of a table with different consistencies
+        # are sent in separate requests, which are dispatched in parallel
+        requests: list[dict[str, _TableKeys]] = []
+        for table_keys in tables_keys.values():
+            for request in requests:
+                if table_keys.table_name not in request:
+                    request[table_keys.table_name] = table_keys
+                    break
+            else:
+                requests.append({table_keys.table_name: table_keys})
+        errors = await asyncio.gather(
+            *[self._batch_get_items(dynamodb, request, batch, result) for request in requests],
+            return_exceptions=True,
+        )
+        for error in errors:
+            if error is not None:
+                raise error
+        return result
+
+    async def _batch_get_items(
+        self,
+        dynamodb: DynamoDBServiceResource,
+        request: dict[str, _TableKeys],
+        batch: list[GetItem],
+        result: list,
+    ):
+        try:
             response = await dynamodb.batch_get_item(
-                RequestItems=request_items,
+                RequestItems={
+                    table_name: table_keys.to_request() for table_name, table_keys in request.items()
+                },
                 ReturnConsumedCapacity="NONE",
             )
-            result: list[None | dict[str, TableAttributeValueTypeDef]] = [None] * len(batch)
-            # TODO: handle UnprocessedKeys
-            for table in response["Responses"]:
-                for item in response["Responses"][table]:
-                    index = indexed_items[(table, *[item[key] for key in tables_keys[table]])]
-                    result[index] = item
-            return result
+        except ClientError as e:
+            if not self._is_throttling_error(e):
+                raise
+            retry_later = RetryLater(e)
+            for table_keys in request.values():
+                for indexes in table_keys.indexes.values():
+                    for index in indexes:
+                        result[index] = retry_later
+            return
+        for table_name, items in response["Responses"].items():
+            table_keys = request[table_name]
+            for item in items:
+                for index in table_keys.indexes[table_keys.get_key_values(item)]:
+                    projection = batch[index].projection
+                    if projection is None:
+                        result[index] = item
+                    else:
+                        result[index] = {name: item[name] for name in projection if name in item}
+        # the keys not processed because of the throttling or the response size limit
+        retry_later = RetryLater()
+        for table_name, unprocessed in response.get("UnprocessedKeys", {}).items():
+            table_keys = request[table_name]
+            for key in unprocessed["Keys"]:
+                for index in table_keys.indexes[table_keys.get_key_values(key)]:
+                    result[index] = retry_later
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import partial
 from typing import TYPE_CHECKING, Literal
 
-import aioboto3
+from botocore.exceptions import ClientError
 
-from async_batcher.batcher import AsyncBatcher
+from async_batcher.aws.dynamodb.base import MAX_REQUEST_SIZE, AsyncDynamoDbBatcher, get_item_size
+from async_batcher.retry import ResultOf, RetryLater
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
+    import aioboto3
     from aiobotocore.config import AioConfig
     from types_aiobotocore_dynamodb import DynamoDBServiceResource
     from types_aiobotocore_dynamodb.type_defs import TableAttributeValueTypeDef
@@ -20,9 +25,19 @@ class WriteOperation:
     data: dict[str, TableAttributeValueTypeDef]
 
 
-class AsyncDynamoDbWriteBatcher(AsyncBatcher[WriteOperation, None]):
+def get_write_operation_size(operation: WriteOperation) -> int:
+    """Estimate the size of the item, or the key, written by a DynamoDB write operation."""
+    return get_item_size(operation.data)
+
+
+class AsyncDynamoDbWriteBatcher(AsyncDynamoDbBatcher[WriteOperation, None]):
     """Batcher for DynamoDB WriteOperation. It uses aioboto3 to interact with DynamoDB.
 
+    When `combine_writes` is True, the operations of a batch writing the same primary key are collapsed into
+    the last one (last writer wins), because DynamoDB rejects a batch request writing the same key twice.
+    The superseded operations are not written, and they get the final result of the last operation: they
+    succeed or fail with it, and when it's retried, they are resolved once its retries finish.
+
     Args:
         region_name: The region to use.
         use_ssl: Whether to use SSL/TLS.
@@ -30,6 +45,12 @@ class AsyncDynamoDbWriteBatcher(AsyncBatcher[WriteOperation, None]):
         endpoint_url: The complete URL to use for the constructed client. This is useful for local testing.
         config: The configuration for the session.
         aioboto3_session: The aioboto3 session to use. If not provided, a new session is created.
+        max_pool_connections (int, optional): The max number of connections to keep in the client connection
+            pool. If None, it will use the value of `config`, or the botocore default (10).
+            Defaults to None.
+        retry_policy (RetryPolicy, optional): The policy used to retry the unprocessed items and the throttled
+            requests. If None, these items fail with a `RetriesExhaustedException`.
+            Defaults to `RetryPolicy()`.
         max_batch_size (int, optional): The max number of items to process in a batch. The default is 25
             items, which is the maximum number of items that can be processed in a single batch.
         max_queue_time (float, optional): The max time for a task to stay in the queue before processing
@@ -37,6 +58,20 @@ class AsyncDynamoDbWriteBatcher(AsyncBatcher[WriteOperation, None]):
             Defaults to 0.01.
         concurrency (int, optional): The max number of concurrent batches to process.
             Defaults to 1. If -1, it will process all batches concurrently.
+        item_weight (Callable[[WriteOperation], float], optional): A function to get the weight of each
+            operation. Defaults to `get_write_operation_size`, the estimated size of the written item.
+        max_batch_weight (float, optional): The max total weight of the operations of a batch.
+            Defaults to 16 MB, the max size of a DynamoDB batch request.
+        combine_writes (bool, optional): Whether to collapse the operations writing the same primary key
+            in a batch into the last one. Defaults to False.
+        table_keys (dict[str, Sequence[str]], optional): The names of the primary key attributes by table,
+            used to combine the writes. The key schema of the other tables is loaded with `describe_table`
+            on their first write, which requires the `dynamodb:DescribeTable` permission. Defaults to None.
+        split_by (Literal["table", "partition"], optional): How to split the batches into parallel requests:
+            one request per table, or `max_parallel_requests` requests per table by hash of the primary key.
+            If None, a batch is sent in a single request. Defaults to None.
+        max_parallel_requests (int, optional): The max number of split requests sent concurrently, shared by
+            all the batches. Defaults to 4.
     """
 
     def __init__(
@@ -48,45 +83,134 @@ class AsyncDynamoDbWriteBatcher(AsyncBatcher[WriteOperation, None]):
         endpoint_url: str | None = None,
         config: AioConfig | None = None,
         aioboto3_session: aioboto3.Session | None = None,
+        max_pool_connections: int | None = None,
         max_batch_size: int = 25,
         max_queue_time: float = 0.01,
         concurrency: int = 1,
+        item_weight: Callable[[WriteOperation], float] | None = get_write_operation_size,
+        max_batch_weight: float | None = MAX_REQUEST_SIZE,
+        combine_writes: bool = False,
+        table_keys: dict[str, Sequence[str]] | None = None,
         **kwargs,
     ):
         super().__init__(
-            max_batch_size=max_batch_size, max_queue_time=max_queue_time, concurrency=concurrency, **kwargs
+            region_name=region_name,
+            use_ssl=use_ssl,
+            verify=verify,
+            endpoint_url=endpoint_url,
+            config=config,
+            aioboto3_session=aioboto3_session,
+            max_pool_connections=max_pool_connections,
+            max_batch_size=max_batch_size,
+            max_queue_time=max_queue_time,
+            concurrency=concurrency,
+            item_weight=item_weight,
+            max_batch_weight=max_batch_weight,
+            **kwargs,
         )
-        self.region_name = region_name
-        self.use_ssl = use_ssl
-        self.verify = verify
-        self.endpoint_url = endpoint_url
-        self.config = config
-        self.aioboto3_session = aioboto3_session or aioboto3.Session()
-
-    async def process_batch(self, batch: list[WriteOperation]) -> None:
-        request_items = {}
-        for operation in batch:
-            if operation.table_name not in request_items:
-                request_items[operation.table_name] = []
+        self.combine_writes = combine_writes
+        self.table_keys: dict[str, list[str]] = {
+            table_name: list(key_names) for table_name, key_names in (table_keys or {}).items()
+        }
+
+    async def _get_table_keys(self, table_name: str) -> list[str]:
+        """Get the names of the primary key attributes of a table."""
+        key_names = self.table_keys.get(table_name)
+        if key_names is None:
+            dynamodb = await self._get_dynamodb()
+            response = await dynamodb.meta.client.describe_table(TableName=table_name)
+            key_names = [key["AttributeName"] for key in response["Table"]["KeySchema"]]
+            self.table_keys[table_name] = key_names
+        return key_names
+
+    async def process_batch(self, batch: list[WriteOperation]) -> list[None | RetryLater | ResultOf]:
+        # the batch indexes and the requests of the operations, by table and split request
+        groups: dict[tuple[str, int], list[tuple[int, dict]]] = {}
+        # the position of the request writing each primary key, by table
+        tables_positions: dict[str, dict[tuple, int]] = {}
+        # the index of the operation replacing each superseded operation
+        superseded: dict[int, int] = {}
+        for ind, operation in enumerate(batch):
             request = {}
             if operation.operation == "PUT":
                 request["PutRequest"] = {"Item": operation.data}
             elif operation.operation == "DELETE":
                 request["DeleteRequest"] = {"Key": operation.data}
-            request_items[operation.table_name].append(request)
-
-        dynamodb: DynamoDBServiceResource
-        async with self.aioboto3_session.resource(
-            "dynamodb",
-            region_name=self.region_name,
-            use_ssl=self.use_ssl,
-            verify=self.verify,
-            endpoint_url=self.endpoint_url,
-            config=self.config,
-        ) as dynamodb:
+            key_values = None
+            if self.combine_writes or self.split_by == "partition":
+                key_names = await self._get_table_keys(operation.table_name)
+                key_values = tuple(operation.data[name] for name in key_names)
+            group = groups.setdefault((operation.table_name, self._get_partition(key_values)), [])
+            if self.combine_writes:
+                table_positions = tables_positions.setdefault(operation.table_name, {})
+                position = table_positions.get(key_values)
+                if position is not None:
+                    # the last operation replaces the previous one in the request, and the superseded
+                    # operation gets its result
+                    superseded[group[position][0]] = ind
+                    group[position] = (ind, request)
+                    continue
+                table_positions[key_values] = len(group)
+            group.append((ind, request))
+
+        dynamodb = await self._get_dynamodb()
+        result: list = [None] * len(batch)
+        if self.split_by is not None:
+            result = self._send_split_requests(
+                result,
+                [
+                    (
+                        [ind for ind, _ in group],
+                        partial(self._batch_write_items, dynamodb, {group_key: group}),
+                    )
+                    for group_key, group in groups.items()
+                ],
+            )
+        else:
+            await self._batch_write_items(dynamodb, groups, result)
+        # an operation may be superseded by an operation superseded later, so the chains are resolved backward
+        for ind in reversed(superseded):
+            survivor = superseded[ind]
+            superseded[ind] = superseded.get(survivor, survivor)
+            result[ind] = ResultOf(superseded[ind])
+        return result
+
+    async def _batch_write_items(
+        self,
+        dynamodb: DynamoDBServiceResource,
+        groups: dict[tuple[str, int], list[tuple[int, dict]]],
+        result: list,
+    ):
+        request_items: dict[str, list[dict]] = {}
+        for (table_name, _), group in groups.items():
+            request_items.setdefault(table_name, []).extend(request for _, request in group)
+        try:
             # TODO: return something useful
-            await dynamodb.batch_write_item(
+            response = await dynamodb.batch_write_item(
                 RequestItems=request_items,
                 ReturnConsumedCapacity="NONE",
                 ReturnItemCollectionMetrics="NONE",
             )
+        except ClientError as e:
+            if not self._is_throttling_error(e):
+                raise
+            retry_later = RetryLater(e)
+            for group in groups.values():
+                for ind, _ in group:
+                    result[ind] = retry_later
+            return
+        # the unprocessed requests are returned as sent, so they are matched with the batch requests
+        retry_later = RetryLater()
+        for table_name, unprocessed_requests in response.get("UnprocessedItems", {}).items():
+            table_requests = [
+                (ind, request)
+                for (group_table_name, _), group in groups.items()
+                if group_table_name == table_name
+                for ind, request in group
+            ]
+            for unprocessed_request in unprocessed_requests:
+                for position, (ind, request) in enumerate(table_requests):
+                    if request == unprocessed_request:
+                        result[ind] = retry_later
+                        del table_requests[position]
+                        break
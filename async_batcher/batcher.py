@@ -4,18 +4,78 @@ import abc
 import asyncio
 import logging
 import warnings
-from collections import namedtuple
-from typing import TYPE_CHECKING, Generic, TypeVar
+from collections import deque, namedtuple
+from functools import partial
+from typing import TYPE_CHECKING, Generic, Literal, TypeVar
 
-from async_batcher.exceptions import QueueFullException
+from async_batcher.cache import CACHE_MISS
+from async_batcher.exceptions import (
+    AsyncBatchException,
+    DeadlineExceededException,
+    QueueFullException,
+    RetriesExhaustedException,
+)
+from async_batcher.metrics import (
+    BATCH_ERRORS,
+    BATCH_FILL_RATIO,
+    BATCH_SIZE,
+    BATCH_WEIGHT,
+    EXPIRED_ITEMS,
+    INFLIGHT_BATCHES,
+    ITEM_ERRORS,
+    PROCESSING_TIME,
+    QUEUE_DEPTH,
+    QUEUE_WAIT_TIME,
+    REJECTED_ITEMS,
+    RETRIED_ITEMS,
+)
+from async_batcher.queues import PriorityQueue
+from async_batcher.retry import ResultOf, RetryLater
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Hashable, Sequence
     from concurrent.futures import Executor
 
+    from async_batcher.adaptive import AdaptiveBatchController
+    from async_batcher.cache import BatchCache
+    from async_batcher.metrics import MetricsSink
+    from async_batcher.retry import RetryPolicy
+
 T = TypeVar("T")
 S = TypeVar("S")
 
 
+class _ItemsGroup:
+    """The results of a group of items submitted together with `AsyncBatcher.process_many`."""
+
+    __slots__ = ("future", "size", "results", "remaining", "first_exception", "return_exceptions")
+
+    def __init__(self, future: asyncio.Future, size: int, return_exceptions: bool):
+        self.future = future
+        self.size = size
+        self.results: list = [None] * size
+        self.remaining = size
+        self.first_exception: Exception | None = None
+        self.return_exceptions = return_exceptions
+
+    def set_result_from_future(self, index: int, future: asyncio.Future):
+        if future.cancelled():
+            self.set_result(index, asyncio.CancelledError())
+        else:
+            self.set_result(index, future.exception() or future.result())
+
+    def set_result(self, index: int, result):
+        self.results[index] = result
+        if self.first_exception is None and isinstance(result, Exception):
+            self.first_exception = result
+        self.remaining -= 1
+        if self.remaining == 0 and not self.future.done():
+            if self.first_exception is not None and not self.return_exceptions:
+                self.future.set_exception(self.first_exception)
+            else:
+                self.future.set_result(self.results)
+
+
 class AsyncBatcher(Generic[T, S], abc.ABC):
     """A generic class for batching and processing items asynchronously.
 
@@ -31,10 +91,54 @@ class AsyncBatcher(Generic[T, S], abc.ABC):
             Defaults to 1. If -1, it will process all batches concurrently.
         executor (Executor, optional): The executor to use to process the batch if the `process_batch` method
             is not a Coroutine. If None, it will use the default asyncio executor. Defaults to None.
+        adaptive_controller (AdaptiveBatchController, optional): A controller to tune the batch size and
+            the queue time at runtime, within the limits of `max_batch_size` and `max_queue_time`.
+            If None, the static configuration is used. Defaults to None.
+        scheduling (Literal["fifo", "priority"], optional): The order used to retrieve the items from the
+            queue. With "priority", the items are retrieved by priority then by earliest deadline first,
+            which allows the latency-sensitive items to skip the queue. Defaults to "fifo".
+        coalesce_key (Callable[[T], Hashable], optional): A function to get a key for each item. If provided,
+            an item with the same key as a pending or in-flight item is not added to the queue, and it gets
+            the result of the first one (processed with the first item priority and deadline).
+            Defaults to None.
+        cache (BatchCache, optional): A cache for the results. If provided, the cached results are returned
+            without adding the items to the queue, and the results of the processed items are cached.
+            The exceptions are not cached. Defaults to None.
+        cache_key (Callable[[T], Hashable], optional): A function to get the cache key of each item.
+            If None, the item itself is used as key. Defaults to None.
+        metrics (MetricsSink, optional): A sink for the batcher metrics (queue wait time, batch size and fill
+            ratio, processing time, queue depth, in-flight batches, errors, rejected and expired items).
+            If None, the metrics are not collected. Defaults to None.
+        retry_policy (RetryPolicy, optional): The policy used to retry the items for which `process_batch`
+            returns `RetryLater`. The retried items are merged into the next batches, and they fail with
+            a `RetriesExhaustedException` after the max attempts, or with a `DeadlineExceededException` if
+            their deadline expires before the next retry. If None, these items fail on the first attempt.
+            Defaults to None.
+        item_weight (Callable[[T], float], optional): A function to get the weight of each item (e.g. its
+            size in bytes), used with `max_batch_weight`. Defaults to None.
+        max_batch_weight (float, optional): The max total weight of the items of a batch. A batch is closed
+            when the next item would exceed it, and this item is moved to the next batch. An item heavier than
+            the limit is processed alone in a batch. If None, the batches are limited by the count only.
+            Defaults to None.
     """
 
     logger = logging.getLogger(__name__)
-    QueueItem = namedtuple("QueueItem", ["item", "future"])
+    QueueItem = namedtuple(
+        "QueueItem",
+        [
+            "item",
+            "future",
+            "group",
+            "index",
+            "priority",
+            "deadline",
+            "cache_key",
+            "enqueued_at",
+            "attempt",
+            "followers",
+        ],
+        defaults=(None, None, 0, None, None, None, 1, None),
+    )
 
     def __init__(
         self,
@@ -44,6 +148,15 @@ class AsyncBatcher(Generic[T, S], abc.ABC):
         concurrency: int = 1,
         max_queue_size: int = -1,
         executor: Executor | None = None,
+        adaptive_controller: AdaptiveBatchController | None = None,
+        scheduling: Literal["fifo", "priority"] = "fifo",
+        coalesce_key: Callable[[T], Hashable] | None = None,
+        cache: BatchCache | None = None,
+        cache_key: Callable[[T], Hashable] | None = None,
+        metrics: MetricsSink | None = None,
+        retry_policy: RetryPolicy | None = None,
+        item_weight: Callable[[T], float] | None = None,
+        max_batch_weight: float | None = None,
         **kwargs,
     ):
         super().__init__()
@@ -51,6 +164,12 @@ class AsyncBatcher(Generic[T, S], abc.ABC):
             raise ValueError("Valid max_batch_size value is greater than 1 or -1 for infinite")
         if concurrency is None or concurrency == 0:
             raise ValueError("Valid concurrency value is greater than 0 or -1 for infinite")
+        if scheduling not in ["fifo", "priority"]:
+            raise ValueError(f"Invalid scheduling: {scheduling}")
+        if (item_weight is None) != (max_batch_weight is None):
+            raise ValueError("item_weight and max_batch_weight should be provided together")
+        if max_batch_weight is not None and max_batch_weight <= 0:
+            raise ValueError("Valid max_batch_weight value is greater than 0")
         # check deprecated arguments
         if "sleep_time" in kwargs:
             warnings.warn(
@@ -76,64 +195,442 @@ class AsyncBatcher(Generic[T, S], abc.ABC):
         self.max_queue_time = max_queue_time
         self.concurrency = concurrency
         self.executor = executor
-        self._queue = asyncio.Queue(maxsize=max_queue_size)
+        self.adaptive_controller = adaptive_controller
+        if adaptive_controller is not None:
+            adaptive_controller.attach(max_batch_size=max_batch_size, max_queue_time=max_queue_time)
+        self.scheduling = scheduling
+        self.coalesce_key = coalesce_key
+        # the futures of the pending and in-flight items by coalescing key
+        self._coalesced_futures: dict[Hashable, asyncio.Future] = {}
+        self.cache = cache
+        self.cache_key = cache_key
+        self.metrics = metrics
+        self._inflight_batches = 0
+        self.retry_policy = retry_policy
+        # the number of items waiting for their retry delay
+        self._pending_retries = 0
+        self.item_weight = item_weight
+        self.max_batch_weight = max_batch_weight
+        # the total weight of the items of the batch being filled
+        self._batch_weight = 0
+        if scheduling == "priority":
+            self._queue = PriorityQueue(maxsize=max_queue_size)
+        else:
+            self._queue = asyncio.Queue(maxsize=max_queue_size)
         self._current_task: asyncio.Task | None = None
         self._running_batches: dict[int, asyncio.Task] = {}
         self._concurrency_semaphore = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+        self._collector_waiter: asyncio.Future | None = None
+        # the items taken from the queue which didn't fit in the previous batch
+        self._carry_over: deque[AsyncBatcher.QueueItem] = deque()
+        self._deadline_expired = False
         self._stop = asyncio.Event()
         self._is_running = asyncio.Event()
 
+    @property
+    def effective_max_batch_size(self) -> int:
+        """The max batch size currently used to fill the batches."""
+        if self.adaptive_controller is None:
+            return self.max_batch_size
+        return self.adaptive_controller.batch_size
+
+    @property
+    def effective_max_queue_time(self) -> float:
+        """The max queue time currently used to fill the batches."""
+        if self.adaptive_controller is None:
+            return self.max_queue_time
+        return self.adaptive_controller.queue_time
+
     @abc.abstractmethod
-    async def process_batch(self, batch: list[T]) -> list[S] | None:
+    async def process_batch(self, batch: list[T]) -> list[S | asyncio.Future[S]] | None:
         """Process a batch of items.
 
         This method should be overridden by the user to define how to process a batch of items.
+        A result can be an `asyncio.Future`, to resolve its item as soon as the future is done, instead of
+        when the whole batch is processed (e.g. when the batch is split into parallel requests). The batch
+        is considered processed when all its futures are done.
         """
 
-    async def process(self, item: T) -> S:
+    async def process(self, item: T, priority: int = 0, deadline: float | None = None) -> S:
         """Add an item to the queue and get the result when it's ready.
 
         Args:
             item (T): The item to process.
+            priority (int, optional): The priority of the item, the lower values are processed first.
+                It requires the "priority" scheduling. Defaults to 0.
+            deadline (float, optional): The loop time after which the item is dropped with a
+                `DeadlineExceededException` if it's not processed yet. Defaults to None.
 
         Returns:
             S: The result of processing the item.
         """
+        loop = self._ensure_running(priority)
+        cache_key, result = self._get_cached_result(item)
+        if result is not CACHE_MISS:
+            return result
+        future = self._submit_nowait(loop, item, True, priority, deadline, cache_key)
+        await future
+        return future.result()
+
+    def _get_cached_result(self, item: T) -> tuple[Hashable | None, object]:
+        if self.cache is None:
+            return None, CACHE_MISS
+        cache_key = item if self.cache_key is None else self.cache_key(item)
+        return cache_key, self.cache.get(cache_key)
+
+    @staticmethod
+    def _resolved_future(
+        loop: asyncio.AbstractEventLoop, result, return_future: bool
+    ) -> asyncio.Future | None:
+        if not return_future:
+            return None
+        future = loop.create_future()
+        future.set_result(result)
+        return future
+
+    def _ensure_running(self, priority: int = 0) -> asyncio.AbstractEventLoop:
         if self._stop.is_set():
             raise RuntimeError("Batcher is stopped")
+        if priority and self.scheduling != "priority":
+            raise ValueError("The item priority requires the 'priority' scheduling")
+        loop = asyncio.get_running_loop()
         if self._current_task is None:
-            self._current_task = asyncio.get_running_loop().create_task(self.run())
+            self._current_task = loop.create_task(self.run())
+        return loop
+
+    def submit_nowait(
+        self, item: T, return_future: bool = True, priority: int = 0, deadline: float | None = None
+    ) -> asyncio.Future[S] | None:
+        """Add an item to the queue without waiting for its result.
+
+        Args:
+            item (T): The item to process.
+            return_future (bool, optional): Whether to create a future for the result. If False, the
+                result is dropped, which avoids the future allocation when the caller doesn't need it.
+                Defaults to True.
+            priority (int, optional): The priority of the item, the lower values are processed first.
+                It requires the "priority" scheduling. Defaults to 0.
+            deadline (float, optional): The loop time after which the item is dropped with a
+                `DeadlineExceededException` if it's not processed yet. Defaults to None.
+
+        Returns:
+            asyncio.Future[S] | None: A future resolved with the result of processing the item, or None
+                if `return_future` is False.
+
+        Raises:
+            QueueFullException: If the queue is full.
+        """
+        loop = self._ensure_running(priority)
+        cache_key, result = self._get_cached_result(item)
+        if result is not CACHE_MISS:
+            return self._resolved_future(loop, result, return_future)
+        return self._submit_nowait(loop, item, return_future, priority, deadline, cache_key)
+
+    def _submit_nowait(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        item: T,
+        return_future: bool,
+        priority: int,
+        deadline: float | None,
+        cache_key: Hashable | None,
+    ) -> asyncio.Future[S] | None:
         logging.debug(item)
-        future = asyncio.get_running_loop().create_future()
+        enqueued_at = loop.time() if self.metrics is not None else None
+        if self.coalesce_key is not None:
+            key = self.coalesce_key(item)
+            coalesced_future = self._coalesced_futures.get(key)
+            if coalesced_future is None:
+                coalesced_future = loop.create_future()
+                self._put_nowait(
+                    self.QueueItem(
+                        item, coalesced_future, None, None, priority, deadline, cache_key, enqueued_at
+                    )
+                )
+                self._register_coalesced_future(key, coalesced_future)
+            return self._follow_future(coalesced_future, loop) if return_future else None
+        future = loop.create_future() if return_future else None
+        self._put_nowait(self.QueueItem(item, future, None, None, priority, deadline, cache_key, enqueued_at))
+        return future
+
+    def _put_nowait(self, q_item: QueueItem):
         if self._queue.full():
+            if self.metrics is not None:
+                self.metrics.increment(REJECTED_ITEMS)
             raise QueueFullException("The queue is full, cannot process more items at the moment.")
-        await self._queue.put(self.QueueItem(item, future))
-        await future
-        return future.result()
+        self._queue.put_nowait(q_item)
+        if self.adaptive_controller is not None:
+            self.adaptive_controller.record_arrivals(1)
+        if self._collector_waiter is not None:
+            self._wakeup_collector()
 
-    async def _fill_batch_from_queue(self, started_at: float | None) -> list[QueueItem]:
-        try:
-            batch = [await asyncio.wait_for(self._queue.get(), timeout=1.0)]
-        except asyncio.TimeoutError:
+    def _register_coalesced_future(self, key: Hashable, future: asyncio.Future):
+        self._coalesced_futures[key] = future
+        future.add_done_callback(partial(self._release_coalesced_future, key))
+
+    def _release_coalesced_future(self, key: Hashable, future: asyncio.Future):
+        if self._coalesced_futures.get(key) is future:
+            del self._coalesced_futures[key]
+        if not future.cancelled():
+            # mark the exception as retrieved, the followers get it from their own futures
+            future.exception()
+
+    @staticmethod
+    def _copy_future_state(target: asyncio.Future, source: asyncio.Future):
+        if target.done():
+            return
+        if source.cancelled():
+            target.cancel()
+        elif source.exception() is not None:
+            target.set_exception(source.exception())
+        else:
+            target.set_result(source.result())
+
+    def _follow_future(self, future: asyncio.Future, loop: asyncio.AbstractEventLoop) -> asyncio.Future:
+        # each caller gets its own future, so cancelling it doesn't affect the other callers
+        follower = loop.create_future()
+        future.add_done_callback(partial(self._copy_future_state, follower))
+        return follower
+
+    async def submit(
+        self, item: T, return_future: bool = True, priority: int = 0, deadline: float | None = None
+    ) -> asyncio.Future[S] | None:
+        """Add an item to the queue, waiting for a free slot if it's full, without waiting for its result.
+
+        Args:
+            item (T): The item to process.
+            return_future (bool, optional): Whether to create a future for the result. If False, the
+                result is dropped, which avoids the future allocation when the caller doesn't need it.
+                Defaults to True.
+            priority (int, optional): The priority of the item, the lower values are processed first.
+                It requires the "priority" scheduling. Defaults to 0.
+            deadline (float, optional): The loop time after which the item is dropped with a
+                `DeadlineExceededException` if it's not processed yet. Defaults to None.
+
+        Returns:
+            asyncio.Future[S] | None: A future resolved with the result of processing the item, or None
+                if `return_future` is False.
+        """
+        loop = self._ensure_running(priority)
+        cache_key, result = self._get_cached_result(item)
+        if result is not CACHE_MISS:
+            return self._resolved_future(loop, result, return_future)
+        logging.debug(item)
+        enqueued_at = loop.time() if self.metrics is not None else None
+        if self.coalesce_key is not None:
+            key = self.coalesce_key(item)
+            coalesced_future = self._coalesced_futures.get(key)
+            if coalesced_future is None:
+                coalesced_future = loop.create_future()
+                # the key is registered once the item is in the queue, so the other callers can't follow
+                # an item whose caller is cancelled while waiting for a free slot
+                await self._put(
+                    self.QueueItem(
+                        item, coalesced_future, None, None, priority, deadline, cache_key, enqueued_at
+                    )
+                )
+                self._register_coalesced_future(key, coalesced_future)
+            return self._follow_future(coalesced_future, loop) if return_future else None
+        future = loop.create_future() if return_future else None
+        await self._put(self.QueueItem(item, future, None, None, priority, deadline, cache_key, enqueued_at))
+        return future
+
+    async def _put(self, q_item: QueueItem):
+        await self._queue.put(q_item)
+        if self.adaptive_controller is not None:
+            self.adaptive_controller.record_arrivals(1)
+        if self._collector_waiter is not None:
+            self._wakeup_collector()
+
+    async def process_many(
+        self,
+        items: Sequence[T],
+        return_exceptions: bool = False,
+        priority: int = 0,
+        deadline: float | None = None,
+    ) -> list[S]:
+        """Add a sequence of items to the queue and get their results when they are ready.
+
+        The items are enqueued in one step with a single future for the whole sequence, which is cheaper
+        than calling `process` for each item. They are processed in the same batch if they fit in it,
+        otherwise they are split across multiple batches.
+
+        Args:
+            items (Sequence[T]): The items to process.
+            return_exceptions (bool, optional): Whether to return the exceptions in the results list
+                instead of raising the first one. Defaults to False.
+            priority (int, optional): The priority of the items, the lower values are processed first.
+                It requires the "priority" scheduling. Defaults to 0.
+            deadline (float, optional): The loop time after which the items are dropped with a
+                `DeadlineExceededException` if they are not processed yet. Defaults to None.
+
+        Returns:
+            list[S]: The results of processing the items, in the same order as the items.
+        """
+        if not items:
+            if self._stop.is_set():
+                raise RuntimeError("Batcher is stopped")
             return []
-        if started_at is None:
-            started_at = asyncio.get_event_loop().time()
-        while True:
+        loop = self._ensure_running(priority)
+        if self._queue.maxsize > 0 and self._queue.maxsize - self._queue.qsize() < len(items):
+            if self.metrics is not None:
+                self.metrics.increment(REJECTED_ITEMS, len(items))
+            raise QueueFullException("The queue is full, cannot process more items at the moment.")
+        group = _ItemsGroup(loop.create_future(), len(items), return_exceptions)
+        put_nowait = self._queue.put_nowait
+        queue_item = self.QueueItem
+        enqueued_at = loop.time() if self.metrics is not None else None
+        queue_size = self._queue.qsize()
+        for index, item in enumerate(items):
+            cache_key, result = self._get_cached_result(item)
+            if result is not CACHE_MISS:
+                group.set_result(index, result)
+            elif self.coalesce_key is not None:
+                # the item is enqueued separately, so its future can be shared with the other callers
+                key = self.coalesce_key(item)
+                coalesced_future = self._coalesced_futures.get(key)
+                if coalesced_future is None:
+                    coalesced_future = loop.create_future()
+                    put_nowait(
+                        queue_item(
+                            item, coalesced_future, None, None, priority, deadline, cache_key, enqueued_at
+                        )
+                    )
+                    self._register_coalesced_future(key, coalesced_future)
+                coalesced_future.add_done_callback(partial(group.set_result_from_future, index))
+            else:
+                put_nowait(queue_item(item, None, group, index, priority, deadline, cache_key, enqueued_at))
+        if self.adaptive_controller is not None:
+            self.adaptive_controller.record_arrivals(self._queue.qsize() - queue_size)
+        if self._collector_waiter is not None:
+            self._wakeup_collector()
+        return await group.future
+
+    def _wakeup_collector(self, deadline_expired: bool = False):
+        if deadline_expired:
+            self._deadline_expired = True
+        if self._collector_waiter is not None and not self._collector_waiter.done():
+            self._collector_waiter.set_result(None)
+
+    async def _wait_for_items(self):
+        """Wait until an item is added to the queue or the collector is woken up by a timer."""
+        self._collector_waiter = asyncio.get_running_loop().create_future()
+        try:
+            await self._collector_waiter
+        finally:
+            self._collector_waiter = None
+
+    def _has_pending_items(self) -> bool:
+        return bool(self._carry_over) or not self._queue.empty()
+
+    def _may_get_items(self) -> bool:
+        """Check if new items can be added to the queue, by the callers or by the retries."""
+        return (
+            not self._stop.is_set()
+            or self._pending_retries > 0
+            or (self.retry_policy is not None and bool(self._running_batches))
+        )
+
+    def _drain_queue(self, batch: list[QueueItem], max_batch_size: int) -> bool:
+        """Move the available items to the batch.
+
+        Returns:
+            bool: True if the batch can't accept more items, False if the queue is empty.
+        """
+        carry_over = self._carry_over
+        get_nowait = self._queue.get_nowait
+        now = None
+        while max_batch_size <= 0 or len(batch) < max_batch_size:
+            if carry_over:
+                q_item = carry_over.popleft()
+            else:
+                try:
+                    q_item = get_nowait()
+                except asyncio.QueueEmpty:
+                    return False
+            if q_item.deadline is not None:
+                if now is None:
+                    now = asyncio.get_running_loop().time()
+                if q_item.deadline <= now:
+                    if self.metrics is not None:
+                        self.metrics.increment(EXPIRED_ITEMS)
+                    self._set_item_result(
+                        q_item, DeadlineExceededException("The item deadline expired before processing it.")
+                    )
+                    continue
+            group = q_item.group
+            if (
+                group is not None
+                and q_item.index == 0
+                and batch
+                and len(batch) + group.size > max_batch_size >= group.size
+            ):
+                # keep the group items together in the next batch
+                carry_over.appendleft(q_item)
+                return True
+            if self.item_weight is not None:
+                weight = self.item_weight(q_item.item)
+                if batch and self._batch_weight + weight > self.max_batch_weight:
+                    carry_over.appendleft(q_item)
+                    return True
+                self._batch_weight += weight
+            batch.append(q_item)
+        return True
+
+    async def _fill_batch_from_queue(self, started_at: float | None) -> list[QueueItem]:
+        loop = asyncio.get_running_loop()
+        if not self._has_pending_items():
+            if not self._may_get_items():
+                return []
+            # to check if the batcher should stop, we wake up the collector after 1 second
+            timer = loop.call_later(1.0, self._wakeup_collector)
             try:
-                max_wait = self.max_queue_time - (asyncio.get_running_loop().time() - started_at)
-                if max_wait > 0:
-                    item = await asyncio.wait_for(self._queue.get(), timeout=self.max_queue_time)
-                else:
-                    item = self._queue.get_nowait()
-                batch.append(item)
-            except (asyncio.QueueEmpty, asyncio.TimeoutError):
-                break
-            if 0 < self.max_batch_size <= len(batch):
-                break
+                await self._wait_for_items()
+            finally:
+                timer.cancel()
+            if not self._has_pending_items():
+                return []
+        if started_at is None:
+            started_at = loop.time()
+        max_batch_size = self.effective_max_batch_size
+        batch = []
+        self._batch_weight = 0
+        # a single timer is used to wake up the collector when the batch deadline expires,
+        # while the queue puts wake it up only when it's waiting for new items
+        self._deadline_expired = loop.time() >= started_at + self.effective_max_queue_time
+        timer = None
+        try:
+            while True:
+                if self._drain_queue(batch, max_batch_size) or self._deadline_expired:
+                    break
+                if timer is None:
+                    timer = loop.call_at(
+                        started_at + self.effective_max_queue_time, self._wakeup_collector, True
+                    )
+                await self._wait_for_items()
+        finally:
+            if timer is not None:
+                timer.cancel()
         return batch
 
+    def _record_batch_start(self, batch: list[QueueItem], started_at: float):
+        self._inflight_batches += 1
+        self.metrics.gauge(INFLIGHT_BATCHES, self._inflight_batches)
+        self.metrics.gauge(QUEUE_DEPTH, self._queue.qsize() + len(self._carry_over))
+        self.metrics.observe(BATCH_SIZE, len(batch))
+        max_batch_size = self.effective_max_batch_size
+        if max_batch_size > 0:
+            self.metrics.observe(BATCH_FILL_RATIO, len(batch) / max_batch_size)
+        if self.item_weight is not None:
+            self.metrics.observe(BATCH_WEIGHT, sum(self.item_weight(q_item.item) for q_item in batch))
+        for q_item in batch:
+            if q_item.enqueued_at is not None:
+                self.metrics.observe(QUEUE_WAIT_TIME, started_at - q_item.enqueued_at)
+
     async def _batch_run(self, task_id: int, batch: list[QueueItem]):
         started_at = asyncio.get_event_loop().time()
+        if self.metrics is not None:
+            self._record_batch_start(batch, started_at)
         try:
             batch_items = [q_item.item for q_item in batch]
             if asyncio.iscoroutinefunction(self.process_batch):
@@ -146,19 +643,117 @@ class AsyncBatcher(Generic[T, S], abc.ABC):
                 results = [None] * len(batch)
             if len(results) != len(batch):
                 raise ValueError(f"Expected to get {len(batch)} results, but got {len(results)}.")
+            batch = self._attach_followers(batch, results)
         except Exception as e:
             self.logger.error("Error processing batch", exc_info=True)
+            if self.metrics is not None:
+                self.metrics.increment(BATCH_ERRORS)
             for q_item in batch:
-                q_item.future.set_exception(e)
+                self._set_item_result(q_item, e)
         else:
+            pending_results = []
             for q_item, result in zip(batch, results, strict=True):
-                if isinstance(result, Exception):
-                    q_item.future.set_exception(result)
+                if type(result) is ResultOf:
+                    # the item is resolved with the item it follows
+                    continue
+                if isinstance(result, asyncio.Future):
+                    result.add_done_callback(partial(self._resolve_item_from_future, q_item))
+                    pending_results.append(result)
                 else:
-                    q_item.future.set_result(result)
-        elapsed_time = asyncio.get_event_loop().time() - started_at
+                    self._resolve_item(q_item, result)
+            if pending_results:
+                await asyncio.wait(pending_results)
+        ended_at = asyncio.get_event_loop().time()
+        elapsed_time = ended_at - started_at
+        if self.metrics is not None:
+            self._inflight_batches -= 1
+            self.metrics.gauge(INFLIGHT_BATCHES, self._inflight_batches)
+            self.metrics.observe(PROCESSING_TIME, elapsed_time)
+        if self.adaptive_controller is not None:
+            self.adaptive_controller.record_batch(
+                batch_size=len(batch), processing_time=elapsed_time, now=ended_at
+            )
         self.logger.debug(f"Processed batch of {len(batch)} elements" f" in {elapsed_time} seconds.")
         self._running_batches.pop(task_id)
+        if self._stop.is_set():
+            # the collector may wait for the retries of the last batches
+            self._wakeup_collector()
+
+    @staticmethod
+    def _attach_followers(batch: list[QueueItem], results: list) -> list[QueueItem]:
+        """Attach the items whose result is `ResultOf` to the items they follow, which keep them on retry."""
+        batch = list(batch)
+        for q_item, result in zip(batch, results, strict=True):
+            if type(result) is not ResultOf:
+                continue
+            if not 0 <= result.index < len(batch) or type(results[result.index]) is ResultOf:
+                raise ValueError(f"Invalid ResultOf index {result.index}, it should refer to another item.")
+            leader = batch[result.index]
+            batch[result.index] = leader._replace(followers=(*(leader.followers or ()), q_item))
+        return batch
+
+    def _resolve_item(self, q_item: QueueItem, result):
+        if type(result) is RetryLater:
+            self._retry_item(q_item, result)
+        else:
+            self._set_item_result(q_item, result)
+
+    def _resolve_item_from_future(self, q_item: QueueItem, future: asyncio.Future):
+        if future.cancelled():
+            self._set_item_result(q_item, AsyncBatchException("The processing of the item was cancelled."))
+        else:
+            self._resolve_item(q_item, future.exception() or future.result())
+
+    def _retry_item(self, q_item: QueueItem, retry_later: RetryLater):
+        policy = self.retry_policy
+        if policy is None or q_item.attempt >= policy.max_attempts:
+            exception = RetriesExhaustedException(
+                f"The item was not processed after {q_item.attempt} attempts."
+            )
+            exception.__cause__ = retry_later.reason
+            self._set_item_result(q_item, exception)
+            return
+        loop = asyncio.get_running_loop()
+        delay = policy.get_delay(q_item.attempt)
+        if q_item.deadline is not None and loop.time() + delay >= q_item.deadline:
+            if self.metrics is not None:
+                self.metrics.increment(EXPIRED_ITEMS)
+            exception = DeadlineExceededException("The item deadline expired before retrying it.")
+            exception.__cause__ = retry_later.reason
+            self._set_item_result(q_item, exception)
+            return
+        if self.metrics is not None:
+            self.metrics.increment(RETRIED_ITEMS)
+        self._pending_retries += 1
+        loop.call_later(delay, self._requeue_item, q_item._replace(attempt=q_item.attempt + 1))
+
+    def _requeue_item(self, q_item: QueueItem):
+        # the retried items skip the queue, so they are merged into the next batch and never rejected
+        self._pending_retries -= 1
+        self._carry_over.append(q_item)
+        self._wakeup_collector()
+
+    def _set_item_result(self, q_item: QueueItem, result):
+        if isinstance(result, Exception):
+            if self.metrics is not None:
+                self.metrics.increment(ITEM_ERRORS)
+        elif self.cache is not None:
+            self.cache.set(q_item.cache_key, result)
+        if q_item.group is not None:
+            q_item.group.set_result(q_item.index, result)
+        elif q_item.future is None:
+            # the item was submitted without a future
+            if isinstance(result, Exception):
+                self.logger.warning("Error processing an item submitted without a future: %r", result)
+        elif q_item.future.done():
+            # the caller cancelled the processing
+            pass
+        elif isinstance(result, Exception):
+            q_item.future.set_exception(result)
+        else:
+            q_item.future.set_result(result)
+        for follower in q_item.followers or ():
+            self._set_item_result(follower, result)
 
     async def _concurrent_batch_run(self, task_id: int, batch: list[QueueItem]):
         async with self._concurrency_semaphore:
@@ -181,7 +776,7 @@ class AsyncBatcher(Generic[T, S], abc.ABC):
                     semaphore_acquired = True
                     # if the queue is empty, we need to let the batch filler create it
                     batch = await self._fill_batch_from_queue(
-                        started_at=started_at if self._queue.qsize() > 0 else None
+                        started_at=started_at if self._has_pending_items() else None
                     )
                     if batch:
                         # create a new task to process the batch
@@ -207,7 +802,7 @@ class AsyncBatcher(Generic[T, S], abc.ABC):
         self._is_running.clear()
 
     def _should_stop(self):
-        return self._stop.is_set() and self._queue.qsize() == 0
+        return not self._has_pending_items() and not self._may_get_items()
 
     async def is_running(self):
         """Check if the batcher is running.
@@ -235,9 +830,22 @@ class AsyncBatcher(Generic[T, S], abc.ABC):
                     task.cancel()
         else:
             self._stop.set()
+            self._wakeup_collector()
             if (
                 self._current_task
                 and not self._current_task.done()
                 and not self._current_task.get_loop().is_closed()
             ):
                 await asyncio.wait_for(self._current_task, timeout=timeout)
+                # wait for the last batches before releasing the resources they may use
+                running_batches = [task for task in self._running_batches.values() if not task.done()]
+                if running_batches:
+                    await asyncio.wait(running_batches, timeout=timeout)
+        await self._close()
+
+    async def _close(self):
+        """Release the resources held by the batcher.
+
+        This method is called when the batcher is stopped, and it can be overridden by the subclasses
+        which keep some resources (clients, connections, pools...) between the batches.
+        """
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import abc
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Hashable
+
+# returned by `BatchCache.get` when the key is not in the cache, because None can be a cached result
+CACHE_MISS = object()
+
+
+class BatchCache(abc.ABC):
+    """A cache for the results of the batcher items.
+
+    The cache is queried by the batcher before adding an item to the queue, and filled with the results of the
+    processed batches. Its methods are called from the event loop, so they should not block it.
+
+    Attributes:
+        hits (int): The number of cache hits.
+        misses (int): The number of cache misses.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @abc.abstractmethod
+    def get(self, key: Hashable) -> Any:
+        """Get the cached result of an item.
+
+        Args:
+            key (Hashable): The cache key of the item.
+
+        Returns:
+            Any: The cached result, or `CACHE_MISS` if the key is not in the cache.
+        """
+
+    @abc.abstractmethod
+    def set(self, key: Hashable, value: Any):
+        """Cache the result of an item.
+
+        Args:
+            key (Hashable): The cache key of the item.
+            value (Any): The result of processing the item.
+        """
+
+
+class LRUCache(BatchCache):
+    """A bounded in-memory cache with TTL and least recently used eviction.
+
+    Args:
+        max_size (int): The max number of results to keep in the cache.
+        ttl (float, optional): The time in seconds to keep a result in the cache. If None, the results don't
+            expire. Defaults to None.
+        negative_ttl (float, optional): The time in seconds to keep a None result (e.g. an item not found in
+            a database) in the cache. If None, it will use `ttl`, and if 0, the None results are not cached.
+            Defaults to None.
+    """
+
+    def __init__(self, max_size: int, ttl: float | None = None, negative_ttl: float | None = None):
+        super().__init__()
+        if max_size < 1:
+            raise ValueError("Valid max_size value is greater than 0")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._data: OrderedDict[Hashable, tuple[Any, float | None]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return CACHE_MISS
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return CACHE_MISS
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        ttl = self.negative_ttl if value is None else self.ttl
+        if ttl == 0:
+            return
+        self._data[key] = (value, None if ttl is None else time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
@@ -7,3 +7,11 @@ class AsyncBatchException(Exception):
 
 class QueueFullException(AsyncBatchException):
     pass
+
+
+class DeadlineExceededException(AsyncBatchException):
+    pass
+
+
+class RetriesExhaustedException(AsyncBatchException):
+    pass
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from collections import defaultdict, deque
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from prometheus_client import CollectorRegistry
+
+# the metrics reported by the batcher
+QUEUE_WAIT_TIME = "queue_wait_seconds"
+BATCH_SIZE = "batch_size"
+BATCH_FILL_RATIO = "batch_fill_ratio"
+BATCH_WEIGHT = "batch_weight"
+PROCESSING_TIME = "batch_processing_seconds"
+QUEUE_DEPTH = "queue_depth"
+INFLIGHT_BATCHES = "inflight_batches"
+BATCH_ERRORS = "batch_errors"
+ITEM_ERRORS = "item_errors"
+REJECTED_ITEMS = "rejected_items"
+EXPIRED_ITEMS = "expired_items"
+RETRIED_ITEMS = "retried_items"
+# the metrics reported by the batchers isolating the failed items of a batch
+ISOLATED_BATCHES = "isolated_batches"
+ISOLATION_SUB_BATCHES = "isolation_sub_batches"
+
+
+class MetricsSink:
+    """A sink for the batcher metrics, which drops them.
+
+    Subclasses should override the methods to record the metrics. The methods are called from the event loop,
+    so they should not block it.
+    """
+
+    def increment(self, name: str, value: float = 1):
+        """Increment a counter.
+
+        Args:
+            name (str): The name of the counter.
+            value (float, optional): The value to add to the counter. Defaults to 1.
+        """
+
+    def observe(self, name: str, value: float):
+        """Record an observation in a histogram.
+
+        Args:
+            name (str): The name of the histogram.
+            value (float): The observed value.
+        """
+
+    def gauge(self, name: str, value: float):
+        """Set the value of a gauge.
+
+        Args:
+            name (str): The name of the gauge.
+            value (float): The current value.
+        """
+
+
+class InMemoryMetricsSink(MetricsSink):
+    """A sink which keeps the batcher metrics in memory.
+
+    Args:
+        max_observations (int, optional): The max number of observations to keep for each histogram.
+            If None, all the observations are kept. Defaults to 10000.
+    """
+
+    def __init__(self, max_observations: int | None = 10000):
+        self.counters: dict[str, float] = defaultdict(float)
+        self.gauges: dict[str, float] = {}
+        self.observations: dict[str, deque[float]] = defaultdict(lambda: deque(maxlen=max_observations))
+
+    def increment(self, name: str, value: float = 1):
+        self.counters[name] += value
+
+    def observe(self, name: str, value: float):
+        self.observations[name].append(value)
+
+    def gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+
+class PrometheusMetricsSink(MetricsSink):
+    """A sink which reports the batcher metrics with the Prometheus client.
+
+    The Prometheus metrics are created on their first use, and the counters get the `_total` suffix.
+
+    Args:
+        namespace (str, optional): The namespace of the Prometheus metrics. Defaults to "async_batcher".
+        labels (dict[str, str], optional): Constant labels added to all the metrics, to distinguish the
+            batchers sharing the same registry. Defaults to None.
+        registry (CollectorRegistry, optional): The registry to use. If None, the default Prometheus registry
+            is used. Defaults to None.
+        buckets (dict[str, list[float]], optional): The histogram buckets by metric name. The Prometheus
+            default buckets are used for the other histograms. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        *,
+        namespace: str = "async_batcher",
+        labels: dict[str, str] | None = None,
+        registry: CollectorRegistry | None = None,
+        buckets: dict[str, list[float]] | None = None,
+    ):
+        try:
+            import prometheus_client
+        except ImportError as e:
+            raise ImportError("The prometheus-client package is required to use PrometheusMetricsSink") from e
+        self._prometheus_client = prometheus_client
+        self.namespace = namespace
+        self.labels = labels or {}
+        self.registry = registry if registry is not None else prometheus_client.REGISTRY
+        self.buckets = buckets or {}
+        self._metrics = {}
+
+    def _get_metric(self, metric_class, name: str, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = metric_class(
+                name,
+                f"The async batcher {name.replace('_', ' ')}",
+                labelnames=list(self.labels),
+                namespace=self.namespace,
+                registry=self.registry,
+                **kwargs,
+            )
+            if self.labels:
+                metric = metric.labels(**self.labels)
+            self._metrics[name] = metric
+        return metric
+
+    def increment(self, name: str, value: float = 1):
+        self._get_metric(self._prometheus_client.Counter, name).inc(value)
+
+    def observe(self, name: str, value: float):
+        kwargs = {"buckets": self.buckets[name]} if name in self.buckets else {}
+        self._get_metric(self._prometheus_client.Histogram, name, **kwargs).observe(value)
+
+    def gauge(self, name: str, value: float):
+        self._get_metric(self._prometheus_client.Gauge, name).set(value)
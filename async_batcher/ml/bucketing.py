@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import abc
+import asyncio
+import bisect
+from typing import TYPE_CHECKING, Any, Generic, TypeVar
+
+import numpy as np
+
+from async_batcher.batcher import AsyncBatcher
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
+T = TypeVar("T")
+S = TypeVar("S")
+
+
+class _BucketBatcher(AsyncBatcher):
+    """The batcher of a single bucket, which delegates the processing to the bucketed batcher."""
+
+    def __init__(self, *, parent: BucketedAsyncBatcher, bucket_length: int, **kwargs):
+        super().__init__(**kwargs)
+        self.parent = parent
+        self.bucket_length = bucket_length
+
+    async def process_batch(self, batch):
+        # the padding statistics are updated in the event loop, since the batches of the buckets are
+        # processed concurrently in the executor threads
+        lengths = self.parent._record_lengths(batch, self.bucket_length)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.parent._process_bucket_batch, batch, lengths, self.bucket_length
+        )
+
+
+class BucketedAsyncBatcher(abc.ABC, Generic[T, S]):
+    """A batcher for variable-length inputs, which routes the items into per-length buckets.
+
+    Each bucket has its own queue, flushed by its own size and time triggers, so a long input doesn't
+    force the short ones to be padded to its length. When `pad` is True, the items of a batch are padded to
+    the bucket length in a NumPy array, with a mask of the real positions.
+
+    Args:
+        bucket_boundaries (Sequence[int]): The max length of each bucket. The items longer than the last
+            boundary are rejected with a ValueError.
+        length_fn (Callable[[T], int], optional): A function to get the length of an item. Defaults to `len`.
+        pad (bool, optional): Whether to pad the batches to the bucket length. If False, the batches are
+            passed as lists of items, and the mask is None. Defaults to True.
+        pad_value (float, optional): The value used to pad the items. Defaults to 0.
+        dtype (Any, optional): The NumPy dtype of the padded array. Defaults to "float32".
+        **kwargs: The arguments of the buckets batchers (max_batch_size, max_queue_time, concurrency,
+            executor...).
+    """
+
+    def __init__(
+        self,
+        *,
+        bucket_boundaries: Sequence[int],
+        length_fn: Callable[[T], int] = len,
+        pad: bool = True,
+        pad_value: float = 0,
+        dtype: Any = "float32",
+        **kwargs,
+    ):
+        if not bucket_boundaries or list(bucket_boundaries) != sorted(set(bucket_boundaries)):
+            raise ValueError("bucket_boundaries should be a non-empty list of increasing lengths")
+        self.bucket_boundaries = list(bucket_boundaries)
+        self.length_fn = length_fn
+        self.pad = pad
+        self.pad_value = pad_value
+        self.dtype = np.dtype(dtype)
+        self.buckets = [
+            _BucketBatcher(parent=self, bucket_length=bucket_length, **kwargs)
+            for bucket_length in self.bucket_boundaries
+        ]
+        self.real_length_total = 0
+        self.padded_length_total = 0
+
+    @property
+    def padding_efficiency(self) -> float:
+        """The ratio of real positions to padded positions in the processed batches."""
+        if self.padded_length_total == 0:
+            return 1.0
+        return self.real_length_total / self.padded_length_total
+
+    @abc.abstractmethod
+    def process_bucket(
+        self, batch: np.ndarray | list[T], mask: np.ndarray | None, bucket_length: int
+    ) -> list[S]:
+        """Process a batch of items from the same bucket.
+
+        This method should be overridden by the user to define how to process a batch of items.
+        It runs in the batchers executor.
+
+        Args:
+            batch (np.ndarray | list[T]): The batch padded to the bucket length, or the list of items if
+                `pad` is False.
+            mask (np.ndarray | None): A boolean array of shape (batch size, bucket length), True for the
+                real positions, or None if `pad` is False.
+            bucket_length (int): The max length of the bucket.
+        """
+
+    def _record_lengths(self, batch: list[T], bucket_length: int) -> list[int]:
+        lengths = [self.length_fn(item) for item in batch]
+        self.real_length_total += sum(lengths)
+        self.padded_length_total += bucket_length * len(batch)
+        return lengths
+
+    def _process_bucket_batch(self, batch: list[T], lengths: list[int], bucket_length: int) -> list[S]:
+        if not self.pad:
+            return self.process_bucket(batch, None, bucket_length)
+        feature_shape = np.shape(batch[0])[1:]
+        features = np.full((len(batch), bucket_length, *feature_shape), self.pad_value, dtype=self.dtype)
+        mask = np.zeros((len(batch), bucket_length), dtype=bool)
+        for index, (item, length) in enumerate(zip(batch, lengths, strict=True)):
+            features[index, :length] = item
+            mask[index, :length] = True
+        return self.process_bucket(features, mask, bucket_length)
+
+    def _get_bucket(self, item: T) -> _BucketBatcher:
+        length = self.length_fn(item)
+        index = bisect.bisect_left(self.bucket_boundaries, length)
+        if index == len(self.buckets):
+            raise ValueError(
+                f"The item length {length} is greater than the last bucket boundary "
+                f"{self.bucket_boundaries[-1]}"
+            )
+        return self.buckets[index]
+
+    async def process(self, item: T, **kwargs) -> S:
+        """Add an item to the queue of its bucket and get the result when it's ready.
+
+        Args:
+            item (T): The item to process.
+            **kwargs: The other arguments of `AsyncBatcher.process`.
+
+        Returns:
+            S: The result of processing the item.
+        """
+        return await self._get_bucket(item).process(item, **kwargs)
+
+    async def process_many(self, items: Sequence[T], **kwargs) -> list[S]:
+        """Add a sequence of items to the queues of their buckets and get the results when they are ready.
+
+        Args:
+            items (Sequence[T]): The items to process.
+            **kwargs: The other arguments of `AsyncBatcher.process_many`.
+
+        Returns:
+            list[S]: The results of processing the items, in the same order as the items.
+        """
+        buckets_items: dict[_BucketBatcher, list[int]] = {}
+        for index, item in enumerate(items):
+            buckets_items.setdefault(self._get_bucket(item), []).append(index)
+        buckets_results = await asyncio.gather(
+            *[
+                bucket.process_many([items[index] for index in indexes], **kwargs)
+                for bucket, indexes in buckets_items.items()
+            ]
+        )
+        results: list = [None] * len(items)
+        for indexes, bucket_results in zip(buckets_items.values(), buckets_results, strict=True):
+            for index, result in zip(indexes, bucket_results, strict=True):
+                results[index] = result
+        return results
+
+    async def is_running(self) -> bool:
+        """Check if any of the buckets batchers is running.
+
+        Returns:
+            bool: True if any of the buckets batchers is running, False otherwise.
+        """
+        return any([await bucket.is_running() for bucket in self.buckets])
+
+    async def stop(self, force: bool = False, timeout: float | None = None):
+        """Stop the buckets batchers.
+
+        Args:
+            force (bool, optional): Whether to force stop the batchers without waiting for processing
+                the remaining items. Defaults to False.
+            timeout (float, optional): The time to wait for the batchers to stop. If None, it will wait
+                indefinitely. Defaults to None.
+        """
+        await asyncio.gather(*[bucket.stop(force=force, timeout=timeout) for bucket in self.buckets])
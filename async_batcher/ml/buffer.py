@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import queue
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+
+
+class NumpyBatchBuffer:
+    """A ring of preallocated NumPy arrays used to assemble the ML batches.
+
+    Instead of passing a list of feature vectors to the model, which converts it to a new array for each
+    batch, the feature vectors are copied into a reusable array sized to the max batch size, and the model
+    is called on a view of its filled rows. The buffers are thread-safe, so they can be used by the batches
+    processed concurrently in an executor; when all of them are in use, a new one is added to the ring.
+
+    The buffer is reused once the prediction is done, so the model should not return a view of its input.
+
+    Args:
+        max_batch_size (int): The max number of items in a batch.
+        feature_shape (Sequence[int]): The shape of the feature vector of a single item.
+        dtype (Any, optional): The NumPy dtype of the features. Defaults to "float32".
+        size (int, optional): The number of buffers to preallocate. Defaults to 1.
+    """
+
+    def __init__(
+        self, *, max_batch_size: int, feature_shape: Sequence[int], dtype: Any = "float32", size: int = 1
+    ):
+        if max_batch_size is None or max_batch_size < 1:
+            raise ValueError("The NumPy batch buffer requires a limited max_batch_size")
+        self.max_batch_size = max_batch_size
+        self.feature_shape = tuple(feature_shape)
+        self.dtype = np.dtype(dtype)
+        self._free_buffers: queue.SimpleQueue[np.ndarray] = queue.SimpleQueue()
+        self.size = 0
+        for _ in range(size):
+            self._free_buffers.put(self._allocate())
+
+    def _allocate(self) -> np.ndarray:
+        self.size += 1
+        return np.empty((self.max_batch_size, *self.feature_shape), dtype=self.dtype)
+
+    @contextmanager
+    def assemble(self, batch: Sequence[Any]) -> Iterator[np.ndarray]:
+        """Copy the batch feature vectors into a free buffer.
+
+        Args:
+            batch (Sequence[Any]): The feature vectors of the batch items.
+
+        Yields:
+            np.ndarray: A view of the buffer rows filled with the batch, which is valid until the context
+                is exited.
+        """
+        try:
+            buffer = self._free_buffers.get_nowait()
+        except queue.Empty:
+            buffer = self._allocate()
+        try:
+            view = buffer[: len(batch)]
+            for index, features in enumerate(batch):
+                view[index] = features
+            yield view
+        finally:
+            self._free_buffers.put(buffer)
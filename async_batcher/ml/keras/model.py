@@ -1,12 +1,17 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 from async_batcher.batcher import AsyncBatcher
+from async_batcher.ml.bucketing import BucketedAsyncBatcher
+from async_batcher.ml.buffer import NumpyBatchBuffer
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
     from concurrent.futures import Executor
 
+    import numpy as np
+
     from keras import Model
 
 
@@ -25,6 +30,11 @@ class KerasAsyncBatcher(AsyncBatcher):
             Defaults to 1. If -1, it will process all batches concurrently.
         executor (Executor, optional): The executor to use to process the batch.
             If None, it will use the default asyncio executor. Defaults to None.
+        feature_shape (Sequence[int], optional): The shape of the feature vector of a single item. If
+            provided, the batches are assembled in reusable NumPy buffers instead of being converted from
+            lists by the model, which requires a limited `max_batch_size`. Defaults to None.
+        dtype (Any, optional): The NumPy dtype of the features when `feature_shape` is provided.
+            Defaults to "float32".
     """
 
     def __init__(
@@ -35,6 +45,8 @@ class KerasAsyncBatcher(AsyncBatcher):
         max_queue_time: float = 0.01,
         concurrency: int = 1,
         executor: Executor | None = None,
+        feature_shape: Sequence[int] | None = None,
+        dtype: Any = "float32",
         **kwargs,
     ):
         super().__init__(
@@ -45,6 +57,40 @@ class KerasAsyncBatcher(AsyncBatcher):
             **kwargs,
         )
         self.model = model
+        self.batch_buffer = None
+        if feature_shape is not None:
+            self.batch_buffer = NumpyBatchBuffer(
+                max_batch_size=max_batch_size,
+                feature_shape=feature_shape,
+                dtype=dtype,
+                size=concurrency if concurrency > 0 else 1,
+            )
 
     def process_batch(self, batch):
-        return self.model.predict(batch, batch_size=len(batch))
+        if self.batch_buffer is None:
+            return self.model.predict(batch, batch_size=len(batch))
+        with self.batch_buffer.assemble(batch) as features:
+            return self.model.predict(features, batch_size=len(batch))
+
+
+class KerasBucketedAsyncBatcher(BucketedAsyncBatcher):
+    """Batcher for Keras sequence models with variable-length inputs.
+
+    The items are routed into per-length buckets, and each batch is padded to its bucket length.
+
+    Args:
+        model: The Keras model to use for prediction.
+        bucket_boundaries (Sequence[int]): The max length of each bucket.
+        use_mask (bool, optional): Whether to pass the padding mask to the model as a second input.
+            Defaults to False.
+        **kwargs: The other arguments of `BucketedAsyncBatcher` and the buckets batchers.
+    """
+
+    def __init__(self, *, model: Model, bucket_boundaries: Sequence[int], use_mask: bool = False, **kwargs):
+        super().__init__(bucket_boundaries=bucket_boundaries, **kwargs)
+        self.model = model
+        self.use_mask = use_mask
+
+    def process_bucket(self, batch: np.ndarray, mask: np.ndarray | None, bucket_length: int):
+        inputs = [batch, mask] if self.use_mask else batch
+        return self.model.predict(inputs, batch_size=len(batch))
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 from async_batcher.batcher import AsyncBatcher
+from async_batcher.ml.buffer import NumpyBatchBuffer
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
     from concurrent.futures import Executor
 
     from sklearn.base import BaseEstimator
@@ -25,6 +27,11 @@ class SklearnAsyncBatcher(AsyncBatcher):
             Defaults to 1. If -1, it will process all batches concurrently.
         executor (Executor, optional): The executor to use to process the batch.
             If None, it will use the default asyncio executor. Defaults to None.
+        feature_shape (Sequence[int], optional): The shape of the feature vector of a single item. If
+            provided, the batches are assembled in reusable NumPy buffers instead of being converted from
+            lists by the model, which requires a limited `max_batch_size`. Defaults to None.
+        dtype (Any, optional): The NumPy dtype of the features when `feature_shape` is provided.
+            Defaults to "float32".
     """
 
     def __init__(
@@ -35,17 +42,32 @@ class SklearnAsyncBatcher(AsyncBatcher):
         max_queue_time: float = 0.01,
         concurrency: int = 1,
         executor: Executor | None = None,
+        feature_shape: Sequence[int] | None = None,
+        dtype: Any = "float32",
+        **kwargs,
     ):
         super().__init__(
             max_batch_size=max_batch_size,
             max_queue_time=max_queue_time,
             concurrency=concurrency,
             executor=executor,
+            **kwargs,
         )
         self.model = model
+        self.batch_buffer = None
+        if feature_shape is not None:
+            self.batch_buffer = NumpyBatchBuffer(
+                max_batch_size=max_batch_size,
+                feature_shape=feature_shape,
+                dtype=dtype,
+                size=concurrency if concurrency > 0 else 1,
+            )
 
     def process_batch(self, batch):
         if hasattr(self.model, "predict"):
-            return self.model.predict(batch)
+            if self.batch_buffer is None:
+                return self.model.predict(batch)
+            with self.batch_buffer.assemble(batch) as features:
+                return self.model.predict(features)
         else:
             raise AttributeError("Model does not have a predict method")
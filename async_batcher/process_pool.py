@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from async_batcher.batcher import AsyncBatcher
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from multiprocessing.context import BaseContext
+
+T = TypeVar("T")
+S = TypeVar("S")
+
+# the model loaded by the initializer of each worker process
+_worker_model: Any = None
+
+
+def _initialize_worker(model_loader: Callable[[], Any]):
+    global _worker_model
+    _worker_model = model_loader()
+
+
+def _process_batch_in_worker(batch_processor: Callable[[Any, list], list], batch: list) -> list:
+    return batch_processor(_worker_model, batch)
+
+
+def _ping_worker() -> int:
+    return os.getpid()
+
+
+class ProcessPoolAsyncBatcher(AsyncBatcher[T, S]):
+    """Batcher which processes the batches in a pool of worker processes.
+
+    The sync `process_batch` implementations run in a thread executor, so the CPU-bound models are limited
+    by the GIL. This batcher loads the model once in each worker process, then ships each batch to a worker
+    as a single task, and routes the results back to the items futures.
+
+    When a worker crashes, the pool is restarted and the batch is retried, and a periodic health check
+    restarts the pool if the workers don't respond. The workers of the replaced pool are terminated, so
+    the hung ones don't leak.
+
+    Args:
+        model_loader (Callable[[], Any]): A function called once in each worker process to load the model.
+            It should be picklable (e.g. a module-level function).
+        batch_processor (Callable[[Any, list[T]], list[S]]): A function called in the worker process with
+            the model and the batch, which returns the results. It should be picklable.
+        max_workers (int, optional): The number of worker processes. If None, it will use the number of
+            CPUs. Defaults to None.
+        mp_context (BaseContext, optional): The multiprocessing context used to start the workers.
+            If None, it will use the default context. Defaults to None.
+        max_restarts (int, optional): The max number of pool restarts to retry a batch which crashed
+            a worker. Defaults to 1.
+        health_check_interval (float, optional): The time in seconds between two health checks.
+            If None, the health checks are disabled. Defaults to 10.
+        health_check_timeout (float, optional): The time in seconds to wait for the workers to respond to
+            a health check. While batches are in flight, the workers are considered hung if none of them
+            completed a task in this time, so it should be longer than the processing time of a batch.
+            The pool startup (the model loading) is not limited by this timeout. Defaults to 5.
+        max_batch_size (int, optional): The max number of items to process in a batch.
+            Defaults to -1 (no limit).
+        max_queue_time (float, optional): The max time for a task to stay in the queue before
+            processing it if the batch is not full and the number of running batches is less
+            than the concurrency. Defaults to 0.01.
+        concurrency (int, optional): The max number of concurrent batches to process. If None, it will
+            use the number of workers. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        *,
+        model_loader: Callable[[], Any],
+        batch_processor: Callable[[Any, list[T]], list[S]],
+        max_workers: int | None = None,
+        mp_context: BaseContext | None = None,
+        max_restarts: int = 1,
+        health_check_interval: float | None = 10,
+        health_check_timeout: float = 5,
+        max_batch_size: int = -1,
+        max_queue_time: float = 0.01,
+        concurrency: int | None = None,
+        **kwargs,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        super().__init__(
+            max_batch_size=max_batch_size,
+            max_queue_time=max_queue_time,
+            concurrency=concurrency or self.max_workers,
+            **kwargs,
+        )
+        self.model_loader = model_loader
+        self.batch_processor = batch_processor
+        self.mp_context = mp_context
+        self.max_restarts = max_restarts
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.restarts_count = 0
+        self._pool: ProcessPoolExecutor | None = None
+        # set when a task of the current pool completes, i.e. its workers finished their initialization
+        self._pool_ready = False
+        self._last_progress_time = 0.0
+        self._closed = False
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=self.mp_context,
+                initializer=_initialize_worker,
+                initargs=(self.model_loader,),
+            )
+            self._pool_ready = False
+        return self._pool
+
+    def _mark_progress(self, pool: ProcessPoolExecutor):
+        if pool is self._pool:
+            self._pool_ready = True
+            self._last_progress_time = asyncio.get_running_loop().time()
+
+    def _restart_pool(self, pool: ProcessPoolExecutor):
+        # the concurrent batches may detect the same broken pool, but it should be restarted only once
+        if self._pool is not pool:
+            return
+        self.logger.warning("Restarting the process pool")
+        self._pool = None
+        self.restarts_count += 1
+        # shutdown doesn't stop the hung workers, so they are terminated, and the batches queued in the old
+        # pool fail with BrokenProcessPool and are retried in the new one
+        processes = list((pool._processes or {}).values())
+        pool.shutdown(wait=False)
+        for process in processes:
+            process.terminate()
+
+    async def process_batch(self, batch: list[T]) -> list[S]:
+        attempt = 0
+        while True:
+            pool = self._get_pool()
+            future = None
+            try:
+                future = pool.submit(_process_batch_in_worker, self.batch_processor, batch)
+                # the future is shielded to distinguish a cancellation of the batch from the pool ones
+                result = await asyncio.shield(asyncio.wrap_future(future))
+                self._mark_progress(pool)
+                return result
+            except asyncio.CancelledError:
+                if future is None or not future.cancelled():
+                    raise
+                # the batch was cancelled in the pool before it started, so it's retried like a crashed one
+                if self._closed or attempt >= self.max_restarts:
+                    raise BrokenProcessPool("The batch was cancelled by the process pool shutdown") from None
+                attempt += 1
+            except BrokenProcessPool:
+                self._restart_pool(pool)
+                if self._closed or attempt >= self.max_restarts:
+                    raise
+                attempt += 1
+            except Exception:
+                # the worker is alive, it raised an error from the batch processor
+                self._mark_progress(pool)
+                raise
+
+    async def check_health(self) -> bool:
+        """Check if the workers respond, and restart the pool if they don't.
+
+        The ping is queued behind the running batches, so when it times out while some batches are in
+        flight, the workers are considered healthy only if they completed a task during the ping. A timeout
+        before the pool completed its first task is ignored, because the workers are still loading the model.
+
+        Returns:
+            bool: True if the workers are healthy or starting, False if the pool was restarted.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        ping_time = loop.time()
+        try:
+            await asyncio.wait_for(
+                loop.run_in_executor(pool, _ping_worker),
+                timeout=self.health_check_timeout,
+            )
+        except BrokenProcessPool:
+            self._restart_pool(pool)
+            return False
+        except asyncio.TimeoutError:
+            if pool is self._pool and not self._pool_ready:
+                return True
+            if self._running_batches and self._last_progress_time >= ping_time:
+                return True
+            self._restart_pool(pool)
+            return False
+        self._mark_progress(pool)
+        return True
+
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            if not await self.check_health():
+                self.logger.warning("The process pool workers didn't respond to the health check")
+
+    async def run(self):
+        health_check_task = None
+        if self.health_check_interval is not None:
+            health_check_task = asyncio.get_running_loop().create_task(self._health_check_loop())
+        try:
+            await super().run()
+        finally:
+            if health_check_task is not None:
+                health_check_task.cancel()
+
+    async def _close(self):
+        self._closed = True
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
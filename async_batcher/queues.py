@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import math
+
+
+class PriorityQueue(asyncio.Queue):
+    """A queue that retrieves the batcher items by priority, then by earliest deadline first.
+
+    The items with the lowest `priority` value are retrieved first, then the ones with the earliest
+    `deadline` (the items without deadline come last), and the items with the same priority and deadline
+    are retrieved in the insertion order.
+    """
+
+    def _init(self, maxsize):
+        self._queue = []
+        self._counter = itertools.count()
+
+    def _put(self, item):
+        deadline = math.inf if item.deadline is None else item.deadline
+        heapq.heappush(self._queue, (item.priority, deadline, next(self._counter), item))
+
+    def _get(self):
+        return heapq.heappop(self._queue)[-1]
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import random
+
+
+class RetryLater:
+    """A marker returned by `process_batch` in place of the result of an item which should be retried.
+
+    The batcher re-submits the item after a backoff delay, so it's merged into one of the next batches,
+    until it's processed, its deadline expires, or the retry policy max attempts is reached.
+
+    Args:
+        reason (Exception, optional): The error which prevented processing the item, used as the cause of
+            the `RetriesExhaustedException` when the item is not retried anymore. Defaults to None.
+    """
+
+    __slots__ = ("reason",)
+
+    def __init__(self, reason: Exception | None = None):
+        self.reason = reason
+
+
+class ResultOf:
+    """A marker returned by `process_batch` in place of the result of an item which gets the result of another
+    item of the same batch (e.g. a write superseded by a later write of the same key).
+
+    The item is resolved with the final result of the other item: if the other item is retried, the item is
+    resolved once its retries finish, and it's never retried on its own.
+
+    Args:
+        index (int): The index in the batch of the item whose result is used.
+    """
+
+    __slots__ = ("index",)
+
+    def __init__(self, index: int):
+        self.index = index
+
+
+class RetryPolicy:
+    """The policy used by the batcher to retry the items marked with `RetryLater`.
+
+    The delay before each retry grows exponentially, and it's randomized with the "full jitter" strategy
+    (a random delay between 0 and the exponential delay) to spread the retries of the throttled items.
+
+    Args:
+        max_attempts (int, optional): The max number of times an item is processed, including the first
+            attempt. Defaults to 5.
+        base_delay (float, optional): The delay in seconds before the first retry. Defaults to 0.05.
+        max_delay (float, optional): The max delay in seconds before a retry. Defaults to 2.
+        multiplier (float, optional): The factor applied to the delay after each retry. Defaults to 2.
+        jitter (bool, optional): Whether to randomize the delays. Defaults to True.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_attempts: int = 5,
+        base_delay: float = 0.05,
+        max_delay: float = 2,
+        multiplier: float = 2,
+        jitter: bool = True,
+    ):
+        if max_attempts < 1:
+            raise ValueError("Valid max_attempts value is greater than 0")
+        if base_delay < 0 or max_delay < base_delay:
+            raise ValueError("Valid delays are 0 <= base_delay <= max_delay")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def get_delay(self, attempt: int) -> float:
+        """Get the delay before retrying an item.
+
+        Args:
+            attempt (int): The number of times the item was processed.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        if self.jitter:
+            return random.uniform(0, delay)
+        return delay
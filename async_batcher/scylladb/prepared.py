@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+from functools import partial
+from typing import TYPE_CHECKING, Any, Literal
+
+from cassandra.query import BatchStatement, BatchType
+
+from async_batcher.batcher import AsyncBatcher
+from async_batcher.scylladb.update import WriteOperation, _get_operation_error
+
+if TYPE_CHECKING:
+    from cassandra.cluster import ResponseFuture, Session
+    from cassandra.cqlengine.models import Model
+    from cassandra.query import BoundStatement, PreparedStatement
+
+
+def _set_future_result(future: asyncio.Future, result: Any):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_future_exception(future: asyncio.Future, exception: Exception):
+    if not future.done():
+        future.set_exception(exception)
+
+
+def wrap_response_future(response_future: ResponseFuture, loop: asyncio.AbstractEventLoop) -> asyncio.Future:
+    """Bridge a driver `ResponseFuture` into an asyncio future.
+
+    The driver callbacks run in its event loop thread, so the asyncio future is resolved thread-safely.
+
+    Args:
+        response_future (ResponseFuture): The future returned by `Session.execute_async`.
+        loop (asyncio.AbstractEventLoop): The asyncio loop of the returned future.
+
+    Returns:
+        asyncio.Future: A future resolved with the result of the query.
+    """
+    future = loop.create_future()
+    response_future.add_callbacks(
+        callback=lambda result: loop.call_soon_threadsafe(_set_future_result, future, result),
+        errback=lambda exception: loop.call_soon_threadsafe(_set_future_exception, future, exception),
+    )
+    return future
+
+
+class AsyncScyllaDbPreparedWriteBatcher(AsyncBatcher[WriteOperation, None]):
+    """Batcher for ScyllaDB write operations, which uses the driver async API with prepared statements.
+
+    Unlike `AsyncScyllaDbWriteBatcher`, which builds the CQL queries of the cqlengine models for each batch
+    and runs in a thread executor, this batcher prepares a statement once per model, operation and columns,
+    binds the values of each operation directly, and sends the batch with `execute_async` without blocking
+    the event loop.
+
+    When `group_by_partition` is True, the operations are grouped by table and partition key, and each group
+    is sent as a single-partition batch, routed by the token-aware load balancing policy to a replica owning
+    the partition. The groups are sent concurrently, and the items of each group are resolved as soon as its
+    batch is applied.
+
+    Args:
+        session (Session): The driver session to use.
+        group_by_partition (bool, optional): Whether to send a batch per table and partition key instead of
+            a single multi-partition batch. Defaults to False.
+        batch_type (Literal["LOGGED", "UNLOGGED"], optional): The type of the sent batches. If None, it will
+            use unlogged batches when grouping by partition, since the single-partition batches are applied
+            atomically without the batch log, and logged batches otherwise. Defaults to None.
+        max_batch_size (int, optional): The max number of items to process in a batch.
+            Defaults to -1 (no limit).
+        max_queue_time (float, optional): The max time for a task to stay in the queue before processing
+            it if the batch is not full and the number of running batches is less than the concurrency.
+            Defaults to 0.01.
+        concurrency (int, optional): The max number of concurrent batches to process.
+            Defaults to 1. If -1, it will process all batches concurrently.
+        **kwargs: The other arguments of `AsyncBatcher`.
+    """
+
+    def __init__(
+        self,
+        *,
+        session: Session,
+        group_by_partition: bool = False,
+        batch_type: Literal["LOGGED", "UNLOGGED"] | None = None,
+        max_batch_size: int = -1,
+        max_queue_time: float = 0.01,
+        concurrency: int = 1,
+        **kwargs,
+    ):
+        super().__init__(
+            max_batch_size=max_batch_size,
+            max_queue_time=max_queue_time,
+            concurrency=concurrency,
+            **kwargs,
+        )
+        if batch_type not in (None, "LOGGED", "UNLOGGED"):
+            raise ValueError(f"Invalid batch type: {batch_type}")
+        self.session = session
+        self.group_by_partition = group_by_partition
+        if batch_type is None:
+            batch_type = "UNLOGGED" if group_by_partition else "LOGGED"
+        self.batch_type = batch_type
+        # the prepared statements by model, operation and columns
+        self._prepared_statements: dict[tuple, asyncio.Future[PreparedStatement]] = {}
+
+    @staticmethod
+    def _get_query(
+        model: type[Model], operation: str, key_fields: tuple[str, ...], data_fields: tuple[str, ...]
+    ) -> str:
+        table = model.column_family_name()
+
+        def _columns(fields: tuple[str, ...]) -> list[str]:
+            return [f'"{model._columns[field].db_field_name}"' for field in fields]
+
+        if operation == "INSERT":
+            columns = _columns(data_fields)
+            return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+        where = " AND ".join(f"{column} = ?" for column in _columns(key_fields))
+        if operation == "UPDATE":
+            assignments = ", ".join(f"{column} = ?" for column in _columns(data_fields))
+            return f"UPDATE {table} SET {assignments} WHERE {where}"
+        return f"DELETE FROM {table} WHERE {where}"
+
+    async def _get_prepared_statement(
+        self, model: type[Model], operation: str, key_fields: tuple[str, ...], data_fields: tuple[str, ...]
+    ) -> PreparedStatement:
+        cache_key = (model, operation, key_fields, data_fields)
+        prepared_statement = self._prepared_statements.get(cache_key)
+        if prepared_statement is None:
+            # the driver has no async prepare, so the statement is prepared once in the executor, and
+            # the concurrent batches wait for the same future
+            query = self._get_query(model, operation, key_fields, data_fields)
+            prepared_statement = asyncio.ensure_future(
+                asyncio.get_running_loop().run_in_executor(self.executor, self.session.prepare, query)
+            )
+            self._prepared_statements[cache_key] = prepared_statement
+            prepared_statement.add_done_callback(partial(self._forget_failed_statement, cache_key))
+        return await prepared_statement
+
+    def _forget_failed_statement(self, cache_key: tuple, future: asyncio.Future):
+        if future.cancelled() or future.exception() is not None:
+            self._prepared_statements.pop(cache_key, None)
+
+    async def _bind(self, op: WriteOperation) -> BoundStatement:
+        # like the cqlengine batcher, the key of an INSERT is ignored, the primary key columns are in its data
+        key_fields = tuple(op.key) if op.key is not None and op.operation != "INSERT" else ()
+        data_fields = tuple(op.data) if op.data is not None and op.operation != "DELETE" else ()
+        prepared_statement = await self._get_prepared_statement(
+            op.model, op.operation, key_fields, data_fields
+        )
+        values = [op.model._columns[field].to_database(op.data[field]) for field in data_fields]
+        values.extend(op.model._columns[field].to_database(op.key[field]) for field in key_fields)
+        return prepared_statement.bind(values)
+
+    async def _execute(self, batch_statement: BatchStatement) -> None:
+        await wrap_response_future(self.session.execute_async(batch_statement), asyncio.get_running_loop())
+
+    async def process_batch(
+        self, batch: list[WriteOperation]
+    ) -> list[None | Exception | asyncio.Future[None]]:
+        results: list[None | Exception | asyncio.Future[None]] = [None] * len(batch)
+        batch_type = BatchType.UNLOGGED if self.batch_type == "UNLOGGED" else BatchType.LOGGED
+        batch_statements: dict[tuple | None, BatchStatement] = {}
+        items_groups: list[tuple[int, tuple | None]] = []
+        for index, op in enumerate(batch):
+            error = _get_operation_error(op)
+            if error is None:
+                try:
+                    statement = await self._bind(op)
+                except Exception as e:
+                    error = e
+            if error is not None:
+                results[index] = error
+                continue
+            # the routing key is the serialized partition key, used by the driver to find its replicas
+            group = (
+                (statement.keyspace, statement.table, statement.routing_key)
+                if self.group_by_partition
+                else None
+            )
+            if group not in batch_statements:
+                batch_statements[group] = BatchStatement(batch_type=batch_type)
+            batch_statements[group].add(statement)
+            items_groups.append((index, group))
+        if not self.group_by_partition:
+            if batch_statements:
+                await self._execute(batch_statements[None])
+            return results
+        groups_futures = {
+            group: asyncio.ensure_future(self._execute(batch_statement))
+            for group, batch_statement in batch_statements.items()
+        }
+        for index, group in items_groups:
+            results[index] = groups_futures[group]
+        return results
@@ -3,6 +3,7 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import TYPE_CHECKING, Any, Literal
 
+from cassandra import RequestValidationException
 from cassandra.cqlengine.query import BatchQuery
 
 from async_batcher.batcher import AsyncBatcher
@@ -19,29 +20,102 @@ class WriteOperation:
     data: dict[str, Any] | None = None
 
 
+def _get_operation_error(op: WriteOperation) -> Exception | None:
+    """Get the error of an invalid write operation, or None if it's valid."""
+    if op.operation not in ["INSERT", "UPDATE", "DELETE"]:
+        return ValueError(f"Invalid operation: {op.operation}")
+    if op.operation == "INSERT" and op.data is None:
+        return ValueError("data must be provided for INSERT operations")
+    if op.operation == "UPDATE" and (op.key is None or op.data is None):
+        return ValueError("key and data must be provided for UPDATE operations")
+    if op.operation == "DELETE" and op.key is None:
+        return ValueError("key must be provided for DELETE operations")
+    return None
+
+
 class AsyncScyllaDbWriteBatcher(AsyncBatcher[WriteOperation, None]):
-    """Batcher for ScyllaDB write operations."""
-
-    def process_batch(self, *, batch: list[WriteOperation]) -> list[None | Exception]:
-        results = []
-        with BatchQuery() as b:
-            for op in batch:
-                if op.operation == "INSERT":
-                    if op.data is None:
-                        results.append(ValueError("data must be provided for INSERT operations"))
-                    else:
-                        op.model.batch(b).create(**op.data)
-                        results.append(None)
-                elif op.operation == "UPDATE":
-                    if op.key is None or op.data is None:
-                        results.append(ValueError("key and data must be provided for UPDATE operations"))
-                    else:
-                        op.model.objects(**op.key).batch(b).update(**op.data)
-                        results.append(None)
-                elif op.operation == "DELETE":
-                    if op.key is None:
-                        results.append(ValueError("key must be provided for DELETE operations"))
-                    else:
-                        op.model.objects(**op.key).batch(b).delete()
-                        results.append(None)
+    """Batcher for ScyllaDB write operations.
+
+    By default, the operations of a batch are sent in a single logged `BatchQuery`, so if one of them fails,
+    all the batch items get its error. When `isolate_errors` is True, a failed batch is split in two halves
+    which are sent again, recursively, until the failed operations are found: only those get the error, and
+    the other ones are applied. Since the logged batches are applied atomically, the operations of a failed
+    batch are not applied before being retried, but their order is not kept between the retried halves.
+    Only the batches which were rejected are bisected: the ones which failed the client-side validation, and
+    the ones rejected by the server (`RequestValidationException`, e.g. `InvalidRequest`). The other errors,
+    like `WriteTimeout` or `Unavailable`, don't tell if the batch was applied, and a logged batch may still be
+    replayed from the batch log, so they are raised to avoid applying the non-idempotent operations twice.
+
+    Args:
+        isolate_errors (bool, optional): Whether to bisect the failed batches to fail only the invalid
+            operations. Defaults to False.
+        max_isolation_batches (int, optional): The max number of extra batches sent to isolate the failed
+            operations of a batch. When it's reached, the operations of the remaining failed sub-batches get
+            their error. Defaults to 16.
+        **kwargs: The other arguments of `AsyncBatcher`.
+    """
+
+    def __init__(self, *, isolate_errors: bool = False, max_isolation_batches: int = 16, **kwargs):
+        super().__init__(**kwargs)
+        self.isolate_errors = isolate_errors
+        self.max_isolation_batches = max_isolation_batches
+
+    @staticmethod
+    def _build_batch_query(batch: list[WriteOperation]) -> BatchQuery:
+        b = BatchQuery()
+        for op in batch:
+            if op.operation == "INSERT":
+                op.model.batch(b).create(**op.data)
+            elif op.operation == "UPDATE":
+                op.model.objects(**op.key).batch(b).update(**op.data)
+            elif op.operation == "DELETE":
+                op.model.objects(**op.key).batch(b).delete()
+        return b
+
+    def _execute(self, batch: list[WriteOperation]):
+        self._build_batch_query(batch).execute()
+
+    def _execute_rejectable(self, batch: list[WriteOperation]) -> Exception | None:
+        """Execute a batch, and return its error if it was rejected without being applied."""
+        try:
+            batch_query = self._build_batch_query(batch)
+        except Exception as e:
+            # the batch was not sent
+            return e
+        try:
+            batch_query.execute()
+        except RequestValidationException as e:
+            return e
+        return None
+
+    def _execute_isolating_errors(
+        self, batch: list[WriteOperation], indexes: list[int], results: list[None | Exception]
+    ):
+        error = self._execute_rejectable([batch[index] for index in indexes])
+        if error is None:
+            return
+        failed_batches = [(indexes, error)]
+        extra_batches = 0
+        while failed_batches:
+            indexes, error = failed_batches.pop()
+            if len(indexes) == 1 or extra_batches + 2 > self.max_isolation_batches:
+                for index in indexes:
+                    results[index] = error
+                continue
+            middle = len(indexes) // 2
+            for half in (indexes[:middle], indexes[middle:]):
+                extra_batches += 1
+                error = self._execute_rejectable([batch[index] for index in half])
+                if error is not None:
+                    failed_batches.append((half, error))
+
+    def process_batch(self, batch: list[WriteOperation]) -> list[None | Exception]:
+        results = [_get_operation_error(op) for op in batch]
+        indexes = [index for index, error in enumerate(results) if error is None]
+        if not indexes:
+            return results
+        if self.isolate_errors:
+            self._execute_isolating_errors(batch, indexes, results)
+        else:
+            self._execute([batch[index] for index in indexes])
         return results
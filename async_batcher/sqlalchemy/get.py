@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from asyncio import current_task
+from typing import TYPE_CHECKING, Any
+
+from async_batcher.batcher import AsyncBatcher
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import async_scoped_session, async_sessionmaker
+from sqlalchemy.orm import QueryableAttribute
+
+if TYPE_CHECKING:
+    from collections.abc import Hashable, Sequence
+
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+
+class AsyncSqlalchemyGetBatcher(AsyncBatcher[Any, Any]):
+    """Batcher for SQLAlchemy lookups by primary key or by a unique column.
+
+    The keys of a batch are deduplicated and loaded with a single `SELECT ... WHERE key IN (...)` statement,
+    split in chunks to respect the driver bind parameters limit, then the rows are mapped back to the items.
+    The items of the missing rows get None.
+
+    Args:
+        model: The SQLAlchemy model of the table to read.
+        async_engine (AsyncEngine): The async engine to use.
+        key_column (optional): The unique column, or the model attribute, used to look up the rows. If None,
+            the single column of the model primary key is used. Defaults to None.
+        columns (optional): The list of columns to load. If None, the model instances are returned, otherwise
+            the tuples of the columns values. Defaults to None.
+        max_bind_params (int, optional): The max number of keys of a single statement, to respect the driver
+            bind parameters limit. Defaults to 32766 (the SQLite limit).
+        **kwargs: The arguments of `AsyncBatcher`.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        async_engine: AsyncEngine,
+        key_column: Any = None,
+        columns: Sequence[Any] | None = None,
+        max_bind_params: int = 32766,
+        **kwargs,
+    ):
+        mapper = inspect(model)
+        if key_column is None:
+            if len(mapper.primary_key) != 1:
+                raise ValueError("key_column is required for the models with a composite primary key")
+            key_column = mapper.primary_key[0]
+        # the key is resolved to its column, to select it, and to its attribute, to read it from the instances
+        if isinstance(key_column, QueryableAttribute):
+            key_attribute = key_column.key
+            key_column = key_column.property.columns[0]
+        else:
+            key_attribute = mapper.get_property_by_column(key_column).key
+        if max_bind_params < 1:
+            raise ValueError("Valid max_bind_params value is greater than 0")
+        super().__init__(**kwargs)
+        self.model = model
+        self.async_engine = async_engine
+        self.async_session_maker = async_scoped_session(
+            async_sessionmaker(
+                bind=async_engine,
+                autocommit=False,
+                autoflush=False,
+                expire_on_commit=False,
+            ),
+            scopefunc=current_task,
+        )
+        self.key_column = key_column
+        self._key_attribute = key_attribute
+        self.columns = list(columns) if columns is not None else None
+        self.max_bind_params = max_bind_params
+
+    async def _get_rows(self, session: AsyncSession, keys: list[Hashable]) -> dict[Hashable, Any]:
+        if self.columns is None:
+            instances = await session.scalars(select(self.model).where(self.key_column.in_(keys)))
+            return {getattr(instance, self._key_attribute): instance for instance in instances}
+        # the key is selected first to map the rows to the items
+        rows = await session.execute(select(self.key_column, *self.columns).where(self.key_column.in_(keys)))
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+    async def process_batch(self, batch: list[Any]) -> list[Any]:
+        keys = list(dict.fromkeys(batch))
+        rows: dict[Hashable, Any] = {}
+        session: AsyncSession
+        async with self.async_session_maker() as session:
+            for start in range(0, len(keys), self.max_bind_params):
+                rows.update(await self._get_rows(session, keys[start : start + self.max_bind_params]))
+        return [rows.get(key) for key in batch]
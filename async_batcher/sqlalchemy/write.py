@@ -4,26 +4,112 @@ from asyncio import current_task
 from typing import TYPE_CHECKING, Any, Literal
 
 from async_batcher.batcher import AsyncBatcher
-from sqlalchemy import Row, insert, update
-from sqlalchemy.ext.asyncio import async_scoped_session, async_sessionmaker
+from async_batcher.metrics import ISOLATED_BATCHES, ISOLATION_SUB_BATCHES
+from sqlalchemy import Row, delete, insert, inspect, tuple_, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session, async_sessionmaker
+from sqlalchemy.pool import QueuePool
 
 if TYPE_CHECKING:
     from collections.abc import Sequence
 
-    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+    from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+# the dialect-specific insert constructs supporting the upserts
+_UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+    "mysql": mysql.insert,
+    "mariadb": mysql.insert,
+}
 
 
 class AsyncSqlalchemyWriteBatcher(AsyncBatcher[dict[str, Any], None]):
+    """Batcher for SQLAlchemy insert, update, upsert and delete operations.
+
+    The upserts are multi-row inserts with the dialect conflict clause (`ON CONFLICT DO UPDATE` for PostgreSQL
+    and SQLite, `ON DUPLICATE KEY UPDATE` for MySQL and MariaDB), which update the columns of the items on
+    conflict. The items of a batch are written with a statement per set of columns, so the columns missing
+    from an item are not updated, and the items of a batch with the same conflict columns values are merged
+    in order into a single row, because PostgreSQL can't update a row twice in the same statement.
+
+    The deletes take the primary key values of the rows, and delete all the rows of a batch with a single
+    `DELETE ... WHERE key IN (...)` statement; when `returning` is set, the items of the missing rows get
+    None.
+
+    With `use_copy`, the inserts of the asyncpg engines are sent with the PostgreSQL binary `COPY` protocol
+    instead of a multi-row insert, which is much faster for large batches. The values are copied as they are,
+    without the processing of the SQLAlchemy column types, so they should be supported by the asyncpg codecs.
+
+    The statements are built once and reused by the next batches, so their executions hit the engine compiled
+    cache instead of compiling the SQL again.
+
+    By default, if one row of a batch fails (e.g. a constraint violation), all the batch items get its error.
+    When `isolate_errors` is True, the failed batch is rolled back and split in two halves, which are written
+    in their own transactions, recursively, until the failed rows are found: only those get the error, and
+    the other ones are committed. The sub-batches are committed in the order of the items, so the last write
+    of a row wins. The failed batches are counted by the `isolated_batches` metric, and their extra
+    sub-batches by the `isolation_sub_batches` metric.
+
+    Args:
+        model: The SQLAlchemy model of the table to write.
+        async_engine (AsyncEngine): The async engine to use.
+        operation (Literal["insert", "update", "upsert", "delete"], optional): The operation to run for each
+            item. Defaults to "insert".
+        returning (optional): The column, or the list of columns, to return for each item. If None,
+            nothing is returned. It's not supported for the MySQL and MariaDB dialects. Defaults to None.
+        conflict_columns (Sequence[str], optional): The columns of the unique index used to detect the
+            conflicts of the PostgreSQL and SQLite upserts. If None, the primary key columns are used.
+            Defaults to None.
+        use_copy (bool, optional): Whether to insert the batches with asyncpg `copy_records_to_table`. It
+            requires the "insert" operation without `returning`, and the other drivers fall back to
+            the multi-row insert. Defaults to False.
+        reuse_connections (bool, optional): Whether to keep a dedicated connection for each concurrent batch
+            and reuse it for the next batches, instead of checking out a connection from the engine pool for
+            each batch. At most `concurrency` idle connections are kept, or the engine pool size when the
+            concurrency is not limited (5 for the engines without a `QueuePool`), and they are closed when
+            the batcher is stopped. Defaults to False.
+        isolate_errors (bool, optional): Whether to bisect the failed batches to fail only the invalid rows.
+            Defaults to False.
+        max_isolation_batches (int, optional): The max number of extra sub-batches written to isolate the
+            failed rows of a batch. When it's reached, the rows of the remaining failed sub-batches get their
+            error. Defaults to 16.
+        max_bind_params (int, optional): The max number of bind parameters of a batch, to respect the driver
+            limit (e.g. 32766 for SQLite, 32767 for asyncpg). Each row binds one parameter per column.
+            If None, the batches are limited by the count only. Defaults to None.
+        **kwargs: The arguments of `AsyncBatcher`.
+    """
+
+    # the max number of idle connections kept when neither the concurrency nor the engine pool is limited
+    DEFAULT_MAX_FREE_SESSIONS = 5
+
     def __init__(
         self,
         model: Any,
         async_engine: AsyncEngine,
-        operation: Literal["insert", "update"] = "insert",
+        operation: Literal["insert", "update", "upsert", "delete"] = "insert",
         returning: Any = None,
+        conflict_columns: Sequence[str] | None = None,
+        use_copy: bool = False,
+        reuse_connections: bool = False,
+        isolate_errors: bool = False,
+        max_isolation_batches: int = 16,
+        max_bind_params: int | None = None,
         **kwargs,
     ):
-        if operation not in ["insert", "update"]:
+        if operation not in ["insert", "update", "upsert", "delete"]:
             raise ValueError(f"Invalid operation: {operation}")
+        if operation == "upsert" and async_engine.dialect.name not in _UPSERT_INSERTS:
+            raise ValueError(f"Upserts are not supported for the {async_engine.dialect.name} dialect")
+        if returning and async_engine.dialect.name in ("mysql", "mariadb"):
+            # the results are read with a RETURNING clause, which MySQL doesn't have
+            raise ValueError(f"returning is not supported for the {async_engine.dialect.name} dialect")
+        if use_copy and (operation != "insert" or returning):
+            raise ValueError("use_copy requires the insert operation without returning")
+        if max_bind_params is not None:
+            # each row binds one parameter per column
+            kwargs.setdefault("item_weight", len)
+            kwargs.setdefault("max_batch_weight", max_bind_params)
         super().__init__(**kwargs)
         self.model = model
         self.async_engine = async_engine
@@ -38,23 +124,245 @@ class AsyncSqlalchemyWriteBatcher(AsyncBatcher[dict[str, Any], None]):
         )
         self.operation = operation
         self.returning = returning
+        mapper = inspect(model)
+        self._primary_key_names = [mapper.get_property_by_column(column).key for column in mapper.primary_key]
+        self.conflict_columns = list(conflict_columns) if conflict_columns else list(mapper.primary_key)
+        self._conflict_keys = [
+            mapper.get_property_by_column(
+                mapper.local_table.c[column] if isinstance(column, str) else column
+            ).key
+            for column in self.conflict_columns
+        ]
+        self.use_copy = use_copy and async_engine.dialect.driver == "asyncpg"
+        self.reuse_connections = reuse_connections
+        self.isolate_errors = isolate_errors
+        self.max_isolation_batches = max_isolation_batches
+        # the statements built for the previous batches, by updated columns for the upserts
+        self._statements: dict[tuple[str, ...], Any] = {}
+        # the sessions bound to the connections of the batches which are not running
+        self._free_sessions: list[AsyncSession] = []
+        if self.concurrency > 0:
+            self._max_free_sessions = self.concurrency
+        elif isinstance(async_engine.pool, QueuePool):
+            self._max_free_sessions = async_engine.pool.size()
+        else:
+            self._max_free_sessions = self.DEFAULT_MAX_FREE_SESSIONS
 
-    async def process_batch(self, batch: list[dict[str, Any]]) -> Sequence[Row[tuple[Any]]] | None:
-        session: AsyncSession
-        async with self.async_session_maker() as session:
-            if self.operation == "insert":
-                statement = insert(self.model).returning()
-            elif self.operation == "update":
-                statement = update(self.model)
-            if self.returning:
-                if isinstance(self.returning, list):
-                    statement = statement.returning(*self.returning)
-                else:
-                    statement = statement.returning(self.returning)
+    def _get_upsert_statement(self, keys: Sequence[str]) -> Any:
+        mapper = inspect(self.model)
+        statement = _UPSERT_INSERTS[self.async_engine.dialect.name](self.model)
+        # the primary key is updated to itself when the items have no other column, to return the rows
+        update_keys = [key for key in keys if key not in self._primary_key_names] or self._primary_key_names
+        if self.async_engine.dialect.name in ("mysql", "mariadb"):
+            return statement.on_duplicate_key_update(
+                {key: statement.inserted[mapper.columns[key].name] for key in update_keys}
+            )
+        return statement.on_conflict_do_update(
+            index_elements=self.conflict_columns,
+            set_={key: statement.excluded[mapper.columns[key].name] for key in update_keys},
+        )
+
+    async def _delete(self, session: AsyncSession, batch: list[dict[str, Any]]) -> list[Any] | None:
+        mapper = inspect(self.model)
+        keys = [tuple(item[name] for name in self._primary_key_names) for item in batch]
+        if len(mapper.primary_key) == 1:
+            condition = mapper.primary_key[0].in_([key[0] for key in keys])
+        else:
+            condition = tuple_(*mapper.primary_key).in_(keys)
+        statement = delete(self.model).where(condition).execution_options(synchronize_session=False)
+        if not self.returning:
+            await session.execute(statement)
+            return None
+        returning = self.returning if isinstance(self.returning, list) else [self.returning]
+        # the primary key is returned to map the deleted rows to the items
+        res = await session.execute(statement.returning(*mapper.primary_key, *returning))
+        primary_key_length = len(mapper.primary_key)
+        deleted_rows = {tuple(row[:primary_key_length]): row[primary_key_length:] for row in res.all()}
+        return [deleted_rows.get(key) for key in keys]
+
+    async def _copy_records(self, connection: AsyncConnection, batch: list[dict[str, Any]]):
+        mapper = inspect(self.model)
+        table = self.model.__table__
+        # a COPY has a fixed list of columns, so the items are copied by set of columns
+        groups: dict[tuple[str, ...], list[dict[str, Any]]] = {}
+        for item in batch:
+            groups.setdefault(tuple(sorted(item)), []).append(item)
+        raw_connection = await connection.get_raw_connection()
+        # the COPY runs in the transaction of the session, which is committed by the caller
+        for keys, items in groups.items():
+            await raw_connection.driver_connection.copy_records_to_table(
+                table.name,
+                records=[tuple(item[key] for key in keys) for item in items],
+                columns=[mapper.columns[key].name for key in keys],
+                schema_name=table.schema,
+            )
+
+    def _get_statement(self, keys: Sequence[str]) -> Any:
+        # the upsert statements depend on the updated columns, the other ones are the same for all the batches
+        cache_key = tuple(keys) if self.operation == "upsert" else ()
+        statement = self._statements.get(cache_key)
+        if statement is not None:
+            return statement
+        if self.operation == "insert":
+            statement = insert(self.model).returning()
+        elif self.operation == "update":
+            statement = update(self.model)
+        elif self.operation == "upsert":
+            statement = self._get_upsert_statement(keys)
+        if self.returning:
+            returning = self.returning if isinstance(self.returning, list) else [self.returning]
+            if self.operation == "update":
+                statement = statement.returning(*returning)
+            else:
+                # the returned rows are sorted like the items, not in the order of the database
+                statement = statement.returning(*returning, sort_by_parameter_order=True)
+        self._statements[cache_key] = statement
+        return statement
+
+    def _merge_conflicting_items(self, batch: list[dict[str, Any]]) -> tuple[list[dict[str, Any]], list[int]]:
+        """Merge the upserted items with the same conflict columns values.
+
+        Returns:
+            tuple[list[dict[str, Any]], list[int]]: The merged rows, and the index of the row of each item.
+        """
+        rows: list[dict[str, Any]] = []
+        rows_indexes: list[int] = []
+        conflict_rows: dict[tuple, int] = {}
+        for item in batch:
+            if any(key not in item for key in self._conflict_keys):
+                rows_indexes.append(len(rows))
+                rows.append(item)
+                continue
+            conflict_values = tuple(item[key] for key in self._conflict_keys)
+            row_index = conflict_rows.get(conflict_values)
+            if row_index is None:
+                conflict_rows[conflict_values] = len(rows)
+                rows_indexes.append(len(rows))
+                rows.append(item)
+            else:
+                # the columns of the later items override the ones of the earlier items
+                rows[row_index] = {**rows[row_index], **item}
+                rows_indexes.append(row_index)
+        return rows, rows_indexes
+
+    async def _execute_statements(self, session: AsyncSession, batch: list[dict[str, Any]]) -> list[Any]:
+        if self.operation == "upsert":
+            rows, rows_indexes = self._merge_conflicting_items(batch)
+        else:
+            rows, rows_indexes = batch, list(range(len(batch)))
+        # the statements depend on the written columns, so the rows are written by set of columns
+        groups: dict[tuple[str, ...], list[int]] = {}
+        for index, row in enumerate(rows):
+            groups.setdefault(tuple(sorted(row)), []).append(index)
+        rows_results: list[Any] = [None] * len(rows)
+        for keys, indexes in groups.items():
             res = await session.execute(
-                statement=statement,
-                params=batch,
+                statement=self._get_statement(keys),
+                params=[rows[index] for index in indexes],
             )
-            await session.commit()
             if self.returning:
-                return res.all()
+                for index, result in zip(indexes, res.all(), strict=True):
+                    rows_results[index] = result
+        return [rows_results[index] for index in rows_indexes]
+
+    async def _write(
+        self, session: AsyncSession, batch: list[dict[str, Any]]
+    ) -> Sequence[Row[tuple[Any]] | Any] | None:
+        if self.use_copy:
+            await self._copy_records(await session.connection(), batch)
+            await session.commit()
+            return None
+        if self.operation == "delete":
+            results = await self._delete(session, batch)
+            await session.commit()
+            return results
+        results = await self._execute_statements(session, batch)
+        await session.commit()
+        if self.returning:
+            return results
+        return None
+
+    async def _write_isolating_errors(
+        self, session: AsyncSession, batch: list[dict[str, Any]]
+    ) -> tuple[list[Any], bool]:
+        """Write a batch, and bisect it if it fails to isolate the failed rows.
+
+        Returns:
+            tuple[list[Any], bool]: The results of the items, and whether a write failed and was rolled back.
+        """
+        try:
+            return await self._write(session, batch) or [None] * len(batch), False
+        except Exception as e:
+            await session.rollback()
+            # the sub-batches to write, or to split with their error when they failed
+            sub_batches: list[tuple[list[int], Exception | None]] = [(list(range(len(batch))), e)]
+        if self.metrics is not None:
+            self.metrics.increment(ISOLATED_BATCHES)
+        results: list[Any] = [None] * len(batch)
+        extra_batches = 0
+        # the sub-batches are written depth-first, left half first, so they are committed in the order of
+        # the items, and a later write of a row can't be committed before an earlier one
+        while sub_batches:
+            indexes, error = sub_batches.pop()
+            if error is None:
+                try:
+                    sub_batch_results = await self._write(session, [batch[index] for index in indexes])
+                except Exception as e:
+                    await session.rollback()
+                    sub_batches.append((indexes, e))
+                    continue
+                if sub_batch_results is not None:
+                    for index, result in zip(indexes, sub_batch_results, strict=True):
+                        results[index] = result
+                continue
+            if len(indexes) == 1 or extra_batches + 2 > self.max_isolation_batches:
+                for index in indexes:
+                    results[index] = error
+                continue
+            extra_batches += 2
+            middle = len(indexes) // 2
+            sub_batches.append((indexes[middle:], None))
+            sub_batches.append((indexes[:middle], None))
+        if self.metrics is not None:
+            self.metrics.increment(ISOLATION_SUB_BATCHES, extra_batches)
+        return results, True
+
+    async def _checkout_session(self) -> AsyncSession:
+        if self._free_sessions:
+            return self._free_sessions.pop()
+        connection = await self.async_engine.connect()
+        return AsyncSession(bind=connection, autoflush=False, expire_on_commit=False)
+
+    @staticmethod
+    async def _close_session(session: AsyncSession):
+        await session.close()
+        await session.bind.close()
+
+    async def process_batch(self, batch: list[dict[str, Any]]) -> Sequence[Row[tuple[Any]] | Any] | None:
+        if not self.reuse_connections:
+            session: AsyncSession
+            async with self.async_session_maker() as session:
+                if self.isolate_errors:
+                    return (await self._write_isolating_errors(session, batch))[0]
+                return await self._write(session, batch)
+        session = await self._checkout_session()
+        failed = False
+        try:
+            if self.isolate_errors:
+                results, failed = await self._write_isolating_errors(session, batch)
+            else:
+                results = await self._write(session, batch)
+        except BaseException:
+            # the connection state is unknown after a failure, so it's not reused
+            await self._close_session(session)
+            raise
+        if failed or len(self._free_sessions) >= self._max_free_sessions:
+            # the failed writes were rolled back, but the connection state is unknown, so it's not reused
+            await self._close_session(session)
+        else:
+            self._free_sessions.append(session)
+        return results
+
+    async def _close(self):
+        while self._free_sessions:
+            await self._close_session(self._free_sessions.pop())
@@ -0,0 +1,56 @@
+"""Measure the number of items per second the batcher can handle with a no-op `process_batch`.
+
+Usage:
+    python benchmarks/batcher_throughput.py --items 200000 --max-batch-size 1000
+    # submit the items in groups of 100 with `process_many`
+    python benchmarks/batcher_throughput.py --items 200000 --max-batch-size 1000 --group-size 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+from async_batcher.batcher import AsyncBatcher
+
+
+class NoOpAsyncBatcher(AsyncBatcher[int, int]):
+    async def process_batch(self, batch: list[int]) -> list[int]:
+        return batch
+
+
+async def _run(items: int, max_batch_size: int, concurrency: int, group_size: int) -> float:
+    batcher = NoOpAsyncBatcher(max_batch_size=max_batch_size, max_queue_time=0.01, concurrency=concurrency)
+    started_at = time.perf_counter()
+    if group_size > 0:
+        await asyncio.gather(
+            *[
+                batcher.process_many(items=range(i, min(i + group_size, items)))
+                for i in range(0, items, group_size)
+            ]
+        )
+    else:
+        await asyncio.gather(*[batcher.process(item=i) for i in range(items)])
+    elapsed_time = time.perf_counter() - started_at
+    await batcher.stop()
+    return items / elapsed_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=200_000)
+    parser.add_argument("--max-batch-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--group-size", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    results = [
+        asyncio.run(_run(args.items, args.max_batch_size, args.concurrency, args.group_size))
+        for _ in range(args.repeat)
+    ]
+    print(f"items/sec: best={max(results):,.0f} mean={sum(results) / len(results):,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Measure the per-batch overhead of the DynamoDB get batcher against a local DynamoDB stand-in.
+
+By default, the benchmark starts an in-process HTTP server answering the `BatchGetItem` requests instantly,
+so the measured time is the client overhead. A DynamoDB Local instance (see `docker-compose/dynamodb.yml`) can
+be used instead with `--endpoint-url`.
+
+Usage:
+    python benchmarks/dynamodb_get.py --items 20000 --max-batch-size 100 --concurrency 4
+    python benchmarks/dynamodb_get.py --endpoint-url http://localhost:8000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from contextlib import suppress
+
+import aioboto3
+from aiohttp import web
+from async_batcher.aws.dynamodb.get import AsyncDynamoDbGetBatcher, GetItem
+
+TABLE_NAME = "benchmark_table"
+
+
+async def _batch_get_item_handler(request: web.Request) -> web.Response:
+    body = json.loads(await request.read())
+    responses = {table_name: table["Keys"] for table_name, table in body["RequestItems"].items()}
+    return web.Response(
+        body=json.dumps({"Responses": responses, "UnprocessedKeys": {}}),
+        content_type="application/x-amz-json-1.0",
+    )
+
+
+async def _start_stand_in() -> tuple[web.AppRunner, str]:
+    app = web.Application()
+    app.router.add_post("/", _batch_get_item_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def _create_table(session: aioboto3.Session, endpoint_url: str, items: int):
+    async with session.resource("dynamodb", endpoint_url=endpoint_url) as dynamodb:
+        with suppress(dynamodb.meta.client.exceptions.ResourceInUseException):
+            await dynamodb.create_table(
+                TableName=TABLE_NAME,
+                KeySchema=[{"AttributeName": "key", "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": "key", "AttributeType": "S"}],
+                BillingMode="PAY_PER_REQUEST",
+            )
+        table = await dynamodb.Table(TABLE_NAME)
+        async with table.batch_writer() as writer:
+            for i in range(items):
+                await writer.put_item(Item={"key": str(i)})
+
+
+async def _run(
+    items: int, max_batch_size: int, concurrency: int, endpoint_url: str | None
+) -> tuple[float, float]:
+    session = aioboto3.Session(
+        region_name="us-west-2",
+        aws_access_key_id="DUMMYIDEXAMPLE",
+        aws_secret_access_key="DUMMYEXAMPLEKEY",
+    )
+    runner = None
+    if endpoint_url is None:
+        runner, endpoint_url = await _start_stand_in()
+    else:
+        await _create_table(session, endpoint_url, items)
+    batcher = AsyncDynamoDbGetBatcher(
+        endpoint_url=endpoint_url,
+        aioboto3_session=session,
+        max_batch_size=max_batch_size,
+        max_queue_time=0.01,
+        concurrency=concurrency,
+    )
+    try:
+        started_at = time.perf_counter()
+        await asyncio.gather(
+            *[batcher.process(item=GetItem(table_name=TABLE_NAME, key={"key": str(i)})) for i in range(items)]
+        )
+        elapsed_time = time.perf_counter() - started_at
+    finally:
+        await batcher.stop()
+        if runner is not None:
+            await runner.cleanup()
+    batches = -(-items // max_batch_size)
+    return items / elapsed_time, elapsed_time * concurrency / batches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=20_000)
+    parser.add_argument("--max-batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--endpoint-url", default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    results = [
+        asyncio.run(_run(args.items, args.max_batch_size, args.concurrency, args.endpoint_url))
+        for _ in range(args.repeat)
+    ]
+    best_throughput, best_batch_time = max(results)
+    print(f"items/sec: best={best_throughput:,.0f}, time per batch: {best_batch_time * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
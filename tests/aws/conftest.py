@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+
+class FakeDynamoDbResource:
+    """An in-memory DynamoDB resource, which records the batch requests it receives."""
+
+    def __init__(self, table_keys: dict[str, list[str]]):
+        self.table_keys = table_keys
+        self.tables: dict[str, dict[tuple, dict]] = {table_name: {} for table_name in table_keys}
+        self.get_requests: list[dict] = []
+        self.write_requests: list[dict] = []
+        self.describe_table_calls: list[str] = []
+        # the errors raised by the next requests of each table
+        self.errors: dict[str, list[Exception]] = {}
+        # the number of next requests of each table whose items are returned as unprocessed
+        self.unprocessed_requests: dict[str, int] = {}
+        self.meta = SimpleNamespace(client=SimpleNamespace(describe_table=self._describe_table))
+
+    def _get_key_values(self, table_name: str, item: dict) -> tuple:
+        return tuple(item[name] for name in self.table_keys[table_name])
+
+    async def _describe_table(self, TableName: str):
+        self.describe_table_calls.append(TableName)
+        return {"Table": {"KeySchema": [{"AttributeName": name} for name in self.table_keys[TableName]]}}
+
+    def _pop_unprocessed(self, request_items: dict) -> set[str]:
+        for table_name in request_items:
+            if self.errors.get(table_name):
+                raise self.errors[table_name].pop(0)
+        unprocessed = set()
+        for table_name in request_items:
+            if self.unprocessed_requests.get(table_name, 0) > 0:
+                self.unprocessed_requests[table_name] -= 1
+                unprocessed.add(table_name)
+        return unprocessed
+
+    async def batch_get_item(self, RequestItems: dict, **kwargs):
+        self.get_requests.append(RequestItems)
+        await asyncio.sleep(0)
+        unprocessed = self._pop_unprocessed(RequestItems)
+        response = {"Responses": {}, "UnprocessedKeys": {}}
+        for table_name, request in RequestItems.items():
+            if table_name in unprocessed:
+                response["UnprocessedKeys"][table_name] = {"Keys": request["Keys"]}
+                continue
+            table = self.tables[table_name]
+            response["Responses"][table_name] = [
+                table[key_values]
+                for key_values in (self._get_key_values(table_name, key) for key in request["Keys"])
+                if key_values in table
+            ]
+        return response
+
+    async def batch_write_item(self, RequestItems: dict, **kwargs):
+        self.write_requests.append(RequestItems)
+        await asyncio.sleep(0)
+        unprocessed = self._pop_unprocessed(RequestItems)
+        response = {"UnprocessedItems": {}}
+        for table_name, requests in RequestItems.items():
+            if table_name in unprocessed:
+                response["UnprocessedItems"][table_name] = requests
+                continue
+            table = self.tables[table_name]
+            for request in requests:
+                if "PutRequest" in request:
+                    item = request["PutRequest"]["Item"]
+                    table[self._get_key_values(table_name, item)] = item
+                else:
+                    table.pop(self._get_key_values(table_name, request["DeleteRequest"]["Key"]), None)
+        return response
+
+
+class FakeSession:
+    """An aioboto3 session which returns the same fake resource, and counts the opened resources."""
+
+    def __init__(self, dynamodb: FakeDynamoDbResource):
+        self.dynamodb = dynamodb
+        self.opened = 0
+        self.closed = 0
+
+    @asynccontextmanager
+    async def resource(self, service_name: str, **kwargs):
+        self.opened += 1
+        try:
+            yield self.dynamodb
+        finally:
+            self.closed += 1
+
+
+@pytest.fixture(scope="function")
+def fake_dynamodb() -> FakeDynamoDbResource:
+    return FakeDynamoDbResource(table_keys={"table1": ["key"], "table2": ["key1", "key2"]})
+
+
+@pytest.fixture(scope="function")
+def fake_session(fake_dynamodb: FakeDynamoDbResource) -> FakeSession:
+    return FakeSession(fake_dynamodb)
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from async_batcher.aws.dynamodb.get import AsyncDynamoDbGetBatcher, GetItem
+from async_batcher.aws.dynamodb.write import AsyncDynamoDbWriteBatcher, WriteOperation
+from async_batcher.exceptions import RetriesExhaustedException
+from async_batcher.retry import RetryPolicy
+from botocore.exceptions import ClientError
+
+
+def client_error(code: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, "BatchWriteItem")
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_dynamodb_batcher_reuses_resource(fake_session, fake_dynamodb):
+    fake_dynamodb.tables["table1"] = {(str(i),): {"key": str(i), "value": i} for i in range(10)}
+    batcher = AsyncDynamoDbGetBatcher(aioboto3_session=fake_session, max_batch_size=2, concurrency=4)
+
+    results = await asyncio.gather(
+        *[batcher.process(item=GetItem(table_name="table1", key={"key": str(i)})) for i in range(10)]
+    )
+    assert [result["value"] for result in results] == list(range(10))
+    assert await batcher.process(item=GetItem(table_name="table1", key={"key": "1"})) == {
+        "key": "1",
+        "value": 1,
+    }
+    # the concurrent and the next batches use the same resource
+    assert len(fake_dynamodb.get_requests) > 1
+    assert (fake_session.opened, fake_session.closed) == (1, 0)
+
+    await batcher.stop()
+    assert (fake_session.opened, fake_session.closed) == (1, 1)
+    assert batcher._dynamodb is None
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_dynamodb_batcher_closes_unused_resource(fake_session):
+    batcher = AsyncDynamoDbWriteBatcher(aioboto3_session=fake_session)
+    # the resource is opened on the first batch
+    await batcher.stop()
+    assert (fake_session.opened, fake_session.closed) == (0, 0)
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_dynamodb_get_batcher_retries_unprocessed_keys(fake_session, fake_dynamodb):
+    fake_dynamodb.tables["table1"] = {("1",): {"key": "1", "value": 1}}
+    fake_dynamodb.unprocessed_requests["table1"] = 2
+    batcher = AsyncDynamoDbGetBatcher(
+        aioboto3_session=fake_session, retry_policy=RetryPolicy(base_delay=0.01, jitter=False)
+    )
+
+    assert await batcher.process(item=GetItem(table_name="table1", key={"key": "1"})) == {
+        "key": "1",
+        "value": 1,
+    }
+    assert len(fake_dynamodb.get_requests) == 3
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_dynamodb_write_batcher_retries_unprocessed_items_and_throttled_requests(
+    fake_session, fake_dynamodb
+):
+    fake_dynamodb.unprocessed_requests["table1"] = 1
+    fake_dynamodb.errors["table1"] = [client_error("ProvisionedThroughputExceededException")]
+    batcher = AsyncDynamoDbWriteBatcher(
+        aioboto3_session=fake_session, retry_policy=RetryPolicy(base_delay=0.01, jitter=False)
+    )
+
+    await batcher.process_many(
+        [WriteOperation(operation="PUT", table_name="table1", data={"key": str(i)}) for i in range(3)]
+    )
+    # the throttled request, then the unprocessed items, are retried
+    assert len(fake_dynamodb.write_requests) == 3
+    assert set(fake_dynamodb.tables["table1"]) == {("0",), ("1",), ("2",)}
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_dynamodb_batcher_retries_exhausted(fake_session, fake_dynamodb):
+    fake_dynamodb.unprocessed_requests["table1"] = 10
+    fake_dynamodb.errors["table2"] = [client_error("ThrottlingException")]
+    batcher = AsyncDynamoDbGetBatcher(aioboto3_session=fake_session, retry_policy=None)
+
+    with pytest.raises(RetriesExhaustedException) as exc_info:
+        await batcher.process(item=GetItem(table_name="table1", key={"key": "1"}))
+    assert exc_info.value.__cause__ is None
+    # the throttling error is the cause of the failure
+    with pytest.raises(RetriesExhaustedException) as exc_info:
+        await batcher.process(item=GetItem(table_name="table2", key={"key1": "1", "key2": "2"}))
+    assert exc_info.value.__cause__.response["Error"]["Code"] == "ThrottlingException"
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_dynamodb_batcher_doesnt_retry_other_errors(fake_session, fake_dynamodb):
+    fake_dynamodb.errors["table1"] = [client_error("ValidationException")]
+    batcher = AsyncDynamoDbWriteBatcher(aioboto3_session=fake_session)
+
+    with pytest.raises(ClientError, match="ValidationException"):
+        await batcher.process(item=WriteOperation(operation="PUT", table_name="table1", data={"key": "1"}))
+    assert len(fake_dynamodb.write_requests) == 1
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_dynamodb_write_batcher_combines_writes(fake_session, fake_dynamodb):
+    fake_dynamodb.unprocessed_requests["table1"] = 1
+    batcher = AsyncDynamoDbWriteBatcher(
+        aioboto3_session=fake_session,
+        combine_writes=True,
+        retry_policy=RetryPolicy(base_delay=0.01, jitter=False),
+    )
+
+    await batcher.process_many(
+        [
+            WriteOperation(operation="PUT", table_name="table1", data={"key": "1", "value": i})
+            for i in range(3)
+        ]
+    )
+    # only the last operation is retried, and the superseded operations get its final result
+    assert [len(request["table1"]) for request in fake_dynamodb.write_requests] == [1, 1]
+    assert fake_dynamodb.tables["table1"] == {("1",): {"key": "1", "value": 2}}
+    assert fake_dynamodb.describe_table_calls == ["table1"]
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_dynamodb_write_batcher_doesnt_retry_superseded_writes(fake_session, fake_dynamodb):
+    batcher = AsyncDynamoDbWriteBatcher(
+        aioboto3_session=fake_session,
+        combine_writes=True,
+        table_keys={"table1": ["key"]},
+        retry_policy=RetryPolicy(base_delay=0.01),
+    )
+
+    for _ in range(10):
+        fake_dynamodb.unprocessed_requests["table1"] = 1
+        fake_dynamodb.write_requests.clear()
+        await batcher.process_many(
+            [
+                WriteOperation(operation="PUT", table_name="table1", data={"key": "1", "value": i})
+                for i in range(3)
+            ]
+        )
+        # the jittered retries can't write a superseded operation after the last one
+        assert [request["table1"] for request in fake_dynamodb.write_requests] == [
+            [{"PutRequest": {"Item": {"key": "1", "value": 2}}}]
+        ] * 2
+        assert fake_dynamodb.tables["table1"] == {("1",): {"key": "1", "value": 2}}
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_dynamodb_write_batcher_superseded_writes_fail_with_last_one(fake_session, fake_dynamodb):
+    fake_dynamodb.errors["table1"] = [client_error("ValidationException")]
+    batcher = AsyncDynamoDbWriteBatcher(
+        aioboto3_session=fake_session, combine_writes=True, table_keys={"table1": ["key"]}, split_by="table"
+    )
+
+    results = await batcher.process_many(
+        [
+            WriteOperation(operation="PUT", table_name="table1", data={"key": "1", "value": 1}),
+            WriteOperation(operation="DELETE", table_name="table1", data={"key": "1"}),
+        ],
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, ClientError) for result in results)
+    assert fake_dynamodb.describe_table_calls == []
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_dynamodb_write_batcher_doesnt_combine_writes_by_default(fake_session, fake_dynamodb):
+    batcher = AsyncDynamoDbWriteBatcher(aioboto3_session=fake_session)
+
+    await batcher.process_many(
+        [WriteOperation(operation="PUT", table_name="table1", data={"key": str(i)}) for i in range(2)]
+    )
+    # the key schema is not loaded, so the DescribeTable permission is not needed
+    assert fake_dynamodb.describe_table_calls == []
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_dynamodb_batchers_split_by_table(fake_session, fake_dynamodb):
+    fake_dynamodb.errors["table2"] = [client_error("ValidationException")]
+    write_batcher = AsyncDynamoDbWriteBatcher(aioboto3_session=fake_session, split_by="table")
+    get_batcher = AsyncDynamoDbGetBatcher(aioboto3_session=fake_session, split_by="table")
+
+    results = await write_batcher.process_many(
+        [
+            WriteOperation(operation="PUT", table_name="table1", data={"key": "1"}),
+            WriteOperation(operation="PUT", table_name="table2", data={"key1": "1", "key2": "2"}),
+            WriteOperation(operation="PUT", table_name="table1", data={"key": "2"}),
+        ],
+        return_exceptions=True,
+    )
+    # each table is written in its own request, so the failed table doesn't fail the other one
+    assert sorted(list(request) for request in fake_dynamodb.write_requests) == [["table1"], ["table2"]]
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], ClientError)
+
+    results = await get_batcher.process_many(
+        [
+            GetItem(table_name="table1", key={"key": "1"}),
+            GetItem(table_name="table2", key={"key1": "1", "key2": "2"}),
+            GetItem(table_name="table1", key={"key": "2"}),
+        ]
+    )
+    assert sorted(list(request) for request in fake_dynamodb.get_requests) == [["table1"], ["table2"]]
+    assert results == [{"key": "1"}, None, {"key": "2"}]
+    await write_batcher.stop()
+    await get_batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_dynamodb_batchers_split_by_partition(fake_session, fake_dynamodb):
+    write_batcher = AsyncDynamoDbWriteBatcher(
+        aioboto3_session=fake_session, split_by="partition", max_parallel_requests=3
+    )
+    get_batcher = AsyncDynamoDbGetBatcher(
+        aioboto3_session=fake_session, split_by="partition", max_parallel_requests=3
+    )
+    operations = [
+        WriteOperation(operation="PUT", table_name="table1", data={"key": str(i), "value": i})
+        for i in range(20)
+    ]
+    partitions = {write_batcher._get_partition((str(i),)) for i in range(20)}
+
+    await write_batcher.process_many(operations)
+    # the items of each partition are written in their own request
+    assert len(fake_dynamodb.write_requests) == len(partitions) > 1
+    for request in fake_dynamodb.write_requests:
+        request_partitions = {
+            write_batcher._get_partition((item["PutRequest"]["Item"]["key"],)) for item in request["table1"]
+        }
+        assert len(request_partitions) == 1
+
+    results = await get_batcher.process_many(
+        [GetItem(table_name="table1", key={"key": str(i)}) for i in range(20)]
+    )
+    assert len(fake_dynamodb.get_requests) == len(
+        {get_batcher._get_partition((("key", str(i)),)) for i in range(20)}
+    )
+    assert [result["value"] for result in results] == list(range(20))
+    await write_batcher.stop()
+    await get_batcher.stop()
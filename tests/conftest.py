@@ -58,3 +58,11 @@ class _TestModel(BaseModel):
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(30))
     age: Mapped[int] = mapped_column()
+
+
+class _TestNullableModel(BaseModel):
+    __tablename__ = "test_nullable_table"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str | None] = mapped_column(String(30))
+    age: Mapped[int | None] = mapped_column()
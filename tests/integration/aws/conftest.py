@@ -39,6 +39,7 @@ def write_batcher(dynamodb_aioboto3_session):
         endpoint_url="http://localhost:8000",
         aioboto3_session=dynamodb_aioboto3_session,
         max_queue_time=2,
+        combine_writes=True,
     )
     yield batcher
     batcher.stop()
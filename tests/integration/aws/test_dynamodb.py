@@ -67,3 +67,83 @@ async def test_dynamodb_batchers(
                 assert result == {"key1": str(i), "key2": str(i * 2), "value": i * 3}
             else:
                 assert result is None
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_dynamodb_get_batcher_projection(
+    dynamodb_tables: tuple[str, str],
+    get_batcher: AsyncDynamoDbGetBatcher,
+    write_batcher: AsyncDynamoDbWriteBatcher,
+):
+    await asyncio.gather(
+        *[
+            write_batcher.process(
+                item=WriteOperation(
+                    table_name=dynamodb_tables[0],
+                    operation="PUT",
+                    data={"key": str(i), "value": i, "other": str(i * 2)},
+                )
+            )
+            for i in range(3)
+        ]
+    )
+
+    results = await asyncio.gather(
+        get_batcher.process(
+            item=GetItem(table_name=dynamodb_tables[0], key={"key": "0"}, projection=["value"])
+        ),
+        get_batcher.process(
+            item=GetItem(table_name=dynamodb_tables[0], key={"key": "0"}, projection=["other"])
+        ),
+        get_batcher.process(
+            item=GetItem(
+                table_name=dynamodb_tables[0], key={"key": "1"}, projection=["value"], consistent_read=True
+            )
+        ),
+        get_batcher.process(
+            item=GetItem(table_name=dynamodb_tables[0], key={"key": "2"}, consistent_read=True)
+        ),
+    )
+
+    assert results == [
+        {"value": 0},
+        {"other": "0"},
+        {"value": 1},
+        {"key": "2", "value": 2, "other": "4"},
+    ]
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_dynamodb_write_batcher_combine_writes(
+    dynamodb_tables: tuple[str, str],
+    get_batcher: AsyncDynamoDbGetBatcher,
+    write_batcher: AsyncDynamoDbWriteBatcher,
+):
+    # the writes of the same key in a batch are collapsed into the last one
+    await asyncio.gather(
+        *[
+            write_batcher.process(
+                item=WriteOperation(
+                    table_name=dynamodb_tables[1],
+                    operation="PUT",
+                    data={"key1": "counter", "key2": "0", "value": i},
+                )
+            )
+            for i in range(5)
+        ],
+        write_batcher.process(
+            item=WriteOperation(table_name=dynamodb_tables[0], operation="PUT", data={"key": "deleted"})
+        ),
+        write_batcher.process(
+            item=WriteOperation(table_name=dynamodb_tables[0], operation="DELETE", data={"key": "deleted"})
+        ),
+    )
+
+    assert write_batcher.table_keys == {dynamodb_tables[0]: ["key"], dynamodb_tables[1]: ["key1", "key2"]}
+    results = await asyncio.gather(
+        get_batcher.process(
+            item=GetItem(table_name=dynamodb_tables[1], key={"key1": "counter", "key2": "0"})
+        ),
+        get_batcher.process(item=GetItem(table_name=dynamodb_tables[0], key={"key": "deleted"})),
+    )
+    assert results == [{"key1": "counter", "key2": "0", "value": 4}, None]
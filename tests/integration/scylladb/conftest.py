@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import asyncio
 import time
 
 import pytest
+from async_batcher.scylladb.prepared import AsyncScyllaDbPreparedWriteBatcher
 from async_batcher.scylladb.update import AsyncScyllaDbWriteBatcher
 from cassandra.cluster import Cluster
 from cassandra.connection import DefaultEndPoint
@@ -21,6 +23,29 @@ def scylladb_write_batcher():
     time.sleep(2)
 
 
+@pytest.fixture
+def scylladb_isolating_write_batcher():
+    write_batcher = AsyncScyllaDbWriteBatcher(isolate_errors=True, max_queue_time=0.1)
+    yield write_batcher
+    asyncio.get_event_loop().run_until_complete(write_batcher.stop())
+
+
+@pytest.fixture
+def scylladb_prepared_write_batcher(scylladb_session):
+    write_batcher = AsyncScyllaDbPreparedWriteBatcher(session=scylladb_session, max_queue_time=0.1)
+    yield write_batcher
+    asyncio.get_event_loop().run_until_complete(write_batcher.stop())
+
+
+@pytest.fixture
+def scylladb_partition_write_batcher(scylladb_session):
+    write_batcher = AsyncScyllaDbPreparedWriteBatcher(
+        session=scylladb_session, group_by_partition=True, max_queue_time=0.1
+    )
+    yield write_batcher
+    asyncio.get_event_loop().run_until_complete(write_batcher.stop())
+
+
 @pytest.fixture
 def scylladb_session():
     cluster = Cluster(
@@ -8,6 +8,7 @@ import pytest
 from async_batcher.scylladb.update import AsyncScyllaDbWriteBatcher, WriteOperation
 
 if TYPE_CHECKING:
+    from async_batcher.scylladb.prepared import AsyncScyllaDbPreparedWriteBatcher
     from cassandra.cqlengine.models import Model
 
 pytestmark = [pytest.mark.integration, pytest.mark.integration_scylladb]
@@ -153,3 +154,116 @@ async def test_scylladb_batchers_exceptions(
                 )
             )
         )
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_scylladb_prepared_write_batcher(
+    scylladb_tables: tuple[Model, Model], scylladb_prepared_write_batcher: AsyncScyllaDbPreparedWriteBatcher
+):
+    ids = [uuid4() for _ in range(10)]
+    await asyncio.gather(
+        *[
+            scylladb_prepared_write_batcher.process(
+                item=WriteOperation(
+                    operation="INSERT",
+                    model=scylladb_tables[i % 2],
+                    data={"id": ids[i], "attr1": str(i), "attr2": i * 2},
+                )
+            )
+            for i in range(10)
+        ]
+    )
+    assert scylladb_tables[0].objects.count() == 5
+    assert scylladb_tables[1].objects.count() == 5
+
+    results = await asyncio.gather(
+        scylladb_prepared_write_batcher.process(
+            item=WriteOperation(operation="DELETE", model=scylladb_tables[0], key={"id": ids[0]})
+        ),
+        scylladb_prepared_write_batcher.process(
+            item=WriteOperation(
+                operation="UPDATE", model=scylladb_tables[0], key={"id": ids[2]}, data={"attr2": 8}
+            )
+        ),
+        scylladb_prepared_write_batcher.process(
+            item=WriteOperation(operation="DELETE", model=scylladb_tables[0])
+        ),
+        return_exceptions=True,
+    )
+    assert results[:2] == [None, None]
+    assert isinstance(results[2], ValueError)
+    assert scylladb_tables[0].objects(id=ids[0]).first() is None
+    row = scylladb_tables[0].objects(id=ids[2]).first()
+    assert row.attr1 == "2"
+    assert row.attr2 == 8
+    # the key of an INSERT is ignored, like in the cqlengine batcher
+    await scylladb_prepared_write_batcher.process(
+        item=WriteOperation(
+            operation="INSERT",
+            model=scylladb_tables[0],
+            key={"id": ids[4]},
+            data={"id": ids[4], "attr1": "new", "attr2": 0},
+        )
+    )
+    assert scylladb_tables[0].objects(id=ids[4]).first().attr1 == "new"
+    # the statements are prepared once per model, operation and columns
+    assert len(scylladb_prepared_write_batcher._prepared_statements) == 4
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_scylladb_partition_write_batcher(
+    scylladb_tables: tuple[Model, Model], scylladb_partition_write_batcher: AsyncScyllaDbPreparedWriteBatcher
+):
+    assert scylladb_partition_write_batcher.batch_type == "UNLOGGED"
+    ids = [uuid4() for _ in range(5)]
+    results = await asyncio.gather(
+        *[
+            scylladb_partition_write_batcher.process(
+                item=WriteOperation(
+                    operation="INSERT",
+                    model=scylladb_tables[i % 2],
+                    data={"id": ids[i % 5], "attr1": str(i), "attr2": i * 2},
+                )
+            )
+            for i in range(10)
+        ],
+        scylladb_partition_write_batcher.process(
+            item=WriteOperation(operation="UPDATE", model=scylladb_tables[0], key={"id": ids[0]})
+        ),
+        return_exceptions=True,
+    )
+    assert results[:10] == [None] * 10
+    assert isinstance(results[10], ValueError)
+    assert scylladb_tables[0].objects.count() == 5
+    assert scylladb_tables[1].objects.count() == 5
+    row = scylladb_tables[1].objects(id=ids[0]).first()
+    assert row.attr1 == "5"
+    assert row.attr2 == 10
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_scylladb_write_batcher_isolate_errors(
+    scylladb_tables: tuple[Model, Model], scylladb_isolating_write_batcher: AsyncScyllaDbWriteBatcher
+):
+    ids = [uuid4() for _ in range(8)]
+    results = await asyncio.gather(
+        *[
+            scylladb_isolating_write_batcher.process(
+                item=WriteOperation(
+                    operation="INSERT",
+                    model=scylladb_tables[0],
+                    # the operations 2 and 5 have an invalid double value
+                    data={"id": ids[i], "attr1": str(i), "attr2": "invalid" if i in (2, 5) else i},
+                )
+            )
+            for i in range(8)
+        ],
+        return_exceptions=True,
+    )
+    for i, result in enumerate(results):
+        if i in (2, 5):
+            assert isinstance(result, Exception)
+        else:
+            assert result is None
+    assert scylladb_tables[0].objects.count() == 6
+    assert scylladb_tables[0].objects(id=ids[2]).first() is None
@@ -6,6 +6,7 @@ import pytest
 from async_batcher.sqlalchemy.write import AsyncSqlalchemyWriteBatcher
 
 from sqlalchemy import select
+from tests.conftest import _TestNullableModel
 from tests.sqlalchemy.conftest import _TestModel
 
 pytestmark = [pytest.mark.integration, pytest.mark.integration_postgres]
@@ -51,3 +52,72 @@ async def test_async_sqlalchemy_postgres_write_batcher(async_postgres_engine, cr
     # stop the batcher
     await insert_batcher.stop()
     await update_batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_async_sqlalchemy_postgres_upsert_batcher(async_postgres_engine, create_models):
+    upsert_batcher = AsyncSqlalchemyWriteBatcher(
+        model=_TestModel,
+        async_engine=async_postgres_engine,
+        operation="upsert",
+        returning=_TestModel.age,
+    )
+    await asyncio.gather(
+        *[upsert_batcher.process({"id": i, "name": f"Name {i}", "age": i}) for i in range(200, 205)]
+    )
+    returned_result = await asyncio.gather(
+        *[upsert_batcher.process({"id": i, "name": f"Name {i}", "age": i * 2}) for i in range(200, 210)]
+    )
+    assert returned_result == [(i * 2,) for i in range(200, 210)]
+    async with upsert_batcher.async_session_maker() as session:
+        rows_in_table = (
+            await session.scalars(select(_TestModel).where(_TestModel.id >= 200).order_by(_TestModel.id))
+        ).all()
+    assert [(row.id, row.age) for row in rows_in_table] == [(i, i * 2) for i in range(200, 210)]
+    await upsert_batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_async_sqlalchemy_postgres_copy_batcher(async_postgres_engine, create_models):
+    copy_batcher = AsyncSqlalchemyWriteBatcher(
+        model=_TestModel,
+        async_engine=async_postgres_engine,
+        use_copy=True,
+    )
+    assert copy_batcher.use_copy is True
+    await asyncio.gather(
+        *[copy_batcher.process({"id": i, "name": f"Name {i}", "age": i}) for i in range(300, 310)]
+    )
+    async with copy_batcher.async_session_maker() as session:
+        rows_in_table = (
+            await session.scalars(select(_TestModel).where(_TestModel.id >= 300).order_by(_TestModel.id))
+        ).all()
+    assert [(row.id, row.name, row.age) for row in rows_in_table] == [
+        (i, f"Name {i}", i) for i in range(300, 310)
+    ]
+    await copy_batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_async_sqlalchemy_postgres_copy_batcher_partial_items(async_postgres_engine, create_models):
+    copy_batcher = AsyncSqlalchemyWriteBatcher(
+        model=_TestNullableModel, async_engine=async_postgres_engine, use_copy=True, max_queue_time=0.1
+    )
+    # the items with different columns are copied separately
+    await copy_batcher.process_many(
+        [
+            {"id": i, "name": f"Name {i}"} if i % 2 else {"id": i, "name": f"Name {i}", "age": i}
+            for i in range(4)
+        ]
+    )
+    async with copy_batcher.async_session_maker() as session:
+        rows_in_table = (
+            await session.scalars(select(_TestNullableModel).order_by(_TestNullableModel.id))
+        ).all()
+    assert [(row.id, row.name, row.age) for row in rows_in_table] == [
+        (0, "Name 0", 0),
+        (1, "Name 1", None),
+        (2, "Name 2", 2),
+        (3, "Name 3", None),
+    ]
+    await copy_batcher.stop()
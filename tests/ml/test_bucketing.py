@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+from async_batcher.ml.bucketing import BucketedAsyncBatcher
+
+
+class SumBucketedAsyncBatcher(BucketedAsyncBatcher):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+
+    def process_bucket(self, batch, mask, bucket_length):
+        self.batches.append((batch, mask, bucket_length))
+        if mask is None:
+            return [sum(item) for item in batch]
+        return [(features * row_mask).sum() for features, row_mask in zip(batch, mask, strict=True)]
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_bucketed_batcher():
+    batcher = SumBucketedAsyncBatcher(bucket_boundaries=[2, 4, 8], max_batch_size=10)
+    items = [[1], [1, 2], [1, 2, 3], [1, 2, 3, 4, 5]]
+
+    results = await asyncio.gather(*[batcher.process(item) for item in items])
+
+    assert results == [1, 3, 6, 15]
+    batches = sorted(batcher.batches, key=lambda batch: batch[2])
+    assert [bucket_length for _, _, bucket_length in batches] == [2, 4, 8]
+    features, mask, _ = batches[0]
+    assert features.dtype == np.float32
+    np.testing.assert_array_equal(features, [[1, 0], [1, 2]])
+    np.testing.assert_array_equal(mask, [[True, False], [True, True]])
+    assert batcher.padding_efficiency == 11 / (2 * 2 + 4 + 8)
+    with pytest.raises(ValueError):
+        await batcher.process(list(range(9)))
+    await batcher.stop()
+    assert not await batcher.is_running()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_bucketed_batcher_process_many():
+    batcher = SumBucketedAsyncBatcher(bucket_boundaries=[2, 4], pad=False, max_batch_size=10)
+    items = [[1, 2, 3], [1], [4, 4], [1, 1, 1, 1]]
+
+    results = await batcher.process_many(items)
+
+    assert results == [6, 1, 8, 4]
+    assert len(batcher.batches) == 2
+    assert all(mask is None for _, mask, _ in batcher.batches)
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_bucketed_batcher_records_lengths_in_event_loop():
+    length_threads = set()
+
+    def length_fn(item):
+        length_threads.add(threading.current_thread())
+        return len(item)
+
+    batcher = SumBucketedAsyncBatcher(bucket_boundaries=[2, 4], length_fn=length_fn, max_batch_size=10)
+    items = [[1] * (i % 4 + 1) for i in range(40)]
+
+    await asyncio.gather(*[batcher.process(item) for item in items])
+
+    # the batches of the buckets are processed concurrently in the executor threads, so the padding
+    # statistics are updated in the event loop thread
+    assert length_threads == {threading.current_thread()}
+    assert batcher.padding_efficiency == 100 / (20 * 2 + 20 * 4)
+    await batcher.stop()
+
+
+def test_bucketed_batcher_invalid_boundaries():
+    with pytest.raises(ValueError):
+        SumBucketedAsyncBatcher(bucket_boundaries=[4, 2])
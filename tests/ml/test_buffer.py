@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import asyncio
+
+import numpy as np
+import pytest
+from async_batcher.ml.buffer import NumpyBatchBuffer
+from async_batcher.ml.sklearn.model import SklearnAsyncBatcher
+
+
+class SumModel:
+    def __init__(self):
+        self.inputs = []
+
+    def predict(self, features):
+        self.inputs.append(features)
+        return np.stack([features.sum(axis=1), features.max(axis=1)], axis=1)
+
+
+def test_numpy_batch_buffer():
+    buffer = NumpyBatchBuffer(max_batch_size=4, feature_shape=(3,), dtype="float64")
+    with buffer.assemble([[1, 2, 3], [4, 5, 6]]) as features:
+        assert features.shape == (2, 3)
+        assert features.dtype == np.float64
+        np.testing.assert_array_equal(features, [[1, 2, 3], [4, 5, 6]])
+        base = features.base
+        # the buffer is in use, so a new one is allocated
+        with buffer.assemble([[7, 8, 9]]) as other_features:
+            assert other_features.base is not base
+        assert buffer.size == 2
+    # the buffers are reused
+    with buffer.assemble([[1, 1, 1]]) as features:
+        assert features.base is base or features.base is other_features.base
+    assert buffer.size == 2
+    with pytest.raises(ValueError):
+        NumpyBatchBuffer(max_batch_size=-1, feature_shape=(3,))
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_sklearn_batcher_with_numpy_buffer():
+    model = SumModel()
+    batcher = SklearnAsyncBatcher(model=model, max_batch_size=10, feature_shape=(2,))
+
+    results = await asyncio.gather(*[batcher.process(item=[i, i * 2]) for i in range(5)])
+
+    assert isinstance(model.inputs[0], np.ndarray)
+    assert model.inputs[0].dtype == np.float32
+    # each item gets a row of the output array
+    for i, result in enumerate(results):
+        assert isinstance(result, np.ndarray)
+        np.testing.assert_array_equal(result, [i * 3, i * 2])
+    await batcher.stop()
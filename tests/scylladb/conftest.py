@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING
+
+from cassandra import cqltypes
+from cassandra.protocol import ColumnMetadata
+from cassandra.query import BatchStatement, PreparedStatement
+
+if TYPE_CHECKING:
+    from cassandra.cqlengine.models import Model
+
+
+class FakeResponseFuture:
+    """A driver `ResponseFuture` which is already resolved with a result or an error."""
+
+    def __init__(self, error: Exception | None):
+        self.error = error
+
+    def add_callbacks(self, callback, errback):
+        if self.error is None:
+            callback(None)
+        else:
+            errback(self.error)
+
+
+class FakeSession:
+    """A driver session which prepares the statements of cqlengine models, and records the sent batches."""
+
+    def __init__(self, models: list[type[Model]]):
+        self.models = {model.column_family_name(include_keyspace=False): model for model in models}
+        self.prepared_queries: list[str] = []
+        self.batches: list[BatchStatement] = []
+        # the error raised by the prepare calls, and the errors returned by the next executions
+        self.prepare_error: Exception | None = None
+        self.execute_errors: list[Exception] = []
+
+    def prepare(self, query: str) -> PreparedStatement:
+        self.prepared_queries.append(query)
+        if self.prepare_error is not None:
+            raise self.prepare_error
+        model = self.models[re.search(r"(?:INTO|UPDATE|FROM) \w+\.(\w+)", query).group(1)]
+        keyspace, table = model._get_keyspace(), model.column_family_name(include_keyspace=False)
+        # the bind markers are in the same order as the columns in the query
+        names = re.findall(r'"(\w+)"', query)
+        column_metadata = [
+            ColumnMetadata(keyspace, table, name, cqltypes._cqltypes[model._columns[name].db_type])
+            for name in names
+        ]
+        routing_key_indexes = [names.index(name) for name in model._partition_keys]
+        return PreparedStatement(
+            column_metadata, query.encode(), routing_key_indexes, query, keyspace, 4, None, None
+        )
+
+    def execute_async(self, batch_statement: BatchStatement) -> FakeResponseFuture:
+        self.batches.append(batch_statement)
+        return FakeResponseFuture(self.execute_errors.pop(0) if self.execute_errors else None)
+
+
+def get_sent_values(batch_statement: BatchStatement) -> list[tuple[str, list[bytes]]]:
+    """Get the queries and the serialized values of the statements of a sent batch."""
+    return [(query_id.decode(), values) for _, query_id, values in batch_statement._statements_and_parameters]
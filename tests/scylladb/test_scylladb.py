@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import asyncio
+from unittest import mock
+from uuid import uuid4
+
+import pytest
+from async_batcher.scylladb.prepared import AsyncScyllaDbPreparedWriteBatcher
+from async_batcher.scylladb.update import AsyncScyllaDbWriteBatcher, WriteOperation
+from cassandra import InvalidRequest, WriteTimeout, WriteType
+from cassandra.cqlengine import columns
+from cassandra.cqlengine.models import Model
+from cassandra.cqlengine.query import BatchQuery
+from cassandra.query import BatchType
+
+from tests.scylladb.conftest import FakeSession, get_sent_values
+
+
+class _TestModel(Model):
+    __table_name__ = "test_table"
+    __keyspace__ = "test_keyspace"
+    id = columns.UUID(primary_key=True)
+    attr1 = columns.Text()
+
+
+class _TestPartitionedModel(Model):
+    __table_name__ = "test_partitioned_table"
+    __keyspace__ = "test_keyspace"
+    partition = columns.Integer(partition_key=True)
+    id = columns.UUID(primary_key=True)
+    attr1 = columns.Text()
+
+
+def _insert(attr1: str) -> WriteOperation:
+    return WriteOperation(operation="INSERT", model=_TestModel, data={"id": uuid4(), "attr1": attr1})
+
+
+class FakeExecute:
+    """A replacement of `BatchQuery.execute`, which records the sent batches and raises an error for the
+    batches containing a rejected value."""
+
+    def __init__(self, error: Exception):
+        self.error = error
+        self.batches: list[list[str]] = []
+
+    def __call__(self, batch_query: BatchQuery):
+        values = [query.get_context()["1"] for query in batch_query.queries]
+        self.batches.append(values)
+        if "rejected" in values:
+            raise self.error
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_scylladb_write_batcher_isolates_rejected_operations():
+    fake_execute = FakeExecute(InvalidRequest("rejected"))
+    batcher = AsyncScyllaDbWriteBatcher(isolate_errors=True)
+
+    with mock.patch.object(BatchQuery, "execute", autospec=True, side_effect=fake_execute):
+        results = await batcher.process_many(
+            [_insert("rejected" if i == 2 else str(i)) for i in range(4)], return_exceptions=True
+        )
+    assert results[:2] == [None, None] and results[3] is None
+    assert isinstance(results[2], InvalidRequest)
+    # the rejected batch is bisected until the rejected operation is found
+    assert fake_execute.batches == [
+        ["0", "1", "rejected", "3"],
+        ["0", "1"],
+        ["rejected", "3"],
+        ["rejected"],
+        ["3"],
+    ]
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_scylladb_write_batcher_doesnt_isolate_timeouts():
+    fake_execute = FakeExecute(WriteTimeout("timeout", write_type=WriteType.BATCH))
+    batcher = AsyncScyllaDbWriteBatcher(isolate_errors=True)
+
+    with mock.patch.object(BatchQuery, "execute", autospec=True, side_effect=fake_execute):
+        results = await batcher.process_many(
+            [_insert("rejected" if i == 2 else str(i)) for i in range(4)], return_exceptions=True
+        )
+    # the timed out batch may still be applied, so it's not sent again
+    assert all(isinstance(result, WriteTimeout) for result in results)
+    assert len(fake_execute.batches) == 1
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_scylladb_prepared_write_batcher_prepares_statements_once():
+    session = FakeSession([_TestModel])
+    batcher = AsyncScyllaDbPreparedWriteBatcher(session=session, max_batch_size=2, concurrency=2)
+
+    await asyncio.gather(*[batcher.process(item=_insert(str(i))) for i in range(6)])
+    await batcher.process(
+        item=WriteOperation(operation="UPDATE", model=_TestModel, key={"id": uuid4()}, data={"attr1": "1"})
+    )
+
+    # the concurrent batches wait for the same prepared statement
+    assert len(session.batches) == 4
+    assert session.prepared_queries == [
+        'INSERT INTO test_keyspace.test_table ("id", "attr1") VALUES (?, ?)',
+        'UPDATE test_keyspace.test_table SET "attr1" = ? WHERE "id" = ?',
+    ]
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_scylladb_prepared_write_batcher_binds_values():
+    session = FakeSession([_TestModel])
+    batcher = AsyncScyllaDbPreparedWriteBatcher(session=session)
+    key = uuid4()
+
+    await batcher.process_many(
+        [
+            WriteOperation(operation="UPDATE", model=_TestModel, key={"id": key}, data={"attr1": "1"}),
+            WriteOperation(operation="DELETE", model=_TestModel, key={"id": key}),
+            # the key of an INSERT is ignored, its primary key columns are in its data
+            WriteOperation(
+                operation="INSERT", model=_TestModel, key={"id": uuid4()}, data={"attr1": "2", "id": key}
+            ),
+        ]
+    )
+
+    # the SET values are bound before the key values
+    assert get_sent_values(session.batches[0]) == [
+        ('UPDATE test_keyspace.test_table SET "attr1" = ? WHERE "id" = ?', [b"1", key.bytes]),
+        ('DELETE FROM test_keyspace.test_table WHERE "id" = ?', [key.bytes]),
+        ('INSERT INTO test_keyspace.test_table ("attr1", "id") VALUES (?, ?)', [b"2", key.bytes]),
+    ]
+    assert session.batches[0].batch_type == BatchType.LOGGED
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_scylladb_prepared_write_batcher_errors():
+    session = FakeSession([_TestModel])
+    session.prepare_error = InvalidRequest("unknown column")
+    batcher = AsyncScyllaDbPreparedWriteBatcher(session=session)
+
+    # the failed statement reaches all the items using it, and it's not cached
+    results = await batcher.process_many([_insert(str(i)) for i in range(2)], return_exceptions=True)
+    assert all(isinstance(result, InvalidRequest) for result in results)
+    assert session.batches == []
+    session.prepare_error = None
+    session.execute_errors.append(WriteTimeout("timeout", write_type=WriteType.BATCH))
+    # the failed batch reaches all its items
+    results = await batcher.process_many([_insert(str(i)) for i in range(2)], return_exceptions=True)
+    assert all(isinstance(result, WriteTimeout) for result in results)
+    assert await batcher.process(item=_insert("1")) is None
+    assert len(session.prepared_queries) == 3
+    await batcher.stop()
+
+
+def _insert_partitioned(partition: int, attr1: str) -> WriteOperation:
+    return WriteOperation(
+        operation="INSERT",
+        model=_TestPartitionedModel,
+        data={"partition": partition, "id": uuid4(), "attr1": attr1},
+    )
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_scylladb_prepared_write_batcher_groups_by_partition():
+    session = FakeSession([_TestPartitionedModel])
+    batcher = AsyncScyllaDbPreparedWriteBatcher(session=session, group_by_partition=True)
+
+    await batcher.process_many([_insert_partitioned(i % 3, str(i)) for i in range(7)])
+
+    # one single-partition batch is sent per routing key
+    assert [batch.routing_key for batch in session.batches] == [i.to_bytes(4, "big") for i in range(3)]
+    assert [[values[2] for _, values in get_sent_values(batch)] for batch in session.batches] == [
+        [b"0", b"3", b"6"],
+        [b"1", b"4"],
+        [b"2", b"5"],
+    ]
+    assert all(batch.batch_type == BatchType.UNLOGGED for batch in session.batches)
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_scylladb_prepared_write_batcher_fails_partition_batch():
+    session = FakeSession([_TestPartitionedModel])
+    session.execute_errors.append(WriteTimeout("timeout", write_type=WriteType.UNLOGGED_BATCH))
+    batcher = AsyncScyllaDbPreparedWriteBatcher(session=session, group_by_partition=True, batch_type="LOGGED")
+
+    results = await batcher.process_many(
+        [_insert_partitioned(i % 2, str(i)) for i in range(4)], return_exceptions=True
+    )
+
+    # only the items of the failed partition batch fail
+    assert isinstance(results[0], WriteTimeout) and isinstance(results[2], WriteTimeout)
+    assert results[1] is None and results[3] is None
+    assert [batch.batch_type for batch in session.batches] == [BatchType.LOGGED] * 2
+    with pytest.raises(ValueError, match="Invalid batch type"):
+        AsyncScyllaDbPreparedWriteBatcher(session=session, batch_type="COUNTER")
+    await batcher.stop()
@@ -1,11 +1,18 @@
 from __future__ import annotations
 
 import asyncio
+from unittest import mock
 
 import pytest
+from async_batcher.metrics import ISOLATED_BATCHES, ISOLATION_SUB_BATCHES, InMemoryMetricsSink
+from async_batcher.sqlalchemy.get import AsyncSqlalchemyGetBatcher
 from async_batcher.sqlalchemy.write import AsyncSqlalchemyWriteBatcher
 
-from sqlalchemy import select
+from sqlalchemy import delete, event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from tests.conftest import _TestNullableModel
 from tests.sqlalchemy.conftest import _TestModel
 
 
@@ -49,3 +56,301 @@ async def test_async_sqlalchemy_write_batcher(async_sqlite_engine, create_models
     # stop the batcher
     await insert_batcher.stop()
     await update_batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_async_sqlalchemy_write_batcher_max_bind_params(async_sqlite_engine, create_models):
+    batcher = AsyncSqlalchemyWriteBatcher(
+        model=_TestModel,
+        async_engine=async_sqlite_engine,
+        operation="insert",
+        max_bind_params=10,
+        max_batch_size=100,
+    )
+    batches = []
+    process_batch = batcher.process_batch
+
+    async def _process_batch(batch):
+        batches.append(batch)
+        return await process_batch(batch)
+
+    batcher.process_batch = _process_batch
+    await asyncio.gather(
+        *[batcher.process({"id": i, "name": f"Name {i}", "age": i}) for i in range(100, 107)]
+    )
+    # 3 parameters per row
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    async with batcher.async_session_maker() as session:
+        await session.execute(delete(_TestModel).where(_TestModel.id >= 100))
+        await session.commit()
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_async_sqlalchemy_write_batcher_upsert_delete(async_sqlite_engine, create_models):
+    upsert_batcher = AsyncSqlalchemyWriteBatcher(
+        model=_TestModel,
+        async_engine=async_sqlite_engine,
+        operation="upsert",
+        returning=_TestModel.age,
+    )
+    delete_batcher = AsyncSqlalchemyWriteBatcher(
+        model=_TestModel,
+        async_engine=async_sqlite_engine,
+        operation="delete",
+        returning=[_TestModel.name],
+    )
+    # 5 inserts, then 5 updates and 5 inserts
+    await asyncio.gather(
+        *[upsert_batcher.process({"id": i, "name": f"Name {i}", "age": i}) for i in range(200, 205)]
+    )
+    returned_result = await asyncio.gather(
+        *[upsert_batcher.process({"id": i, "name": f"Name {i}", "age": i * 2}) for i in range(200, 210)]
+    )
+    assert returned_result == [(i * 2,) for i in range(200, 210)]
+    async with upsert_batcher.async_session_maker() as session:
+        rows_in_table = (await session.scalars(select(_TestModel).where(_TestModel.id >= 200))).all()
+    assert [(row.id, row.age) for row in rows_in_table] == [(i, i * 2) for i in range(200, 210)]
+    # the missing rows get None
+    returned_result = await asyncio.gather(*[delete_batcher.process({"id": i}) for i in range(205, 215)])
+    assert returned_result == [(f"Name {i}",) for i in range(205, 210)] + [None] * 5
+    async with delete_batcher.async_session_maker() as session:
+        rows_in_table = (await session.scalars(select(_TestModel).where(_TestModel.id >= 200))).all()
+        assert [row.id for row in rows_in_table] == list(range(200, 205))
+        await session.execute(delete(_TestModel).where(_TestModel.id >= 200))
+        await session.commit()
+    await upsert_batcher.stop()
+    await delete_batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_async_sqlalchemy_write_batcher_upsert_partial_items(async_sqlite_engine, create_models):
+    batcher = AsyncSqlalchemyWriteBatcher(
+        model=_TestNullableModel,
+        async_engine=async_sqlite_engine,
+        operation="upsert",
+        returning=[_TestNullableModel.name, _TestNullableModel.age],
+        max_queue_time=0.1,
+    )
+    await batcher.process_many([{"id": 1, "name": "X", "age": 11}, {"id": 2, "name": "Z", "age": 22}])
+    results = await batcher.process_many(
+        [
+            {"id": 1, "name": "Y"},
+            {"id": 2, "age": 23},
+            {"id": 3, "name": "W", "age": 33},
+            {"id": 2, "name": "V"},
+        ]
+    )
+    # the missing columns are not updated, and the items of the same row are merged
+    assert results == [("Y", 11), ("V", 23), ("W", 33), ("V", 23)]
+    async with batcher.async_session_maker() as session:
+        rows_in_table = (
+            await session.scalars(select(_TestNullableModel).order_by(_TestNullableModel.id))
+        ).all()
+        assert [(row.id, row.name, row.age) for row in rows_in_table] == [
+            (1, "Y", 11),
+            (2, "V", 23),
+            (3, "W", 33),
+        ]
+        await session.execute(delete(_TestNullableModel))
+        await session.commit()
+    # a statement is built per set of columns of the merged rows
+    assert list(batcher._statements) == [("age", "id", "name"), ("id", "name")]
+    await batcher.stop()
+
+
+@pytest.mark.parametrize("dialect_name", ["mysql", "mariadb"])
+def test_async_sqlalchemy_write_batcher_mysql_returning(dialect_name):
+    async_engine = mock.Mock(**{"dialect.name": dialect_name})
+    with pytest.raises(ValueError, match=f"returning is not supported for the {dialect_name} dialect"):
+        AsyncSqlalchemyWriteBatcher(
+            model=_TestModel, async_engine=async_engine, operation="upsert", returning=_TestModel.id
+        )
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_async_sqlalchemy_write_batcher_use_copy_fallback(async_sqlite_engine, create_models):
+    with pytest.raises(ValueError, match="use_copy requires the insert operation"):
+        AsyncSqlalchemyWriteBatcher(
+            model=_TestModel, async_engine=async_sqlite_engine, operation="update", use_copy=True
+        )
+    batcher = AsyncSqlalchemyWriteBatcher(model=_TestModel, async_engine=async_sqlite_engine, use_copy=True)
+    # the COPY is specific to asyncpg, so aiosqlite falls back to the multi-row insert
+    assert batcher.use_copy is False
+    await asyncio.gather(
+        *[batcher.process({"id": i, "name": f"Name {i}", "age": i}) for i in range(300, 305)]
+    )
+    async with batcher.async_session_maker() as session:
+        rows_in_table = (await session.scalars(select(_TestModel).where(_TestModel.id >= 300))).all()
+        assert [row.id for row in rows_in_table] == list(range(300, 305))
+        await session.execute(delete(_TestModel).where(_TestModel.id >= 300))
+        await session.commit()
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_async_sqlalchemy_get_batcher(async_sqlite_engine, create_models):
+    insert_batcher = AsyncSqlalchemyWriteBatcher(model=_TestModel, async_engine=async_sqlite_engine)
+    await asyncio.gather(
+        *[insert_batcher.process({"id": i, "name": f"Name {i}", "age": i}) for i in range(400, 410)]
+    )
+    get_batcher = AsyncSqlalchemyGetBatcher(
+        model=_TestModel, async_engine=async_sqlite_engine, max_bind_params=3
+    )
+    columns_batcher = AsyncSqlalchemyGetBatcher(
+        model=_TestModel,
+        async_engine=async_sqlite_engine,
+        key_column=_TestModel.name,
+        columns=[_TestModel.id, _TestModel.age],
+    )
+    attribute_batcher = AsyncSqlalchemyGetBatcher(
+        model=_TestModel, async_engine=async_sqlite_engine, key_column=_TestModel.name
+    )
+    statements = []
+
+    def _record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_sqlite_engine.sync_engine, "before_cursor_execute", _record_statement)
+    # the missing rows get None, and the duplicated keys get the same row
+    rows = await get_batcher.process_many([400, 415, 402, 409, 402, 416, 405])
+    assert [row.id if row is not None else None for row in rows] == [400, None, 402, 409, 402, None, 405]
+    assert rows[0].name == "Name 400"
+    # the 5 unique keys are loaded in 2 chunks of max 3 keys
+    assert len([statement for statement in statements if statement.startswith("SELECT")]) == 2
+    event.remove(async_sqlite_engine.sync_engine, "before_cursor_execute", _record_statement)
+    rows = await asyncio.gather(*[columns_batcher.process(f"Name {i}") for i in range(408, 412)])
+    assert rows == [(408, 408), (409, 409), None, None]
+    # the instances are mapped to the items by the attribute of the key column
+    rows = await attribute_batcher.process_many(["Name 401", "Name 420"])
+    assert rows[0].id == 401 and rows[1] is None
+    async with insert_batcher.async_session_maker() as session:
+        await session.execute(delete(_TestModel).where(_TestModel.id >= 400))
+        await session.commit()
+    await insert_batcher.stop()
+    await get_batcher.stop()
+    await columns_batcher.stop()
+    await attribute_batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_async_sqlalchemy_write_batcher_reuse_connections(async_sqlite_engine, create_models):
+    batcher = AsyncSqlalchemyWriteBatcher(
+        model=_TestModel,
+        async_engine=async_sqlite_engine,
+        returning=_TestModel.id,
+        reuse_connections=True,
+        max_batch_size=2,
+    )
+    returned_result = await asyncio.gather(
+        *[batcher.process({"id": i, "name": f"Name {i}", "age": i}) for i in range(500, 505)]
+    )
+    assert returned_result == [(i,) for i in range(500, 505)]
+    # the batches reused the same session, connection and statement
+    assert len(batcher._free_sessions) == 1
+    assert len(batcher._statements) == 1
+    async with batcher.async_session_maker() as session:
+        await session.execute(delete(_TestModel).where(_TestModel.id >= 500))
+        await session.commit()
+    await batcher.stop()
+    assert batcher._free_sessions == []
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_async_sqlalchemy_write_batcher_reuse_connections_limits(tmp_path):
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", pool_size=2)
+    async with async_engine.begin() as conn:
+        await conn.run_sync(_TestModel.metadata.create_all)
+    batcher = AsyncSqlalchemyWriteBatcher(
+        model=_TestModel,
+        async_engine=async_engine,
+        reuse_connections=True,
+        isolate_errors=True,
+        max_batch_size=2,
+        concurrency=-1,
+    )
+    await asyncio.gather(*[batcher.process({"id": i, "name": f"Name {i}", "age": i}) for i in range(10)])
+    # the idle connections are limited by the engine pool size when the concurrency is not limited
+    assert len(batcher._free_sessions) == 2
+    # the connection of a batch whose failed writes were rolled back is closed
+    with pytest.raises(IntegrityError):
+        await batcher.process({"id": 0, "name": "Name 0", "age": 0})
+    assert len(batcher._free_sessions) == 1
+    await batcher.stop()
+    await async_engine.dispose()
+
+    # the idle connections are limited by default when the engine pool size is not limited either
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", poolclass=NullPool)
+    batcher = AsyncSqlalchemyWriteBatcher(
+        model=_TestModel,
+        async_engine=async_engine,
+        reuse_connections=True,
+        max_batch_size=2,
+        max_queue_time=0.1,
+        concurrency=-1,
+    )
+    await asyncio.gather(*[batcher.process({"id": i, "name": f"Name {i}", "age": i}) for i in range(10, 30)])
+    assert len(batcher._free_sessions) == AsyncSqlalchemyWriteBatcher.DEFAULT_MAX_FREE_SESSIONS
+    await batcher.stop()
+    await async_engine.dispose()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_async_sqlalchemy_write_batcher_isolate_errors(async_sqlite_engine, create_models):
+    metrics = InMemoryMetricsSink()
+    batcher = AsyncSqlalchemyWriteBatcher(
+        model=_TestModel,
+        async_engine=async_sqlite_engine,
+        returning=_TestModel.id,
+        isolate_errors=True,
+        metrics=metrics,
+        max_batch_size=8,
+        max_queue_time=0.1,
+    )
+    await batcher.process({"id": 602, "name": "Name 602", "age": 602})
+    # the rows 602 and 605 violate the primary key constraint
+    ids = [600, 601, 602, 603, 604, 605, 605, 606]
+    results = await asyncio.gather(
+        *[batcher.process({"id": i, "name": f"Name {i}", "age": i}) for i in ids],
+        return_exceptions=True,
+    )
+    for i, result in enumerate(results):
+        if i in (2, 6):
+            assert isinstance(result, IntegrityError)
+        else:
+            assert result == (ids[i],)
+    async with batcher.async_session_maker() as session:
+        rows_in_table = (await session.scalars(select(_TestModel).where(_TestModel.id >= 600))).all()
+        assert [row.id for row in rows_in_table] == list(range(600, 607))
+        await session.execute(delete(_TestModel).where(_TestModel.id >= 600))
+        await session.commit()
+    assert metrics.counters[ISOLATED_BATCHES] == 1
+    assert metrics.counters[ISOLATION_SUB_BATCHES] == 10
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_async_sqlalchemy_write_batcher_isolate_errors_keeps_writes_order(
+    async_sqlite_engine, create_models
+):
+    batcher = AsyncSqlalchemyWriteBatcher(
+        model=_TestModel, async_engine=async_sqlite_engine, operation="upsert", isolate_errors=True
+    )
+    # the row 701 violates the not null constraint, so the two writes of the row 700 are in different halves
+    results = await batcher.process_many(
+        [
+            {"id": 700, "name": "Old name", "age": 1},
+            {"id": 701, "name": None, "age": 1},
+            {"id": 702, "name": "Name 702", "age": 1},
+            {"id": 700, "name": "New name", "age": 2},
+        ],
+        return_exceptions=True,
+    )
+    assert isinstance(results[1], IntegrityError)
+    async with batcher.async_session_maker() as session:
+        row = (await session.scalars(select(_TestModel).where(_TestModel.id == 700))).one()
+        # the halves are committed in the order of the items, so the last write wins
+        assert (row.name, row.age) == ("New name", 2)
+        await session.execute(delete(_TestModel).where(_TestModel.id >= 700))
+        await session.commit()
+    await batcher.stop()
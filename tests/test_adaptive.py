@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from async_batcher.adaptive import AdaptiveBatchController
+
+from tests.conftest import MockAsyncBatcher, SlowAsyncBatcher
+
+
+def test_adaptive_controller_decreases_batch_size_above_target_latency():
+    controller = AdaptiveBatchController(target_latency=0.1, adjust_interval=2)
+    controller.attach(max_batch_size=100, max_queue_time=0.05)
+    assert (controller.batch_size, controller.queue_time) == (100, 0.05)
+
+    controller.record_batch(batch_size=100, processing_time=0.2, now=1)
+    controller.record_arrivals(3000)
+    controller.record_batch(batch_size=100, processing_time=0.2, now=2)
+    assert controller.batch_size == 75
+    # the queue time is bounded by the time needed to fill a batch at the arrival rate (3000 items/s),
+    # not at the processing rate
+    assert controller.queue_time == pytest.approx(0.025)
+    assert controller.processing_time_by_batch_size[100] == pytest.approx(0.2)
+
+
+def test_adaptive_controller_computes_p99_over_latency_window():
+    controller = AdaptiveBatchController(target_latency=0.5, adjust_interval=10, latency_window=200)
+    controller.attach(max_batch_size=100, max_queue_time=0)
+    controller.batch_size = 50
+
+    for i in range(100):
+        controller.record_batch(batch_size=50, processing_time=0.1, now=i)
+    assert controller.batch_size == 60
+    # a single slow batch in the window is above the p99, so it doesn't decrease the batch size
+    controller.record_batch(batch_size=60, processing_time=1, now=100)
+    for i in range(101, 110):
+        controller.record_batch(batch_size=60, processing_time=0.1, now=i)
+    assert controller.batch_size == 61
+    # more than 1% of the batches in the window are slow, so the p99 is above the target
+    for i in range(110, 120):
+        controller.record_batch(batch_size=61, processing_time=1, now=i)
+    assert controller.batch_size == int(61 * 0.75)
+
+
+def test_adaptive_controller_recovers_after_slow_batches():
+    controller = AdaptiveBatchController(target_latency=0.5, adjust_interval=10)
+    controller.attach(max_batch_size=256, max_queue_time=0)
+
+    for i in range(20):
+        controller.record_batch(batch_size=controller.batch_size, processing_time=1, now=i)
+    assert controller.batch_size == int(int(256 * 0.75) * 0.75)
+    # the slow batches are dropped from the window after each decrease, so the fast batches increase
+    # the batch size again
+    for i in range(20, 120):
+        controller.record_batch(batch_size=controller.batch_size, processing_time=0.1, now=i)
+    assert controller.batch_size == int(int(256 * 0.75) * 0.75) + 10
+
+
+def test_adaptive_controller_is_bounded_by_batcher_config():
+    controller = AdaptiveBatchController(max_batch_size=500, max_queue_time=1, min_batch_size=200)
+    controller.attach(max_batch_size=100, max_queue_time=0.05)
+    assert (controller.max_batch_size, controller.min_batch_size) == (100, 100)
+    assert (controller.batch_size, controller.queue_time) == (100, 0.05)
+
+
+def test_adaptive_controller_increases_batch_size_below_target_latency():
+    controller = AdaptiveBatchController(target_latency=1, adjust_interval=2, increase_step=5)
+    controller.attach(max_batch_size=100, max_queue_time=0.05)
+    controller.batch_size = 50
+
+    controller.record_batch(batch_size=50, processing_time=0.1, now=1)
+    controller.record_batch(batch_size=50, processing_time=0.1, now=1.01)
+    assert controller.batch_size == 55
+    # the batch size is bounded by the max batch size
+    controller.batch_size = 99
+    controller.record_batch(batch_size=99, processing_time=0.1, now=2)
+    controller.record_batch(batch_size=99, processing_time=0.1, now=2.01)
+    assert controller.batch_size == 100
+
+
+def test_adaptive_controller_maximizes_throughput():
+    controller = AdaptiveBatchController(adjust_interval=1, min_batch_size=2)
+    controller.attach(max_batch_size=-1, max_queue_time=0.01)
+    assert controller.batch_size == AdaptiveBatchController.DEFAULT_MAX_BATCH_SIZE
+
+    controller.batch_size = 16
+    controller.record_batch(batch_size=16, processing_time=0.1, now=1)
+    assert controller.batch_size == 20
+    # the throughput decreased, the controller should go back
+    controller.record_batch(batch_size=20, processing_time=1, now=2)
+    assert controller.batch_size == 15
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_batcher_uses_adaptive_controller():
+    controller = AdaptiveBatchController(target_latency=10, adjust_interval=1)
+    batcher = MockAsyncBatcher(max_batch_size=10, max_queue_time=0.01, adaptive_controller=controller)
+    batcher.mock_batch_processor.reset_mock()
+    assert (batcher.effective_max_batch_size, batcher.effective_max_queue_time) == (10, 0.01)
+    controller.batch_size = 4
+
+    result = await asyncio.gather(*[batcher.process(item=i) for i in range(10)])
+
+    assert result == [i * 2 for i in range(10)]
+    assert batcher.mock_batch_processor.mock_calls[0].kwargs["batch"] == list(range(4))
+    assert batcher.effective_max_batch_size > 4
+    batcher.mock_batch_processor.reset_mock()
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_batcher_adaptive_controller_reduces_batch_size():
+    controller = AdaptiveBatchController(target_latency=0.05, adjust_interval=1)
+    batcher = SlowAsyncBatcher(
+        sleep_time=0.1, max_batch_size=10, max_queue_time=0.01, adaptive_controller=controller
+    )
+    batcher.mock_batch_processor.reset_mock()
+
+    await asyncio.gather(*[batcher.process(item=i) for i in range(20)])
+
+    assert batcher.effective_max_batch_size < 10
+    batcher.mock_batch_processor.reset_mock()
+    await batcher.stop()
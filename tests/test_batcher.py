@@ -4,7 +4,8 @@ import asyncio
 import sys
 
 import pytest
-from async_batcher.exceptions import QueueFullException
+from async_batcher.batcher import AsyncBatcher
+from async_batcher.exceptions import DeadlineExceededException, QueueFullException
 
 from tests.conftest import MockAsyncBatcher, SlowAsyncBatcher
 
@@ -99,8 +100,8 @@ async def test_process_batch_with_short_buffering_time():
         # batch 1: from 0 to 1
         # batch 2: from 0.25 to 1.25
         # batch 3: from 1 to 2
-        # batch 4: from 1.45 to 2.45 (< max_batch_size, extra 0.4)
-        (2, 2.45),
+        # batch 4: from 1.4 to 2.4 (< max_batch_size, 0.2 after the collector started at 1.2)
+        (2, 2.4),
         # batch 1: from 0 to 1
         # batch 2: from 0.25 to 1.25
         # batch 3: from 0.4 to 1.4
@@ -206,3 +207,233 @@ async def test_max_queue_size():
     assert all(isinstance(e, QueueFullException) for e in calls_maker3.result[5:])
     batcher.mock_batch_processor.reset_mock()
     await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_stop_idle_batcher():
+    batcher = MockAsyncBatcher(max_batch_size=10, max_queue_time=0.01)
+    await batcher.process(item=1)
+    # the collector is waiting for new items, it should be woken up by the stop call
+    started_at = asyncio.get_event_loop().time()
+    await batcher.stop()
+    assert asyncio.get_event_loop().time() - started_at < 0.5
+    assert not await batcher.is_running()
+    batcher.mock_batch_processor.reset_mock()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_process_many(mock_async_batcher):
+    result1, result2, result3 = await asyncio.gather(
+        mock_async_batcher.process_many(items=list(range(6))),
+        mock_async_batcher.process_many(items=list(range(6, 12))),
+        mock_async_batcher.process_many(items=list(range(12, 35))),
+    )
+
+    assert result1 == [i * 2 for i in range(6)]
+    assert result2 == [i * 2 for i in range(6, 12)]
+    assert result3 == [i * 2 for i in range(12, 35)]
+    batches = [call.kwargs["batch"] for call in mock_async_batcher.mock_batch_processor.mock_calls]
+    # the second group doesn't fit in the first batch, so it's processed in the next batch,
+    # and the third group is bigger than the max batch size, so it's split across batches
+    assert batches == [list(range(6)), list(range(6, 16)), list(range(16, 26)), list(range(26, 35))]
+    assert await mock_async_batcher.process_many(items=[]) == []
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_process_many_exceptions(mock_async_batcher):
+    mock_async_batcher.mock_batch_processor.side_effect = lambda batch: [
+        ValueError(i) if i % 2 else i * 2 for i in batch
+    ]
+    try:
+        with pytest.raises(ValueError, match="1"):
+            await mock_async_batcher.process_many(items=list(range(4)))
+        result = await mock_async_batcher.process_many(items=list(range(4)), return_exceptions=True)
+        assert result[0::2] == [0, 4]
+        assert all(isinstance(e, ValueError) for e in result[1::2])
+    finally:
+        mock_async_batcher.mock_batch_processor.side_effect = lambda batch: [i * 2 for i in batch]
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_process_many_max_queue_size():
+    batcher = MockAsyncBatcher(max_batch_size=10, max_queue_time=0.01, max_queue_size=10)
+    with pytest.raises(QueueFullException):
+        await batcher.process_many(items=list(range(11)))
+    assert await batcher.process_many(items=list(range(10))) == [i * 2 for i in range(10)]
+    batcher.mock_batch_processor.reset_mock()
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_submit(mock_async_batcher):
+    futures = [mock_async_batcher.submit_nowait(item=i) for i in range(5)]
+    futures.append(await mock_async_batcher.submit(item=5))
+    assert all(isinstance(future, asyncio.Future) for future in futures)
+    assert mock_async_batcher.submit_nowait(item=6, return_future=False) is None
+    assert await mock_async_batcher.submit(item=7, return_future=False) is None
+
+    assert await asyncio.gather(*futures) == [i * 2 for i in range(6)]
+    await mock_async_batcher.stop()
+    assert mock_async_batcher.mock_batch_processor.mock_calls[0].kwargs["batch"] == list(range(8))
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_submit_max_queue_size():
+    batcher = SlowAsyncBatcher(sleep_time=0.1, max_batch_size=10, max_queue_time=0.01, max_queue_size=2)
+    batcher.mock_batch_processor.reset_mock()
+    futures = [batcher.submit_nowait(item=i) for i in range(2)]
+    with pytest.raises(QueueFullException):
+        batcher.submit_nowait(item=2)
+    # submit waits for a free slot in the queue
+    futures.append(await batcher.submit(item=2))
+    assert await asyncio.gather(*futures) == [0, 2, 4]
+    batcher.mock_batch_processor.reset_mock()
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_priority_scheduling():
+    batcher = SlowAsyncBatcher(
+        sleep_time=0.2, max_batch_size=3, max_queue_time=0.01, concurrency=1, scheduling="priority"
+    )
+    batcher.mock_batch_processor.reset_mock()
+    # the first batch keeps the batcher busy while the other items are queued
+    first_batch = batcher.submit_nowait(item=0)
+    await asyncio.sleep(0.05)
+    deadline = asyncio.get_running_loop().time() + 1
+    futures = [batcher.submit_nowait(item=i, priority=1) for i in range(1, 4)]
+    futures += [batcher.submit_nowait(item=i, priority=0, deadline=deadline + i) for i in range(4, 6)]
+    futures.append(batcher.submit_nowait(item=6, priority=0, deadline=deadline))
+
+    assert await asyncio.gather(first_batch, *futures) == [i * 2 for i in range(7)]
+    batches = [call.kwargs["batch"] for call in batcher.mock_batch_processor.mock_calls]
+    assert batches == [[0], [6, 4, 5], [1, 2, 3]]
+    batcher.mock_batch_processor.reset_mock()
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_expired_deadline():
+    batcher = SlowAsyncBatcher(sleep_time=0.2, max_batch_size=10, max_queue_time=0.01, concurrency=1)
+    batcher.mock_batch_processor.reset_mock()
+    first_batch = batcher.submit_nowait(item=0)
+    await asyncio.sleep(0.05)
+    loop = asyncio.get_running_loop()
+    expired = batcher.submit_nowait(item=1, deadline=loop.time() + 0.05)
+    valid = batcher.submit_nowait(item=2, deadline=loop.time() + 1)
+
+    assert await asyncio.gather(first_batch, valid) == [0, 4]
+    with pytest.raises(DeadlineExceededException):
+        await expired
+    batches = [call.kwargs["batch"] for call in batcher.mock_batch_processor.mock_calls]
+    assert batches == [[0], [2]]
+    with pytest.raises(ValueError, match="priority"):
+        await batcher.process(item=3, priority=1)
+    batcher.mock_batch_processor.reset_mock()
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_coalesce_items():
+    batcher = SlowAsyncBatcher(
+        sleep_time=0.2, max_batch_size=10, max_queue_time=0.01, coalesce_key=lambda item: item
+    )
+    batcher.mock_batch_processor.reset_mock()
+    first_batch = asyncio.gather(*[batcher.process(item=i % 3) for i in range(6)])
+    await asyncio.sleep(0.05)
+    # the items 0, 1 and 2 are in-flight, so only the item 3 is added to the queue
+    second_batch = asyncio.gather(
+        batcher.process(item=2),
+        batcher.process_many(items=[3, 1, 3]),
+    )
+    cancelled = batcher.submit_nowait(item=0)
+    cancelled.cancel()
+
+    assert await first_batch == [0, 2, 4, 0, 2, 4]
+    assert await second_batch == [4, [6, 2, 6]]
+    batches = [call.kwargs["batch"] for call in batcher.mock_batch_processor.mock_calls]
+    assert batches == [[0, 1, 2], [3]]
+    assert batcher._coalesced_futures == {}
+    batcher.mock_batch_processor.reset_mock()
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_coalesce_items_waiting_for_free_slot():
+    batcher = SlowAsyncBatcher(
+        sleep_time=0.2,
+        max_batch_size=10,
+        max_queue_time=0.01,
+        max_queue_size=1,
+        coalesce_key=lambda item: item,
+    )
+    batcher.mock_batch_processor.reset_mock()
+    first_batch = batcher.submit_nowait(item=0)
+    await asyncio.sleep(0.05)
+    queued = batcher.submit_nowait(item=1)
+    # the queue is full, so the callers wait for a free slot
+    cancelled = asyncio.ensure_future(batcher.submit(item=2))
+    waiting = asyncio.ensure_future(batcher.submit(item=2))
+    await asyncio.sleep(0.05)
+    cancelled.cancel()
+
+    # the cancelled caller doesn't cancel the other caller of the same item
+    assert await asyncio.gather(first_batch, queued, await waiting) == [0, 2, 4]
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    batches = [call.kwargs["batch"] for call in batcher.mock_batch_processor.mock_calls]
+    assert batches == [[0], [1], [2]]
+    assert batcher._coalesced_futures == {}
+    batcher.mock_batch_processor.reset_mock()
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_max_batch_weight():
+    batcher = MockAsyncBatcher(
+        max_batch_size=10, max_queue_time=0.01, item_weight=lambda item: item, max_batch_weight=10
+    )
+    batcher.mock_batch_processor.reset_mock()
+
+    results = await asyncio.gather(*[batcher.process(item=i) for i in [4, 5, 2, 12, 3, 3]])
+
+    assert results == [8, 10, 4, 24, 6, 6]
+    batches = [call.kwargs["batch"] for call in batcher.mock_batch_processor.mock_calls]
+    # the heavier items than the limit are processed alone
+    assert batches == [[4, 5], [2], [12], [3, 3]]
+    with pytest.raises(ValueError):
+        MockAsyncBatcher(item_weight=lambda item: item)
+    batcher.mock_batch_processor.reset_mock()
+    await batcher.stop()
+
+
+class SplitAsyncBatcher(AsyncBatcher):
+    """Batcher which resolves the odd items after the even ones, as two parallel requests."""
+
+    async def process_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in batch]
+        for index, item in enumerate(batch):
+            loop.call_later(0.2 if item % 2 else 0.01, futures[index].set_result, item * 2)
+        return futures
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_process_batch_futures():
+    batcher = SplitAsyncBatcher(max_batch_size=10, max_queue_time=0.01)
+    loop = asyncio.get_running_loop()
+    resolved_at = {}
+
+    async def _process(item):
+        result = await batcher.process(item=item)
+        resolved_at[item] = loop.time()
+        return result
+
+    started_at = loop.time()
+    results = await asyncio.gather(*[_process(i) for i in range(4)])
+
+    assert results == [0, 2, 4, 6]
+    # the even items don't wait for the odd ones
+    assert all(resolved_at[i] - started_at < 0.15 for i in [0, 2])
+    assert all(resolved_at[i] - started_at >= 0.2 for i in [1, 3])
+    await batcher.stop()
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from unittest import mock
+
+import pytest
+from async_batcher.cache import CACHE_MISS, LRUCache
+
+from tests.conftest import MockAsyncBatcher
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    # "b" is the least recently used key
+    cache.set("c", 3)
+    assert cache.get("b") is CACHE_MISS
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_lru_cache_ttl():
+    cache = LRUCache(max_size=10, ttl=10, negative_ttl=0)
+    with mock.patch.object(time, "monotonic", return_value=100):
+        cache.set("a", 1)
+        # the negative results are not cached
+        cache.set("b", None)
+    with mock.patch.object(time, "monotonic", return_value=105):
+        assert cache.get("a") == 1
+        assert cache.get("b") is CACHE_MISS
+    with mock.patch.object(time, "monotonic", return_value=110):
+        assert cache.get("a") is CACHE_MISS
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_batcher_cache():
+    cache = LRUCache(max_size=100)
+    batcher = MockAsyncBatcher(max_batch_size=10, max_queue_time=0.01, cache=cache, cache_key=lambda i: i % 5)
+    batcher.mock_batch_processor.reset_mock()
+
+    assert await asyncio.gather(*[batcher.process(item=i) for i in range(3)]) == [0, 2, 4]
+    # the keys 0, 1 and 2 are answered from the cache
+    assert await batcher.process_many(items=[5, 6, 3]) == [0, 2, 6]
+    assert await batcher.submit_nowait(item=7) == 4
+    assert await (await batcher.submit(item=8)) == 6
+
+    batches = [call.kwargs["batch"] for call in batcher.mock_batch_processor.mock_calls]
+    assert batches == [[0, 1, 2], [3]]
+    assert (cache.hits, cache.misses) == (4, 4)
+    batcher.mock_batch_processor.reset_mock()
+    await batcher.stop()
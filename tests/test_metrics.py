@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from async_batcher import metrics
+from async_batcher.exceptions import DeadlineExceededException, QueueFullException
+from async_batcher.metrics import InMemoryMetricsSink, MetricsSink, PrometheusMetricsSink
+
+from tests.conftest import MockAsyncBatcher, SlowAsyncBatcher
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_batcher_metrics():
+    sink = InMemoryMetricsSink()
+    batcher = MockAsyncBatcher(max_batch_size=10, max_queue_time=0.01, metrics=sink)
+    batcher.mock_batch_processor.reset_mock()
+
+    await asyncio.gather(*[batcher.process(item=i) for i in range(15)])
+
+    assert list(sink.observations[metrics.BATCH_SIZE]) == [10, 5]
+    assert list(sink.observations[metrics.BATCH_FILL_RATIO]) == [1, 0.5]
+    assert len(sink.observations[metrics.QUEUE_WAIT_TIME]) == 15
+    assert len(sink.observations[metrics.PROCESSING_TIME]) == 2
+    assert sink.gauges[metrics.INFLIGHT_BATCHES] == 0
+    assert metrics.QUEUE_DEPTH in sink.gauges
+
+    batcher.mock_batch_processor.side_effect = ValueError("error")
+    try:
+        with pytest.raises(ValueError):
+            await asyncio.gather(*[batcher.process(item=i) for i in range(3)])
+    finally:
+        batcher.mock_batch_processor.side_effect = lambda batch: [i * 2 for i in batch]
+    assert sink.counters[metrics.BATCH_ERRORS] == 1
+    assert sink.counters[metrics.ITEM_ERRORS] == 3
+    batcher.mock_batch_processor.reset_mock()
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_batcher_metrics_rejected_and_expired_items():
+    sink = InMemoryMetricsSink()
+    batcher = SlowAsyncBatcher(
+        sleep_time=0.1, max_batch_size=10, max_queue_time=0.01, max_queue_size=2, metrics=sink
+    )
+    batcher.mock_batch_processor.reset_mock()
+    first_batch = batcher.submit_nowait(item=0)
+    await asyncio.sleep(0.01)
+    expired = batcher.submit_nowait(item=1, deadline=asyncio.get_running_loop().time())
+    batcher.submit_nowait(item=2)
+    with pytest.raises(QueueFullException):
+        batcher.submit_nowait(item=3)
+
+    await first_batch
+    with pytest.raises(DeadlineExceededException):
+        await expired
+    assert sink.counters[metrics.REJECTED_ITEMS] == 1
+    assert sink.counters[metrics.EXPIRED_ITEMS] == 1
+    batcher.mock_batch_processor.reset_mock()
+    await batcher.stop()
+
+
+def test_noop_metrics_sink():
+    sink = MetricsSink()
+    sink.increment(metrics.BATCH_ERRORS)
+    sink.observe(metrics.BATCH_SIZE, 10)
+    sink.gauge(metrics.QUEUE_DEPTH, 1)
+
+
+def test_prometheus_metrics_sink():
+    prometheus_client = pytest.importorskip("prometheus_client")
+    registry = prometheus_client.CollectorRegistry()
+    sink = PrometheusMetricsSink(labels={"batcher": "test"}, registry=registry)
+    sink.increment(metrics.BATCH_ERRORS)
+    sink.increment(metrics.BATCH_ERRORS, 2)
+    sink.observe(metrics.BATCH_SIZE, 10)
+    sink.gauge(metrics.QUEUE_DEPTH, 5)
+
+    labels = {"batcher": "test"}
+    assert registry.get_sample_value("async_batcher_batch_errors_total", labels) == 3
+    assert registry.get_sample_value("async_batcher_batch_size_sum", labels) == 10
+    assert registry.get_sample_value("async_batcher_queue_depth", labels) == 5
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from async_batcher.process_pool import ProcessPoolAsyncBatcher
+
+
+def load_model():
+    return {"factor": 3, "pid": os.getpid()}
+
+
+def predict(model, batch):
+    if "crash" in batch:
+        os._exit(1)
+    return [(item * model["factor"], model["pid"]) for item in batch]
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_process_pool_batcher():
+    batcher = ProcessPoolAsyncBatcher(
+        model_loader=load_model, batch_processor=predict, max_workers=2, max_batch_size=10
+    )
+
+    results = await asyncio.gather(*[batcher.process(item=i) for i in range(25)])
+
+    assert [result[0] for result in results] == [i * 3 for i in range(25)]
+    # the batches are processed in the worker processes
+    assert all(result[1] != os.getpid() for result in results)
+    assert await batcher.check_health()
+    await batcher.stop()
+    assert batcher._pool is None
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_process_pool_batcher_restarts_crashed_workers():
+    batcher = ProcessPoolAsyncBatcher(
+        model_loader=load_model, batch_processor=predict, max_workers=1, max_restarts=1
+    )
+
+    with pytest.raises(BrokenProcessPool):
+        await batcher.process(item="crash")
+    assert batcher.restarts_count == 2
+    # the pool was restarted, so the next batches are processed
+    assert (await batcher.process(item=2))[0] == 6
+    await batcher.stop()
+
+
+def slow_predict(model, batch):
+    time.sleep(0.5)
+    return [item * model["factor"] for item in batch]
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_process_pool_batcher_health_check_with_slow_batches():
+    batcher = ProcessPoolAsyncBatcher(
+        model_loader=load_model,
+        batch_processor=slow_predict,
+        max_workers=1,
+        concurrency=4,
+        max_batch_size=2,
+        health_check_interval=0.1,
+        health_check_timeout=1,
+    )
+    # the pings time out behind the slow batches, but the workers complete them, so they are not restarted
+    results = await asyncio.wait_for(asyncio.gather(*[batcher.process(item=i) for i in range(8)]), timeout=10)
+    assert results == [i * 3 for i in range(8)]
+    assert batcher.restarts_count == 0
+    await batcher.stop()
+
+
+def hanging_predict(model, batch):
+    if "hang" in batch:
+        time.sleep(60)
+    return [item * model["factor"] for item in batch]
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_process_pool_batcher_restarts_hung_workers():
+    batcher = ProcessPoolAsyncBatcher(
+        model_loader=load_model,
+        batch_processor=hanging_predict,
+        max_workers=1,
+        max_restarts=0,
+        health_check_interval=0.2,
+        health_check_timeout=0.5,
+    )
+    assert await batcher.process(item=1) == 3
+    processes = list(batcher._pool._processes.values())
+
+    # the ping times out while the batch is in flight, so the hung worker is terminated
+    with pytest.raises(BrokenProcessPool):
+        await asyncio.wait_for(batcher.process(item="hang"), timeout=10)
+    assert batcher.restarts_count == 1
+    for process in processes:
+        process.join(timeout=5)
+        assert not process.is_alive()
+    assert await batcher.process(item=2) == 6
+    await batcher.stop()
+
+
+def load_model_slowly():
+    time.sleep(1)
+    return load_model()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_process_pool_batcher_health_check_during_startup():
+    batcher = ProcessPoolAsyncBatcher(
+        model_loader=load_model_slowly,
+        batch_processor=slow_predict,
+        max_workers=1,
+        health_check_interval=0.1,
+        health_check_timeout=0.2,
+    )
+    batcher._ensure_running()
+    # the pings time out while the idle workers load the model, but the pool is not restarted
+    await asyncio.sleep(0.5)
+    assert batcher.restarts_count == 0
+    assert await asyncio.wait_for(batcher.process(item=1), timeout=10) == 3
+    assert batcher.restarts_count == 0
+    await batcher.stop()
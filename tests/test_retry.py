@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from async_batcher import metrics
+from async_batcher.batcher import AsyncBatcher
+from async_batcher.exceptions import DeadlineExceededException, RetriesExhaustedException
+from async_batcher.metrics import InMemoryMetricsSink
+from async_batcher.retry import ResultOf, RetryLater, RetryPolicy
+
+
+class ThrottledAsyncBatcher(AsyncBatcher):
+    """Batcher which asks to retry each item until it was processed `failures[item]` times."""
+
+    def __init__(self, failures: dict[int, int], **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+        self.batches = []
+
+    async def process_batch(self, batch):
+        self.batches.append(batch)
+        results = []
+        for item in batch:
+            if self.failures.get(item, 0) > 0:
+                self.failures[item] -= 1
+                results.append(RetryLater(ValueError("throttled")))
+            else:
+                results.append(item * 2)
+        return results
+
+
+def test_retry_policy_delay():
+    policy = RetryPolicy(base_delay=0.1, max_delay=0.5, jitter=False)
+    assert [policy.get_delay(attempt) for attempt in range(1, 5)] == [0.1, 0.2, 0.4, 0.5]
+    policy = RetryPolicy(base_delay=0.1, max_delay=0.5)
+    assert all(0 <= policy.get_delay(3) <= 0.4 for _ in range(100))
+    with pytest.raises(ValueError):
+        RetryPolicy(max_attempts=0)
+    with pytest.raises(ValueError):
+        RetryPolicy(base_delay=1, max_delay=0.5)
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_retry_items():
+    sink = InMemoryMetricsSink()
+    batcher = ThrottledAsyncBatcher(
+        failures={1: 1, 2: 2},
+        max_batch_size=10,
+        max_queue_time=0.01,
+        retry_policy=RetryPolicy(base_delay=0.05, jitter=False),
+        metrics=sink,
+    )
+
+    results = await asyncio.gather(*[batcher.process(item=i) for i in range(4)])
+
+    assert results == [0, 2, 4, 6]
+    # only the unprocessed items are retried
+    assert batcher.batches == [[0, 1, 2, 3], [1, 2], [2]]
+    assert sink.counters[metrics.RETRIED_ITEMS] == 3
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_retried_items_merged_into_next_batch():
+    batcher = ThrottledAsyncBatcher(
+        failures={0: 1},
+        max_batch_size=10,
+        max_queue_time=0.1,
+        retry_policy=RetryPolicy(base_delay=0.05, jitter=False),
+    )
+
+    first = batcher.submit_nowait(item=0)
+    await asyncio.sleep(0.12)
+    second = batcher.submit_nowait(item=1)
+
+    assert await asyncio.gather(first, second) == [0, 2]
+    assert batcher.batches == [[0], [1, 0]]
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_retries_exhausted():
+    batcher = ThrottledAsyncBatcher(
+        failures={0: 10, 1: 10},
+        max_batch_size=10,
+        max_queue_time=0.01,
+        retry_policy=RetryPolicy(max_attempts=3, base_delay=0.01, jitter=False),
+    )
+    loop = asyncio.get_running_loop()
+
+    exhausted = batcher.submit_nowait(item=0)
+    expired = batcher.submit_nowait(item=1, deadline=loop.time() + 0.015)
+
+    with pytest.raises(RetriesExhaustedException) as exc_info:
+        await exhausted
+    assert isinstance(exc_info.value.__cause__, ValueError)
+    with pytest.raises(DeadlineExceededException):
+        await expired
+    assert batcher.batches == [[0, 1], [0], [0]]
+    await batcher.stop()
+
+    # without retry policy, the items fail on the first attempt
+    batcher = ThrottledAsyncBatcher(failures={0: 1}, max_batch_size=10, max_queue_time=0.01)
+    with pytest.raises(RetriesExhaustedException):
+        await batcher.process(item=0)
+    await batcher.stop()
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_stop_waits_for_retries():
+    batcher = ThrottledAsyncBatcher(
+        failures={0: 2},
+        max_batch_size=10,
+        max_queue_time=0.01,
+        retry_policy=RetryPolicy(base_delay=0.05, jitter=False),
+    )
+
+    future = batcher.submit_nowait(item=0)
+    await asyncio.sleep(0.02)
+    await batcher.stop()
+
+    assert future.done()
+    assert future.result() == 0
+    assert batcher.batches == [[0], [0], [0]]
+
+
+class FollowingAsyncBatcher(ThrottledAsyncBatcher):
+    """Batcher which resolves the negative items with the result of the last item of the batch."""
+
+    async def process_batch(self, batch):
+        results = await super().process_batch([abs(item) for item in batch])
+        return [
+            ResultOf(len(batch) - 1) if item < 0 else result
+            for item, result in zip(batch, results, strict=True)
+        ]
+
+
+@pytest.mark.asyncio(scope="session")
+async def test_result_of_another_item():
+    batcher = FollowingAsyncBatcher(
+        failures={3: 2},
+        max_batch_size=10,
+        max_queue_time=0.01,
+        retry_policy=RetryPolicy(base_delay=0.01),
+    )
+
+    followers = [batcher.submit_nowait(item=-i) for i in range(1, 3)]
+    results = await batcher.process_many([-1, 3])
+
+    # the followers are resolved once the retries of the last item finish, and they are not retried
+    assert results == [6, 6]
+    assert [await follower for follower in followers] == [6, 6]
+    assert batcher.batches == [[1, 2, 1, 3], [3], [3]]
+    await batcher.stop()
+
+    batcher = FollowingAsyncBatcher(
+        failures={1: 10}, max_batch_size=10, max_queue_time=0.01, retry_policy=RetryPolicy(max_attempts=2)
+    )
+    with pytest.raises(RetriesExhaustedException):
+        await batcher.process_many([-2, 1])
+    await batcher.stop()